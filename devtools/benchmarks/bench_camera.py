@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+#
+# Load test for the CameraServer. Opens many connections to an M-JPEG
+# server at once, each doing the same handshake as the dashboard, and
+# reports the throughput, how late the frames arrive and how many frames
+# each client skipped.
+#
+# By default a CameraServer is started on the loopback interface, serving
+# the simulated camera (a test pattern, or a directory of JPEG files), so
+# nothing needs to be installed first. Use --connect to load test another
+# server instead. The latency and skipped frames can only be measured for
+# images from the simulated camera, which contain the time that they were
+# captured and a frame number.
+#
+
+import argparse
+from os.path import abspath, dirname, join
+import selectors
+import socket
+import statistics
+import struct
+import sys
+import time
+
+root = abspath(join(dirname(__file__), '..', '..'))
+for d in ('hal-sim', 'hal-base', 'wpilib'):
+    sys.path.insert(0, join(root, d))
+
+import wpilib
+from wpilib.cameraserver import CameraServer
+from wpilib._impl.simcamera import USBCamera, getFrameInfo
+
+_header = struct.Struct('!4si')
+
+
+class Client:
+
+    def __init__(self, address, fps, size):
+        self.sock = socket.create_connection(address)
+        self.sock.sendall(struct.pack('!iii', fps, CameraServer.kHardwareCompression, size))
+        self.sock.setblocking(False)
+
+        self.buf = bytearray()
+        self.frames = 0
+        self.bytes = 0
+        self.skipped = 0
+        self.latencies = []
+        self.lastFrame = None
+        self.closed = False
+
+    def read(self):
+        try:
+            data = self.sock.recv(262144)
+        except BlockingIOError:
+            return
+        except IOError:
+            data = b''
+
+        if not data:
+            self.closed = True
+            return
+
+        now = time.time()
+        buf = self.buf
+        buf += data
+        self.bytes += len(data)
+
+        while len(buf) >= _header.size:
+            magic, size = _header.unpack_from(buf)
+            if magic != CameraServer.kMagicNumber:
+                raise ValueError("Invalid frame")
+            end = _header.size + size
+            if len(buf) < end:
+                break
+
+            self.frame(buf[_header.size:end], now)
+            del buf[:end]
+
+    def frame(self, image, now):
+        self.frames += 1
+        info = getFrameInfo(image)
+        if info is None:
+            return
+
+        timestamp, frameNumber = info
+        self.latencies.append(now - timestamp)
+        if self.lastFrame is not None and frameNumber > self.lastFrame:
+            self.skipped += frameNumber - self.lastFrame - 1
+        self.lastFrame = frameNumber
+
+
+def _ms(t):
+    return t * 1000.0
+
+
+def run(address, args):
+    sel = selectors.DefaultSelector()
+    clients = []
+    for _ in range(args.clients):
+        client = Client(address, args.fps, args.size)
+        sel.register(client.sock, selectors.EVENT_READ, client)
+        clients.append(client)
+
+    # skip the frames sent while the clients were connecting
+    end = time.monotonic() + args.warmup
+    while time.monotonic() < end:
+        for key, _ in sel.select(0.1):
+            key.data.read()
+
+    for client in clients:
+        client.frames = client.bytes = client.skipped = 0
+        client.latencies = []
+
+    start = time.monotonic()
+    end = start + args.duration
+    while time.monotonic() < end:
+        for key, _ in sel.select(0.1):
+            key.data.read()
+    elapsed = time.monotonic() - start
+
+    for client in clients:
+        sel.unregister(client.sock)
+        client.sock.close()
+    sel.close()
+
+    return clients, elapsed
+
+
+def report(clients, elapsed, args):
+    frames = sum(c.frames for c in clients)
+    nbytes = sum(c.bytes for c in clients)
+    closed = sum(1 for c in clients if c.closed)
+
+    print("%d clients asking for %d fps, for %.1f s" % (len(clients), args.fps, elapsed))
+    if closed:
+        print("%d clients were disconnected" % closed)
+    print("throughput      %8.1f frames/s %8.2f MB/s" % (frames / elapsed, nbytes / elapsed / 1e6))
+
+    rates = [c.frames / elapsed for c in clients]
+    print("per client      %8.1f fps (min) %6.1f fps (median) %6.1f fps (max)" %
+          (min(rates), statistics.median(rates), max(rates)))
+
+    latencies = sorted(l for c in clients for l in c.latencies)
+    if latencies:
+        print("latency         %8.2f ms (median) %6.2f ms (95%%) %6.2f ms (max)" %
+              (_ms(statistics.median(latencies)),
+               _ms(latencies[int(len(latencies) * 0.95)]), _ms(latencies[-1])))
+
+        received = sum(c.frames for c in clients)
+        skipped = sum(c.skipped for c in clients)
+        print("skipped frames  %8d (%.1f%% of the frames captured while connected)" %
+              (skipped, 100.0 * skipped / max(received + skipped, 1)))
+
+    if args.verbose:
+        print()
+        print("%6s %8s %10s %10s %8s" % ('client', 'fps', 'median ms', 'max ms', 'skipped'))
+        for i, c in enumerate(clients):
+            lat = sorted(c.latencies) or [0.0]
+            print("%6d %8.1f %10.2f %10.2f %8d" % (i, c.frames / elapsed, _ms(statistics.median(lat)),
+                                                 _ms(lat[-1]), c.skipped))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--clients', type=int, default=10)
+    parser.add_argument('--fps', type=int, default=30, help="Frame rate asked for by each client")
+    parser.add_argument('--size', type=int, default=CameraServer.kSize320x240,
+                        help="Image size asked for by each client (0: 640x480, 1: 320x240, 2: 160x120)")
+    parser.add_argument('-d', '--duration', type=float, default=5.0)
+    parser.add_argument('--warmup', type=float, default=1.0)
+    parser.add_argument('--images', help="Directory of JPEG files for the simulated camera")
+    parser.add_argument('--pool', type=int, default=CameraServer.kDefaultPoolSize,
+                        help="Number of image buffers in the CameraServer")
+    parser.add_argument('--connect', metavar='HOST:PORT',
+                        help="Load test this server, instead of starting one")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show each client")
+    args = parser.parse_args()
+
+    server = None
+    if args.connect:
+        host, port = args.connect.rsplit(':', 1)
+        address = (host, int(port))
+    else:
+        CameraServer.kPort = 0
+        server = CameraServer.getInstance()
+        server.setPoolSize(args.pool)
+        server.mjpegServer.listening.wait()
+
+        camera = USBCamera()
+        if args.images:
+            camera.setImageDirectory(args.images)
+        server.startAutomaticCapture(camera)
+        address = ('127.0.0.1', server.mjpegServer.port)
+
+    clients, elapsed = run(address, args)
+    report(clients, elapsed, args)
+
+    if server is not None:
+        stats = server.getStats()
+        print()
+        print("server: %(captured)d captured, %(sent)d sent, %(dropped)d dropped, %(stalled)d stalled" % stats)
+        print("buffers: %(count)d, acquire waited %(waits)d times, %(timeouts)d timed out" % stats['pool'])
+        CameraServer._reset()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+#
+# Measures how long the most frequently called simulated HAL functions
+# take, both when called directly and when called through the hal package
+# the way that WPILib calls them.
+#
+# Pass --record to measure the overhead of hal_impl.recorder, and
+# --validate to change how often the parameters are checked (see
+# hal_impl.validate).
+#
+# Uses the simulation HAL from this repository, so nothing needs to be
+# installed first.
+#
+
+import argparse
+import os
+from os.path import abspath, dirname, join
+import sys
+import timeit
+
+root = abspath(join(dirname(__file__), '..', '..'))
+for d in ('hal-sim', 'hal-base', 'wpilib'):
+    sys.path.insert(0, join(root, d))
+
+import hal_impl
+
+
+class _Status:
+    value = 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=100000)
+    parser.add_argument('--record', action='store_true', default=False,
+                        help="Record hal_data changes while running")
+    parser.add_argument('--validate', type=int, default=None,
+                        help="Check parameters every N calls (0 to never check)")
+    args = parser.parse_args()
+
+    # must be set before hal is imported
+    if args.validate is not None:
+        hal_impl.validate = args.validate
+
+    import hal
+    from hal_impl import functions as fns, types
+
+    fns.reset_hal()
+    fns.HALReport(hal.HALUsageReporting.kResourceType_Talon, 3)
+
+    recorder = None
+    if args.record:
+        from hal_impl.recorder import Recorder
+        recorder = Recorder(os.devnull)
+        recorder.start()
+
+    status = _Status()
+    dport = types.DigitalPort(types.Port(3, 0))
+    aport = types.AnalogPort(types.Port(1, 0))
+
+    # alternate values so that every call is a change
+    values = [1000, 2000]
+    def setPWM():
+        values.reverse()
+        fns.setPWM(dport, values[0], status)
+    def halSetPWM():
+        values.reverse()
+        hal.setPWM(dport, values[0])
+
+    benchmarks = [
+        ('setPWM', setPWM, halSetPWM),
+        ('getPWM', lambda: fns.getPWM(dport, status),
+                   lambda: hal.getPWM(dport)),
+        ('setDIO', lambda: fns.setDIO(dport, 1, status),
+                   lambda: hal.setDIO(dport, 1)),
+        ('getDIO', lambda: fns.getDIO(dport, status),
+                   lambda: hal.getDIO(dport)),
+        ('getAnalogValue', lambda: fns.getAnalogValue(aport, status),
+                           lambda: hal.getAnalogValue(aport)),
+        ('getPortWithModule', lambda: fns.getPortWithModule(0, 3),
+                              lambda: hal.getPortWithModule(0, 3)),
+        ('SetJoystickOutputs', lambda: fns.HALSetJoystickOutputs(0, 0, 0, 0),
+                               lambda: hal.HALSetJoystickOutputs(0, 0, 0, 0)),
+    ]
+
+    print("Checking parameters every %s calls" % hal_impl.validate)
+    print("%-18s %12s %12s" % ('', 'hal_impl', 'hal'))
+    for name, direct, wrapped in benchmarks:
+        times = []
+        for fn in (direct, wrapped):
+            t = min(timeit.repeat(fn, number=args.number, repeat=3))
+            times.append(t / args.number * 1e9)
+        print("%-18s %9.0f ns %9.0f ns" % (name, times[0], times[1]))
+
+    if recorder is not None:
+        recorder.stop()
+        print("Recorder dropped %d changes" % recorder.dropped)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Measures how long it takes to import hal (or another module) in a fresh
+# interpreter, with and without the cache of generated HAL functions that
+# the simulation HAL keeps in hal_impl/__pycache__.
+#
+# Uses the simulation HAL from this repository, so nothing needs to be
+# installed first.
+#
+
+import argparse
+import os
+from os.path import abspath, dirname, join
+import statistics
+import subprocess
+import sys
+
+root = abspath(join(dirname(__file__), '..', '..'))
+path = os.pathsep.join(join(root, d) for d in ('wpilib', 'hal-base', 'hal-sim'))
+
+_script = '''
+import time
+start = time.perf_counter()
+import %s
+print(time.perf_counter() - start)
+'''
+
+
+def measure(module, number, env):
+    env = dict(os.environ, PYTHONPATH=path, **env)
+    times = []
+    for _ in range(number):
+        out = subprocess.check_output([sys.executable, '-W', 'ignore', '-c', _script % module],
+                                      env=env, cwd=root)
+        times.append(float(out.decode().split()[-1]))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('module', nargs='?', default='hal')
+    parser.add_argument('-n', '--number', type=int, default=20)
+    args = parser.parse_args()
+
+    # make sure that the cache exists
+    measure(args.module, 1, {})
+
+    configs = [
+        ('no cache', {'HAL_NOCACHE': '1'}),
+        ('cached', {}),
+    ]
+
+    print("import %s (median of %d)" % (args.module, args.number))
+    for name, env in configs:
+        times = measure(args.module, args.number, env)
+        print("%-10s %8.1f ms" % (name, statistics.median(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
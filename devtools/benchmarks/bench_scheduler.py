@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+#
+# Measures how long Scheduler.run() takes for a robot with a lot of
+# subsystems, and how long it takes to start a deeply nested CommandGroup
+# that conflicts with the currently running commands.
+#
+# Uses the simulation HAL from this repository, so nothing needs to be
+# installed first.
+#
+
+import argparse
+from os.path import abspath, dirname, join
+import sys
+import timeit
+
+root = abspath(join(dirname(__file__), '..', '..'))
+for d in ('hal-sim', 'hal-base', 'wpilib'):
+    sys.path.insert(0, join(root, d))
+
+import hal
+import wpilib
+import hal_impl.mode_helpers
+from wpilib.command import Command, CommandGroup, Scheduler, Subsystem
+
+
+class _Command(Command):
+    def isFinished(self):
+        return False
+
+
+def make_subsystems(n):
+    subsystems = []
+    for i in range(n):
+        s = Subsystem('s%d' % i)
+        default = _Command('default%d' % i)
+        default.requires(s)
+        s.setDefaultCommand(default)
+        subsystems.append(s)
+    return subsystems
+
+
+def make_group(subsystems, depth, width):
+    '''A group nested `depth` levels deep, where each level runs `width`
+    commands in parallel that each require one subsystem'''
+    group = CommandGroup()
+    for i in range(width):
+        c = _Command()
+        c.requires(subsystems[(depth*width + i) % len(subsystems)])
+        group.addParallel(c)
+    if depth > 0:
+        group.addSequential(make_group(subsystems, depth - 1, width))
+    return group
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subsystems', type=int, default=50)
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--width', type=int, default=4)
+    parser.add_argument('-n', '--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    wpilib.RobotBase.initializeHardwareConfiguration()
+    hal_impl.mode_helpers.set_mode('teleop', True)
+
+    scheduler = Scheduler.getInstance()
+    subsystems = make_subsystems(args.subsystems)
+
+    # start all of the default commands
+    scheduler.run()
+    scheduler.run()
+
+    t = timeit.timeit(scheduler.run, number=args.number)
+    print("run(), %d idle subsystems: %.1f us" %
+          (args.subsystems, t / args.number * 1e6))
+
+    def _conflict():
+        group = make_group(subsystems, args.depth, args.width)
+        group.start()
+        for _ in range(args.depth + 2):
+            scheduler.run()
+        group.cancel()
+        scheduler.run()
+        scheduler.run()
+
+    number = max(args.number // 20, 1)
+    t = timeit.timeit(_conflict, number=number)
+    print("nested group (depth %d, width %d) start/cancel: %.1f us" %
+          (args.depth, args.width, t / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
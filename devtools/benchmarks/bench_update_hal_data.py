@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+#
+# Compares the two ways that an external simulator can push inputs into
+# hal_data: update_hal_data with every input (6 joysticks and a typical set
+# of sensors), and update_hal_data_delta with only the inputs that changed.
+#
+# Uses the simulation HAL from this repository, so nothing needs to be
+# installed first.
+#
+
+import argparse
+import copy
+from os.path import abspath, dirname, join
+import sys
+import timeit
+
+root = abspath(join(dirname(__file__), '..', '..'))
+for d in ('hal-sim', 'hal-base', 'wpilib'):
+    sys.path.insert(0, join(root, d))
+
+import hal
+import hal_impl.functions
+from hal_impl import data
+
+
+def make_payload():
+    '''Everything that a simulator of a typical robot would send'''
+    in_data = data.hal_in_data
+    return {
+        'joysticks': copy.deepcopy(in_data['joysticks'][:6]),
+        'dio': [{'value': False} for _ in in_data['dio']],
+        'analog_in': [{'voltage': 0.0, 'avg_voltage': 0.0} for _ in in_data['analog_in']],
+        'encoder': [{'count': 0, 'period': 0.0, 'direction': False} for _ in in_data['encoder']],
+        'pdp': copy.deepcopy(in_data['pdp']),
+        'power': {'vin_voltage': 12.0},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=10000)
+    args = parser.parse_args()
+
+    hal_impl.functions.reset_hal()
+
+    payload = make_payload()
+    full_inputs = len(data.get_input_paths())
+
+    def full():
+        payload['joysticks'][0]['axes'][1] += 0.001
+        data.update_hal_data(payload)
+
+    axis = ('joysticks', 0, 'axes', 1)
+    one = {axis: 0.0}
+
+    def delta_one():
+        one[axis] += 0.001
+        data.update_hal_data_delta(one)
+
+    # a joystick moving and the drive encoders counting
+    several = {
+        ('joysticks', 0, 'axes', 1): 0.0,
+        ('joysticks', 0, 'axes', 5): 0.0,
+        ('encoder', 0, 'count'): 0,
+        ('encoder', 1, 'count'): 0,
+        ('analog_in', 0, 'voltage'): 0.0,
+    }
+
+    def delta_several():
+        for k in several:
+            several[k] += 1
+        data.update_hal_data_delta(several)
+
+    benchmarks = [
+        ('full tree', full),
+        ('delta (1 value)', delta_one),
+        ('delta (5 values)', delta_several),
+    ]
+
+    print("%d inputs in hal_data" % full_inputs)
+    for name, fn in benchmarks:
+        t = min(timeit.repeat(fn, number=args.number, repeat=3))
+        print("%-18s %9.2f us" % (name, t / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+'''
+    Keeps track of how many times each HAL function is called, how long the
+    calls take, and which modules they are called from. This can show
+    whether a slow loop is spending its time in the robot code or in
+    hundreds of calls to the HAL.
+
+    Set the HAL_PROFILE environment variable to enable it. The HAL functions
+    are only instrumented when hal is imported with HAL_PROFILE set, so
+    there is no cost when it isn't. Then, for example::
+
+        import atexit
+        import hal.callstats
+        atexit.register(hal.callstats.dump_table)
+'''
+
+import json
+import os
+import sys
+import threading
+import time
+
+__all__ = ['enabled', 'CallStats', 'instrument', 'reset', 'get_stats',
+           'dump_table', 'dump_json']
+
+#: True if the HAL functions are being instrumented
+enabled = bool(os.environ.get('HAL_PROFILE'))
+
+_lock = threading.Lock()
+
+# {name: CallStats}
+_stats = {}
+
+
+class CallStats:
+    '''Statistics for a single HAL function. Times are in seconds.'''
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        #: {module: number of calls}
+        self.callers = {}
+
+    def add(self, duration, caller):
+        with _lock:
+            self.count += 1
+            self.total += duration
+            if duration > self.max:
+                self.max = duration
+            callers = self.callers
+            callers[caller] = callers.get(caller, 0) + 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'avg': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'callers': dict(self.callers),
+        }
+
+
+def _caller(frame):
+    # The first module outside of the hal package, so that calls through
+    # the wrappers in hal.functions are attributed to their caller
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '?')
+        if module != 'hal' and not module.startswith('hal.'):
+            return module
+        frame = frame.f_back
+    return '?'
+
+
+def _wrap(fn, name):
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = CallStats(name)
+
+    perf_counter = time.perf_counter
+    getframe = sys._getframe
+
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            stats.add(perf_counter() - start, _caller(getframe(1)))
+
+    wrapper.__name__ = name
+    wrapper.__wrapped__ = fn
+    if hasattr(fn, 'fndata'):
+        wrapper.fndata = fn.fndata
+    return wrapper
+
+
+def instrument(factory):
+    '''Wraps a function like _RETFUNC, so that the HAL functions that it
+    creates record their calls'''
+    def instrumented(name, *args, **kwargs):
+        fn = factory(name, *args, **kwargs)
+        if fn is None:
+            return None
+        return _wrap(fn, name)
+    return instrumented
+
+
+def reset():
+    '''Clears the statistics for all functions'''
+    with _lock:
+        for stats in _stats.values():
+            stats.reset()
+
+
+def get_stats():
+    '''
+        :returns: {name: statistics} for each HAL function that has been
+                  called, see :meth:`CallStats.to_dict`
+    '''
+    with _lock:
+        return {name: stats.to_dict() for name, stats in _stats.items() if stats.count}
+
+
+def dump_table(file=None, sort='total', limit=None):
+    '''Prints the statistics as a table
+
+    :param file: where to print to, defaults to stderr
+    :param sort: column to sort by (count, total, avg or max), largest first
+    :param limit: only print this many functions
+    '''
+    if file is None:
+        file = sys.stderr
+
+    stats = sorted(get_stats().items(), key=lambda item: item[1][sort], reverse=True)
+    if limit is not None:
+        stats = stats[:limit]
+
+    print("%-40s %10s %12s %10s %10s  %s" % ('function', 'count', 'total (ms)',
+                                            'avg (us)', 'max (us)', 'top caller'), file=file)
+    for name, s in stats:
+        caller = max(s['callers'].items(), key=lambda item: item[1])[0]
+        print("%-40s %10d %12.3f %10.2f %10.2f  %s" % (name, s['count'], s['total'] * 1e3,
+                                                      s['avg'] * 1e6, s['max'] * 1e6, caller),
+              file=file)
+
+
+def dump_json(file):
+    '''Writes the statistics to a file as JSON, in the format returned by
+    :func:`get_stats`
+
+    :param file: a filename or file object
+    '''
+    if isinstance(file, str):
+        with open(file, 'w') as fp:
+            json.dump(get_stats(), fp, indent=2, sort_keys=True)
+    else:
+        json.dump(get_stats(), file, indent=2, sort_keys=True)
@@ -1,5 +1,6 @@
 import ctypes as C
 import os as _os
+import threading as _threading
 import warnings
 
 from .exceptions import HALError
@@ -9,6 +10,11 @@ from hal_impl.types import *
 from hal_impl.fndef import _RETFUNC, _THUNKFUNC, _VAR, _dll
 from hal_impl import __hal_simulation__
 
+from . import callstats as _callstats
+if _callstats.enabled:
+    _RETFUNC = _callstats.instrument(_RETFUNC)
+    _THUNKFUNC = _callstats.instrument(_THUNKFUNC)
+
 def hal_wrapper(f):
     '''Decorator to support introspection. The wrapped function must be
        the same name as the wrapper function, but start with an underscore
@@ -19,6 +25,23 @@ def hal_wrapper(f):
         f.fndata = wrapped.fndata
     return f
 
+class _StatusPool(_threading.local):
+    '''Status variables that are reused between calls on this thread,
+    so that each call doesn't need to create one. A status is taken out of
+    the pool during a call, so nested calls (such as from a simulation
+    callback) don't share them. Statuses in the pool are always 0.'''
+    def __init__(self):
+        self.free = []
+
+_status_pool = _StatusPool()
+
+def _status_error(status, rv):
+    if status < 0:
+        raise HALError(getHALErrorMessage(status))
+    # warn at the caller of the HAL function
+    warnings.warn(getHALErrorMessage(status), stacklevel=3)
+    return rv
+
 def _STATUSFUNC(name, restype, *params, out=None, library=_dll,
                 handle_missing=False, _inner_func=_RETFUNC):
     realparams = list(params)
@@ -34,15 +57,19 @@ def _STATUSFUNC(name, restype, *params, out=None, library=_dll,
     _inner = _inner_func(name, restype, *realparams, out=out, library=library,
                         errcheck=errcheck, handle_missing=handle_missing)
     def outer(*args, **kwargs):
-        status = C.c_int32(0)
-        rv = _inner(*args, status=status, **kwargs)
-        if status.value == 0:
-            return rv
-        elif status.value < 0:
-            raise HALError(getHALErrorMessage(status.value))
-        elif status.value > 0:
-            warnings.warn(getHALErrorMessage(status.value), stacklevel=2)
+        free = _status_pool.free
+        status = free.pop() if free else C.c_int32(0)
+        if kwargs:
+            rv = _inner(*args, status=status, **kwargs)
+        else:
+            rv = _inner(*args, status)
+        value = status.value
+        if value == 0:
+            free.append(status)
             return rv
+        status.value = 0
+        free.append(status)
+        return _status_error(value, rv)
     
     # Support introspection for API validation
     if hasattr(_inner, 'fndata'):
@@ -107,22 +134,31 @@ HALGetAllianceStation = _RETFUNC("HALGetAllianceStation", C.c_int, ("allianceSta
 
 _HALGetJoystickAxes = _RETFUNC("HALGetJoystickAxes", C.c_int, ("joystickNum", C.c_uint8), ("axes", HALJoystickAxes_ptr))
 @hal_wrapper
-def HALGetJoystickAxes(joystickNum):
+def HALGetJoystickAxes(joystickNum, axes=None):
+    # If a structure is passed in, it is filled in and returned instead, to
+    # avoid allocating a new one each time
+    if axes is not None:
+        _HALGetJoystickAxes(joystickNum, axes)
+        return axes
     axes = HALJoystickAxes()
     _HALGetJoystickAxes(joystickNum, axes)
     return [x for x in axes.axes[0:axes.count]]
 
 _HALGetJoystickPOVs = _RETFUNC("HALGetJoystickPOVs", C.c_int, ("joystickNum", C.c_uint8), ("povs", HALJoystickPOVs_ptr))
 @hal_wrapper
-def HALGetJoystickPOVs(joystickNum):
+def HALGetJoystickPOVs(joystickNum, povs=None):
+    if povs is not None:
+        _HALGetJoystickPOVs(joystickNum, povs)
+        return povs
     povs = HALJoystickPOVs()
     _HALGetJoystickPOVs(joystickNum, povs)
     return [x for x in povs.povs[0:povs.count]]
 
 _HALGetJoystickButtons = _RETFUNC("HALGetJoystickButtons", C.c_int, ("joystickNum", C.c_uint8), ("buttons", HALJoystickButtons_ptr))
 @hal_wrapper
-def HALGetJoystickButtons(joystickNum):
-    buttons = HALJoystickButtons()
+def HALGetJoystickButtons(joystickNum, buttons=None):
+    if buttons is None:
+        buttons = HALJoystickButtons()
     _HALGetJoystickButtons(joystickNum, buttons)
     return buttons
 
@@ -482,13 +518,14 @@ def initializeNotifier(processQueue):
     # magic instead to uniquify the callback handler
 
     # create bounce function to drop param
-    cb_func = _NotifierProcessQueueFunction(lambda mask, param: processQueue(mask))
+    cb_func = _NotifierProcessQueueFunction(lambda currentTime, param: processQueue(currentTime))
 
     # initialize notifier
-    notifier = _attachInterruptHandler(processQueue, cb_func, None)
+    notifier = _initializeNotifier(cb_func, None)
 
     # keep reference to bounce function
-    handlers = _notifierProcessQueueFunctions[notifier] = cb_func
+    _notifierProcessQueueFunctions[notifier] = cb_func
+    return notifier
 
 _cleanNotifier = _STATUSFUNC("cleanNotifier", None, ("notifier", Notifier_ptr))
 @hal_wrapper
@@ -668,3 +705,9 @@ HAL_WAIT_FOREVER = _VAR("HAL_WAIT_FOREVER", C.c_int32)
 delayTicks = _RETFUNC("delayTicks", None, ("ticks", C.c_int32))
 delayMillis = _RETFUNC("delayMillis", None, ("ms", C.c_double))
 delaySeconds = _RETFUNC("delaySeconds", None, ("s", C.c_double))
+
+# Let the implementation know that all of the functions have been defined,
+# in case it wants to save the work it did to create them
+import hal_impl.fndef as _fndef
+if hasattr(_fndef, '_functions_defined'):
+    _fndef._functions_defined()
@@ -1,7 +1,15 @@
+import os as _os
+
 # For robot code
 __halplatform__ = 'sim'
 __hal_simulation__ = True
 
+#: How often the simulated HAL functions check the parameters passed to
+#: them: 1 checks every call, 0 never checks (which is fastest), and N checks
+#: one in every N calls. Defaults to the HAL_VALIDATE environment variable,
+#: or 1. Must be set before hal is imported.
+validate = int(_os.environ.get('HAL_VALIDATE', 1))
+
 try:
     from .version import __version__
 except ImportError:
@@ -5,6 +5,7 @@
 from hal import constants
 import sys
 import copy
+import threading
 
 import logging
 logger = logging.getLogger('hal.data')
@@ -28,6 +29,71 @@ hal_in_data = {
 hal_newdata_sem = None
 
 
+# When batching is enabled, this holds the changes whose callbacks haven't
+# been called yet: {(id(d), k): (d, k, value before the first change)}
+_pending_notifications = None
+# Held while changing _pending_notifications, or replacing it
+_notifications_lock = threading.Lock()
+
+_missing = object()
+
+# The :class:`.Recorder` that is currently recording, if any
+_recorder = None
+
+# The path of every input in hal_data, built when it is first needed after
+# a reset. Only the keys are kept, as a simulator may replace a dict or list
+# in hal_data.
+_input_paths = None
+
+
+def set_batch_mode(enabled):
+    '''
+        When batch mode is enabled, NotifyDict callbacks aren't called when
+        a value is set. Instead, they are called once per key with the
+        latest value when :func:`flush_notifications` is called. Keys that
+        were changed and then set back to their original value aren't
+        notified at all. Callbacks registered with ``batch=False`` are
+        still called for every change.
+
+        Notifications are flushed at the start of each iteration of the
+        robot's main loop (when the robot calls one of the
+        ``HALNetworkCommunicationObserveUserProgram*`` functions), and when
+        the simulator sends a driver station packet. Nothing is delivered in
+        between, so a simulator that needs its callbacks while the robot
+        code isn't running its loop should call :func:`flush_notifications`
+        itself. Disabling batch mode flushes any pending notifications.
+    '''
+    global _pending_notifications
+    with _notifications_lock:
+        pending = _pending_notifications
+        if enabled:
+            if pending is None:
+                _pending_notifications = {}
+            return
+        _pending_notifications = None
+
+    if pending:
+        _deliver(pending)
+
+def flush_notifications():
+    '''Calls the callbacks for the changes made since the last flush, if
+    batch mode is enabled'''
+    global _pending_notifications
+    with _notifications_lock:
+        pending = _pending_notifications
+        if not pending:
+            return
+        _pending_notifications = {}
+
+    _deliver(pending)
+
+def _deliver(pending):
+    # Calls the callbacks for the pending notifications, without the lock
+    for d, k, old in pending.values():
+        v = d.get(k)
+        if v != old:
+            d._call(k, v, d._batched(k))
+
 
 class NotifyDict(dict):
     '''
@@ -37,13 +103,18 @@ class NotifyDict(dict):
         
         We only use these for some keys in the hal_data dict, 
         as not all keys are useful to listen to
+
+        Callbacks are only called when the value actually changes. A value
+        that is modified in place and then set again isn't a change.
     '''
-    __slots__ = ['cbs']
+    __slots__ = ['cbs', 'unbatched']
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cbs = {}
+        # {k: callbacks that are called even in batch mode}, if there are any
+        self.unbatched = None
         
-    def register(self, k, cb, notify=False):
+    def register(self, k, cb, notify=False, batch=True):
         '''
             register a function to be called when an item is set 
             with in this dictionary. We raise a key error if the 
@@ -54,12 +125,44 @@ class NotifyDict(dict):
             :param cb:       Function to be called if k is set. This function needs 
                              to take at least 2 parameters
             :param notify:   Calls the function cb after registering k                
+            :param batch:    If False, cb is called for every change even when
+                             batch mode is enabled, for callbacks that must
+                             see each change (such as interrupts watching for
+                             edges)
         '''
         if k not in self:
             raise KeyError("Cannot register for non-existant key '%s'" % k)
         self.cbs.setdefault(k, []).append(cb)
+        if not batch:
+            if self.unbatched is None:
+                self.unbatched = {}
+            self.unbatched.setdefault(k, []).append(cb)
         if notify:
             cb(k, self[k])
+
+    def unregister(self, k, cb):
+        '''
+            Removes a function registered with :meth:`register`
+
+            :param k:        Key the function was registered for
+            :param cb:       The function
+        '''
+        cbs = self.cbs.get(k)
+        if cbs is None or cb not in cbs:
+            raise ValueError("%s is not registered for '%s'" % (cb, k))
+        cbs.remove(cb)
+        if not cbs:
+            del self.cbs[k]
+
+        unbatched = self.unbatched
+        if unbatched is not None and cb in unbatched.get(k, ()):
+            unbatched[k].remove(cb)
+            if not unbatched[k]:
+                del unbatched[k]
+
+    def get_subscriber_count(self, k):
+        ''':returns: the number of functions registered for k'''
+        return len(self.cbs.get(k, ()))
         
     def __setitem__(self, k, v):
         '''
@@ -68,16 +171,180 @@ class NotifyDict(dict):
            
            :param k: key to be set
            :param v: value to be set
-        '''     
+        '''
+        if k not in self.cbs:
+            super().__setitem__(k, v)
+            return
+
+        old = self.get(k, _missing)
         super().__setitem__(k, v)
-        
+        self._notify(k, old, v)
+
+    def _notify(self, k, old, v):
+        # Called after a key with callbacks has been set
+        if _pending_notifications is not None:
+            unbatched = self.unbatched
+            if unbatched is not None and k in unbatched and (old is _missing or old != v):
+                self._call(k, v, unbatched[k])
+
+            with _notifications_lock:
+                # batch mode may have been disabled or flushed meanwhile
+                pending = _pending_notifications
+                if pending is not None:
+                    key = (id(self), k)
+                    if key not in pending:
+                        pending[key] = (self, k, old)
+                    return
+        if old is _missing or old != v:
+            self._call(k, v)
+
+    def _call(self, k, v, cbs=None):
         # Call the callbacks
-        for cb in self.cbs.get(k, []):
+        if cbs is None:
+            cbs = self.cbs.get(k, ())
+        for cb in cbs:
             try:
                 cb(k, v)
             except:
                 logger.exception("BAD INTERNAL ERROR")
-    
+
+    def _batched(self, k):
+        # The callbacks for k that are delivered by flush_notifications
+        cbs = self.cbs.get(k, ())
+        unbatched = self.unbatched
+        if unbatched is None or k not in unbatched:
+            return cbs
+        return [cb for cb in cbs if cb not in unbatched[k]]
+
+
+class ChannelView(NotifyDict):
+    '''
+        The dictionary for a single channel of a :class:`ChannelStore`. The
+        values of the store's fields are read from and written to the store;
+        any other keys are kept in the dictionary itself.
+
+        The dictionary contains every field as a key (with a placeholder
+        value), so that the key operations don't need to be overridden.
+    '''
+    __slots__ = ['store', 'index']
+
+    def __init__(self, store, index):
+        super().__init__(dict.fromkeys(store.columns))
+        self.store = store
+        self.index = index
+
+    def register(self, k, cb, notify=False, batch=True):
+        super().register(k, cb, notify, batch)
+        self.store.watched += 1
+
+    def unregister(self, k, cb):
+        super().unregister(k, cb)
+        self.store.watched -= 1
+
+    def __getitem__(self, k):
+        column = self.store.columns.get(k)
+        if column is None:
+            return dict.__getitem__(self, k)
+        return column[self.index]
+
+    def __setitem__(self, k, v):
+        column = self.store.columns.get(k)
+        watched = k in self.cbs
+        if watched:
+            old = self.get(k, _missing)
+        if column is None:
+            dict.__setitem__(self, k, v)
+        else:
+            column[self.index] = v
+        if watched:
+            self._notify(k, old, v)
+
+    def __delitem__(self, k):
+        if k in self.store.columns:
+            raise KeyError("Cannot delete '%s' from hal_data" % k)
+        dict.__delitem__(self, k)
+
+    def __iter__(self):
+        # overriding this stops dict() from copying the placeholders
+        return dict.__iter__(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return dict(self.items()) != other
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        # copies are plain dictionaries
+        return (dict, (dict(self.items()),))
+
+    def get(self, k, default=None):
+        column = self.store.columns.get(k)
+        if column is None:
+            return dict.get(self, k, default)
+        return column[self.index]
+
+    def values(self):
+        return [self[k] for k in self]
+
+    def items(self):
+        return [(k, self[k]) for k in self]
+
+    def copy(self):
+        return dict(self.items())
+
+    def update(self, *args, **kwargs):
+        for k, v in dict(*args, **kwargs).items():
+            self[k] = v
+
+    def setdefault(self, k, default=None):
+        if k not in self:
+            self[k] = default
+        return self[k]
+
+    def pop(self, k, *default):
+        if k in self.store.columns:
+            raise KeyError("Cannot delete '%s' from hal_data" % k)
+        return dict.pop(self, k, *default)
+
+
+class ChannelStore(list):
+    '''
+        Stores the data for a number of identical channels, such as the PWM
+        outputs. Each field is kept in a single list indexed by the channel
+        number, which the HAL functions use directly.
+
+        The store is also a list of :class:`ChannelView` objects, so that
+        ``hal_data['pwm'][3]['value']`` works the same as it does for the
+        rest of hal_data.
+    '''
+    __slots__ = ['columns', 'watched']
+
+    def __init__(self, fields, count):
+        '''
+            :param fields: dictionary of field names and initial values
+            :param count:  number of channels
+        '''
+        super().__init__()
+        self.columns = {k: [v]*count for k, v in fields.items()}
+        #: Number of callbacks registered on the channels of this store
+        self.watched = 0
+        self.extend(ChannelView(self, i) for i in range(count))
+
+    def set(self, index, k, v):
+        '''Sets a field of a channel, calling any callbacks registered for it'''
+        if self.watched:
+            self[index][k] = v
+        else:
+            self.columns[k][index] = v
+
 
 class IN:
     '''Marks a variable in the dict as something the simulator can set'''
@@ -110,13 +377,22 @@ def _reset_hal_data(hooks):
         .. warning:: Don't put invalid floats in here, or this structure
                      is no longer JSON serializable!
     '''
-    global hal_data, hal_newdata_sem
+    global hal_data, hal_newdata_sem, _pending_notifications, _input_paths
     hal_newdata_sem = None
+    _input_paths = None
+
+    # notifications for the old data don't matter anymore
+    if _pending_notifications is not None:
+        _pending_notifications = {}
+
+    # a recording can't follow the data across a reset
+    if _recorder is not None:
+        _recorder.stop()
     
-    hal_data.clear()
-    hal_in_data.clear()
-    
-    hal_data.update({
+    # The new data is built separately and then swapped in, as finalizers
+    # for objects from before the reset (such as DigitalSource) may run at
+    # any time, and expect hal_data to have all of its keys
+    new_data = {
 
         'alliance_station': IN(constants.kHALAllianceStationID_red1),
 
@@ -199,14 +475,14 @@ def _reset_hal_data(hooks):
 
         # 8 analog channels, each is a dictionary.
 
-        'analog_out': [NotifyDict({
+        'analog_out': ChannelStore({
             'initialized': OUT(False),
             'voltage': OUT(0.0),
 
-        }) for _ in range(8)],
+        }, 8),
 
         # TODO: make this easier to use
-        'analog_in': [NotifyDict({
+        'analog_in': ChannelStore({
             'has_source':       IN(False),
             'initialized':      OUT(False),
             'avg_bits':         OUT(0),
@@ -224,7 +500,7 @@ def _reset_hal_data(hooks):
             'accumulator_count':    IN(1), # don't make zero, or divide by zero error occurs
             'accumulator_deadband': OUT(0),
 
-        }) for _ in range(8)],
+        }, 8),
 
         'analog_trigger': [{
             'has_source':   IN(False),
@@ -252,7 +528,7 @@ def _reset_hal_data(hooks):
         
         # pwm contains dicts with keys: value, period_scale
         # -> value isn't sane
-        'pwm': [NotifyDict({
+        'pwm': ChannelStore({
             'initialized':  OUT(False),
             'type':         OUT(None),   # string value set by HALReport: jaguar, victor, talon, etc
             'raw_value':    OUT(0), # raw value that is used by wpilib represents the hardware PWM value
@@ -260,7 +536,7 @@ def _reset_hal_data(hooks):
             'period_scale': OUT(None),
             'zero_latch':   OUT(False),
 
-        }) for _ in range(20)],
+        }, 20),
 
         'pwm_loop_timing': IN(40), # this is the value the roboRIO returns
                
@@ -268,12 +544,12 @@ def _reset_hal_data(hooks):
         'd0_pwm':       OUT([None]*6), # dict with keys: duty_cycle, pin
         'd0_pwm_rate':  OUT(None),
                 
-        'relay': [NotifyDict({
+        'relay': ChannelStore({
             'initialized': OUT(False),
             'fwd':         OUT(False),
             'rev':         OUT(False),
 
-        }) for _ in range(8)],
+        }, 8),
 
         #Keep track of used MXP dio ports
         'mxp': [{
@@ -281,7 +557,7 @@ def _reset_hal_data(hooks):
 
         } for _ in range(16)],
                 
-        'dio': [NotifyDict({
+        'dio': ChannelStore({
             'has_source':   IN(False),
             'initialized':  OUT(False),
             'value':        IN(False), # technically both
@@ -289,7 +565,7 @@ def _reset_hal_data(hooks):
             'is_input':     OUT(False),
             'filter_idx':   OUT(None), # is None or filter number
             
-        }) for _ in range(26)],
+        }, 26),
         
         # Digital glitch filter:    
         'filter': [NotifyDict({
@@ -360,10 +636,10 @@ def _reset_hal_data(hooks):
         },
 
         # solenoid values are True, False 
-        'solenoid': [NotifyDict({
+        'solenoid': ChannelStore({
             'initialized': OUT(False),
             'value':       OUT(None)
-        }) for _ in range(8)],
+        }, 8),
 
         'pdp': {
             'has_source':    IN(False),
@@ -378,11 +654,21 @@ def _reset_hal_data(hooks):
         # The key is the device number as an integer. The value is a dictionary
         # that is specific to each CAN device
         'CAN': NotifyDict(),
-    })
+    }
     
     # Ok, filter out the data into a 'both' and 'in' dictionary, removing
     # the OUT and IN objects
-    _filter_hal_data(hal_data, hal_in_data)
+    new_in_data = {}
+    _filter_hal_data(new_data, new_in_data)
+    
+    _swap_dict(hal_data, new_data)
+    _swap_dict(hal_in_data, new_in_data)
+
+def _swap_dict(d, new):
+    # replaces the contents of d, without it ever missing a key that is in new
+    d.update(new)
+    for k in [k for k in d if k not in new]:
+        del d[k]
 
     
 def _filter_hal_data(both_dict, in_dict):
@@ -433,16 +719,82 @@ def _filter_hal_list(both_list):
 
 def update_hal_data(in_dict, out_dict=hal_data):
     '''Given a dictionary of inputs, update the hal_data'''
+    recorder = _recorder
+    if recorder is not None and out_dict is hal_data:
+        recorder.update_hal_data(in_dict, _update_hal_data)
+    else:
+        _update_hal_data(in_dict, out_dict)
+
+def _update_hal_data(in_dict, out_dict):
     for k, v in in_dict.items():
         if isinstance(v, dict):
-            update_hal_data(v, out_dict[k])
+            _update_hal_data(v, out_dict[k])
         elif isinstance(v, list):
             v_out = out_dict[k]
             for i, vv in enumerate(v):
                 if isinstance(vv, dict):
-                    update_hal_data(vv, v_out[i])
+                    _update_hal_data(vv, v_out[i])
                 else:
                     # This works, lists of lists are not allowed
                     v_out[i] = vv
         else:
             out_dict[k] = v
+
+def update_hal_data_delta(changes):
+    '''
+        Updates individual inputs in hal_data, which is much faster than
+        :func:`update_hal_data` when only a few inputs have changed.
+        
+        :param changes: A dictionary of {path: value}, where path is a tuple
+                        of the keys and list indices leading to the input
+                        in hal_data, such as ``('joysticks', 0, 'axes', 1)``
+        
+        :raises KeyError: if a path isn't an input
+    '''
+    paths = _input_paths
+    if paths is None:
+        paths = get_input_paths()
+    
+    recorder = _recorder
+    if recorder is not None:
+        recorder.update_hal_data_delta(changes, _update_hal_data_delta)
+    else:
+        _update_hal_data_delta(changes, paths)
+
+def _update_hal_data_delta(changes, paths=None):
+    if paths is None:
+        paths = _input_paths
+    for path, v in changes.items():
+        if path not in paths:
+            raise KeyError("%r is not an input in hal_data" % (path,))
+        container = hal_data
+        for k in path[:-1]:
+            container = container[k]
+        container[path[-1]] = v
+
+def get_input_paths():
+    '''
+        :returns: A frozenset of the path of every input in hal_data. These
+                  are the paths accepted by :func:`update_hal_data_delta`.
+    '''
+    global _input_paths
+    if _input_paths is None:
+        paths = set()
+        _compile_input_paths(hal_in_data, (), paths)
+        _input_paths = frozenset(paths)
+    return _input_paths
+
+def _compile_input_paths(in_dict, path, paths):
+    # walks hal_in_data in the same way as update_hal_data
+    for k, v in in_dict.items():
+        p = path + (k,)
+        if isinstance(v, dict):
+            _compile_input_paths(v, p, paths)
+        elif isinstance(v, list):
+            for i, vv in enumerate(v):
+                if isinstance(vv, dict):
+                    _compile_input_paths(vv, p + (i,), paths)
+                else:
+                    paths.add(p + (i,))
+        else:
+            paths.add(p)
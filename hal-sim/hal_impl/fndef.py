@@ -4,13 +4,116 @@
 #
 
 import ctypes as C
-import inspect
+import hashlib
+import importlib.util
+import itertools
+import marshal
 import os
+import sys
 
+import hal_impl
 from . import functions as _dll
+from . import types as _types
 
 __all__ = ["_dll", "_RETFUNC", "_VAR"]
 
+#
+# Generating the functions is slow, so the generated functions are saved as
+# bytecode in __pycache__, and loaded from there the next time. The cache
+# is only used with the exact versions of the files that the functions were
+# generated from (see _source_files). Set HAL_NOCACHE to disable it.
+#
+
+# where the cache is, or None if it isn't being used
+_cache_file = None
+
+# namespace containing the cached functions, if they were loaded
+_cache = None
+
+# {name: source} of the functions generated by this import, to be cached
+_generated = {}
+
+# see hal_impl.validate
+_validate = hal_impl.validate
+
+# {name: (name, restype, params, out)} for each function that is defined.
+# The functions that this module creates also have it as their fndata
+# attribute; the ones that are the implementation functions don't.
+fndata = {}
+
+def _source_files():
+    '''The files that the generated functions are built from: the function
+    definitions, their implementations, the types that they use, and the
+    generator itself'''
+    return (importlib.util.find_spec('hal.functions').origin,
+            _dll.__file__, _types.__file__, __file__)
+
+def _init_cache():
+    global _cache_file, _cache
+
+    # only functions that check every call are cached
+    if os.environ.get('HAL_NOCACHE') or os.environ.get('HAL_NOSTRICT') or \
+       _validate != 1:
+        return
+
+    tag = sys.implementation.cache_tag
+    if tag is None:
+        return
+
+    try:
+        h = hashlib.sha1()
+        for fname in _source_files():
+            with open(fname, 'rb') as fp:
+                h.update(fp.read())
+    except Exception:
+        return
+
+    _cache_file = os.path.join(os.path.dirname(__file__), '__pycache__',
+                               'fndef.%s.%s.pyc' % (h.hexdigest()[:16], tag))
+
+    try:
+        with open(_cache_file, 'rb') as fp:
+            if fp.read(len(importlib.util.MAGIC_NUMBER)) != importlib.util.MAGIC_NUMBER:
+                return
+            code = marshal.load(fp)
+    except (OSError, EOFError, ValueError, TypeError):
+        return
+
+    namespace = {'_dll': _dll}
+    exec(code, namespace)
+    _cache = namespace
+
+def _functions_defined():
+    '''Called by hal.functions once all of the functions have been
+    defined, saves any functions that were generated to the cache'''
+    global _generated
+    generated, _generated = _generated, None
+    if not generated or _cache_file is None:
+        return
+
+    cache_dir = os.path.dirname(_cache_file)
+    try:
+        code = compile('\n\n'.join(generated.values()), '<hal_impl.fndef cache>', 'exec')
+
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = '%s.%d' % (_cache_file, os.getpid())
+        with open(tmp, 'wb') as fp:
+            fp.write(importlib.util.MAGIC_NUMBER)
+            marshal.dump(code, fp)
+        os.replace(tmp, _cache_file)
+
+        # remove caches for older versions of the files. Caches made by
+        # other interpreters, and the bytecode of this module, are kept
+        tag = sys.implementation.cache_tag
+        for fname in os.listdir(cache_dir):
+            parts = fname.split('.')
+            path = os.path.join(cache_dir, fname)
+            if len(parts) == 4 and parts[0] == 'fndef' and len(parts[1]) == 16 and \
+               parts[2:] == [tag, 'pyc'] and path != _cache_file:
+                os.unlink(path)
+    except OSError:
+        pass
+
 def gen_check(pname, ptype):
     
     # TODO: This does checks on normal types, but if you pass a ctypes value
@@ -59,7 +162,7 @@ def gen_check(pname, ptype):
         return None
 
 
-def gen_func(f, name, restype, params, out, _thunk):
+def gen_func(f, name, restype, params, out, _thunk, validate=1):
 
     args = []
     callargs = []
@@ -77,7 +180,7 @@ def gen_func(f, name, restype, params, out, _thunk):
         pname, ptype = param[:2]
 
         if pname not in out:
-            check = gen_check(pname, ptype)
+            check = gen_check(pname, ptype) if validate else None
             
             if check is not None:
                 # the check is an assert, but we provide a better error message
@@ -92,9 +195,15 @@ def gen_func(f, name, restype, params, out, _thunk):
             callargs.append(pname)
 
     # double check that our simulated HAL is correct
+    import inspect
     info = inspect.getfullargspec(f)
     assert info.args == callargs, '%s != %s' % (info.args, args)
 
+    # only check one in every N calls: _sample counts from 0 to N-1
+    if validate > 1 and len(checks) > int(_thunk):
+        checks[int(_thunk):] = ['if not next(_sample):'] + \
+                               ['    ' + check for check in checks[int(_thunk):]]
+
     # Create the function body to be exec'ed
     return inspect.cleandoc('''
         def %s(%s):
@@ -117,8 +226,27 @@ def _RETFUNC(name, restype, *params, out=None, library=_dll,
             return
         raise
 
+    if _cache is not None and name in _cache:
+        retfunc = _cache[name]
+    elif _validate == 0 and not _thunk and not any(len(p) == 3 for p in params):
+        # nothing to check, so call the implementation directly
+        retfunc = fn
+    else:
+        retfunc = _gen_retfunc(fn, name, restype, params, out, _thunk)
+        if retfunc is None:
+            return
+    
+    # Store function definition data for API validation
+    fndata[name] = (name, restype, params, out)
+    if retfunc is not fn:
+        retfunc.fndata = fndata[name]
+    return retfunc
+
+def _gen_retfunc(fn, name, restype, params, out, _thunk):
+    global _generated
+
     try:
-        fn_body = gen_func(fn, name, restype, params, out, _thunk)
+        fn_body = gen_func(fn, name, restype, params, out, _thunk, _validate)
     except AssertionError:
         if os.environ.get('HAL_NOSTRICT'):
             return
@@ -130,15 +258,21 @@ def _RETFUNC(name, restype, *params, out=None, library=_dll,
         elocals = {}
     else:
         elocals = {'_dll': _dll}
+    
+    if _validate > 1:
+        elocals['_sample'] = itertools.cycle(range(_validate))
         
     exec(fn_body, elocals)
 
+    if _generated is not None:
+        # the cache can only hold one function with each name
+        if _generated.get(name, fn_body) != fn_body:
+            _generated = None
+        else:
+            _generated[name] = fn_body
+
     # return the created func
-    retfunc = elocals[name]
-    
-    # Store function definition data for API validation
-    retfunc.fndata = (name, restype, params, out)
-    return retfunc
+    return elocals[name]
 
 def _THUNKFUNC(*a, **k):
     '''This is the same as _RETFUNC, except that in simulation mode you should
@@ -153,3 +287,5 @@ def _THUNKFUNC(*a, **k):
 def _VAR(name, type, library=_dll):
     '''These are always constants, so it's ok to return a value'''
     return getattr(_dll, name)
+
+_init_cache()
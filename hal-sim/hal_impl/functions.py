@@ -2,6 +2,9 @@
 from hal import constants
 from . import types
 
+import collections
+import heapq
+import itertools
 import threading
 
 from . import data
@@ -15,8 +18,20 @@ logger = logging.getLogger('hal')
 hooks = SimHooks()
 
 def reset_hal():
+    global _notifier_queue, _notifier_thread, _interrupt_queue, _interrupt_thread
+
     data._reset_hal_data(hooks)
 
+    # Alarms set before the reset are forgotten. A thread left over from
+    # before the reset only services the old alarms, and exits once it is
+    # idle or its hooks are stopped.
+    _notifier_queue = []
+    _notifier_thread = None
+
+    # The same goes for the handlers of asynchronous interrupts
+    _interrupt_queue = collections.deque()
+    _interrupt_thread = None
+
 reset_hal()
 
 #
@@ -99,11 +114,11 @@ def deleteMultiWait(sem):
 
 def takeMultiWait(sem, mutex):
     with sem.cond:
-        sem.cond.wait()
+        hooks.waitOnCondition(sem.cond, None)
 
 def giveMultiWait(sem):
     with sem.cond:
-        sem.cond.notify_all() # hal uses pthread_cond_broadcast, which wakes all threads
+        hooks.notifyCondition(sem.cond) # hal uses pthread_cond_broadcast, which wakes all threads
 
 
 #############################################################################
@@ -295,15 +310,19 @@ def HALNetworkCommunicationObserveUserProgramStarting():
     hal_data['user_program_state'] = 'starting'
 
 def HALNetworkCommunicationObserveUserProgramDisabled():
+    data.flush_notifications()
     hal_data['user_program_state'] = 'disabled'
 
 def HALNetworkCommunicationObserveUserProgramAutonomous():
+    data.flush_notifications()
     hal_data['user_program_state'] = 'autonomous'
 
 def HALNetworkCommunicationObserveUserProgramTeleop():
+    data.flush_notifications()
     hal_data['user_program_state'] = 'teleop'
 
 def HALNetworkCommunicationObserveUserProgramTest():
+    data.flush_notifications()
     hal_data['user_program_state'] = 'test'
 
 def HALReport(resource, instanceNumber, context=0, feature=None):
@@ -411,7 +430,7 @@ def setAnalogAverageBits(analog_port, bits, status):
 
 def getAnalogAverageBits(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['avg_bits']
+    return hal_data['analog_in'].columns['avg_bits'][analog_port.pin]
 
 def setAnalogOversampleBits(analog_port, bits, status):
     status.value = 0
@@ -419,15 +438,15 @@ def setAnalogOversampleBits(analog_port, bits, status):
 
 def getAnalogOversampleBits(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['oversample_bits']
+    return hal_data['analog_in'].columns['oversample_bits'][analog_port.pin]
 
 def getAnalogValue(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['value']
+    return hal_data['analog_in'].columns['value'][analog_port.pin]
 
 def getAnalogAverageValue(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['avg_value']
+    return hal_data['analog_in'].columns['avg_value'][analog_port.pin]
 
 def getAnalogVoltsToValue(analog_port, voltage, status):
     status.value = 0
@@ -444,19 +463,19 @@ def getAnalogVoltsToValue(analog_port, voltage, status):
 
 def getAnalogVoltage(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['voltage']
+    return hal_data['analog_in'].columns['voltage'][analog_port.pin]
 
 def getAnalogAverageVoltage(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['avg_voltage']
+    return hal_data['analog_in'].columns['avg_voltage'][analog_port.pin]
 
 def getAnalogLSBWeight(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['lsb_weight']
+    return hal_data['analog_in'].columns['lsb_weight'][analog_port.pin]
 
 def getAnalogOffset(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['offset']
+    return hal_data['analog_in'].columns['offset'][analog_port.pin]
 
 def isAccumulatorChannel(analog_port, status):
     status.value = 0
@@ -482,16 +501,17 @@ def setAccumulatorDeadband(analog_port, deadband, status):
 
 def getAccumulatorValue(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['accumulator_value']
+    return hal_data['analog_in'].columns['accumulator_value'][analog_port.pin]
 
 def getAccumulatorCount(analog_port, status):
     status.value = 0
-    return hal_data['analog_in'][analog_port.pin]['accumulator_count']
+    return hal_data['analog_in'].columns['accumulator_count'][analog_port.pin]
 
 def getAccumulatorOutput(analog_port, status):
     status.value = 0
-    return (hal_data['analog_in'][analog_port.pin]['accumulator_value'],
-           hal_data['analog_in'][analog_port.pin]['accumulator_count'])
+    columns = hal_data['analog_in'].columns
+    return (columns['accumulator_value'][analog_port.pin],
+            columns['accumulator_count'][analog_port.pin])
 
 def initializeAnalogTrigger(port, status):
     status.value = 0
@@ -684,8 +704,9 @@ def remapMXPPWMChannel(pin):
 
 def setPWM(digital_port, value, status):
     status.value = 0
-    hal_data['pwm'][digital_port.pin]['raw_value'] = value
-    hal_data['pwm'][digital_port.pin]['value'] = reverseByType(digital_port.pin)
+    pwm = hal_data['pwm']
+    pwm.set(digital_port.pin, 'raw_value', value)
+    pwm.set(digital_port.pin, 'value', reverseByType(digital_port.pin))
 
 def allocatePWMChannel(digital_port, status):
     status.value = 0
@@ -722,7 +743,7 @@ def freePWMChannel(digital_port, status):
 
 def getPWM(digital_port, status):
     status.value = 0
-    return hal_data['pwm'][digital_port.pin]['raw_value']
+    return hal_data['pwm'].columns['raw_value'][digital_port.pin]
 
 def latchPWMZero(digital_port, status):
     # TODO: what does this do?
@@ -771,22 +792,22 @@ def setPWMOutputChannel(pwm, pin, status):
 
 def setRelayForward(digital_port, on, status):
     status.value = 0
-    relay = hal_data['relay'][digital_port.pin]
-    relay['initialized'] = True
-    relay['fwd'] = on
+    relay = hal_data['relay']
+    relay.set(digital_port.pin, 'initialized', True)
+    relay.set(digital_port.pin, 'fwd', on)
 
 def setRelayReverse(digital_port, on, status):
     status.value = 0
-    relay = hal_data['relay'][digital_port.pin]
-    relay['initialized'] = True
-    relay['rev'] = on
+    relay = hal_data['relay']
+    relay.set(digital_port.pin, 'initialized', True)
+    relay.set(digital_port.pin, 'rev', on)
 
 def getRelayForward(digital_port, status):
-    return hal_data['relay'][digital_port.pin]['fwd']
+    return hal_data['relay'].columns['fwd'][digital_port.pin]
 
 def getRelayReverse(digital_port, status):
     status.value = 0
-    return hal_data['relay'][digital_port.pin]['rev']
+    return hal_data['relay'].columns['rev'][digital_port.pin]
 
 #
 # DIO
@@ -818,15 +839,15 @@ def freeDIO(digital_port, status):
 
 def setDIO(digital_port, value, status):
     status.value = 0
-    hal_data['dio'][digital_port.pin]['value'] = True if value else False
+    hal_data['dio'].set(digital_port.pin, 'value', True if value else False)
 
 def getDIO(digital_port, status):
     status.value = 0
-    return bool(hal_data['dio'][digital_port.pin]['value'])
+    return bool(hal_data['dio'].columns['value'][digital_port.pin])
 
 def getDIODirection(digital_port, status):
     status.value = 0
-    return hal_data['dio'][digital_port.pin]['is_input']
+    return hal_data['dio'].columns['is_input'][digital_port.pin]
 
 def pulse(digital_port, pulse_length, status):
     status.value = 0
@@ -834,13 +855,13 @@ def pulse(digital_port, pulse_length, status):
 
 def isPulsing(digital_port, status):
     status.value = 0
-    return hal_data['dio'][digital_port.pin]['pulse_length'] is not None
+    return hal_data['dio'].columns['pulse_length'][digital_port.pin] is not None
 
 def isAnyPulsing(status):
     status.value = 0
     
-    for p in hal_data['dio']:
-        if p is not None and p['pulse_length'] is not None:
+    for pulse_length in hal_data['dio'].columns['pulse_length']:
+        if pulse_length is not None:
             return True
     return False
     
@@ -1189,55 +1210,248 @@ def i2CClose(port):
 # Interrupts
 #############################################################################
 
+# Interrupts watch the value of a digital input in hal_data, using a
+# NotifyDict callback, and timestamp each edge with the FPGA time. Threads in
+# waitForInterrupt wait on _interrupt_cond. The handlers of asynchronous
+# interrupts are called by a single thread shared by every interrupt, which
+# runs while there are edges in _interrupt_queue.
+#
+# As on the roboRIO, the mask for a rising edge is (1 << index), and for a
+# falling edge (1 << (8 + index)).
+
+_interrupt_cond = threading.Condition()
+_interrupt_queue = collections.deque()
+_interrupt_thread = None
+
+def _interrupt_run():
+    global _interrupt_thread
+
+    queue = _interrupt_queue
+
+    while True:
+        with _interrupt_cond:
+            if not queue:
+                if _interrupt_thread is threading.current_thread():
+                    _interrupt_thread = None
+                return
+
+            interrupt, mask = queue.popleft()
+            handler = interrupt.handler
+            param = interrupt.param
+            if handler is None or not interrupt.enabled:
+                continue
+
+        # The handler may wait for something else, so don't hold the lock
+        try:
+            handler(mask, param)
+        except:
+            logger.exception("Unhandled exception in interrupt handler")
+
+def _interrupt_edge(interrupt, value):
+    global _interrupt_thread
+
+    now = hooks.getFPGATime()
+
+    with _interrupt_cond:
+        if value:
+            if not interrupt.rising:
+                return
+            interrupt.risingTimestamp = now
+            mask = 1 << interrupt.index
+        else:
+            if not interrupt.falling:
+                return
+            interrupt.fallingTimestamp = now
+            mask = 1 << (8 + interrupt.index)
+
+        if interrupt.watcher:
+            interrupt.pending |= mask
+            hooks.notifyCondition(_interrupt_cond)
+
+        elif interrupt.enabled and interrupt.handler is not None:
+            _interrupt_queue.append((interrupt, mask))
+            if _interrupt_thread is None:
+                _interrupt_thread = threading.Thread(target=_interrupt_run, name="HALInterrupts", daemon=True)
+                hooks.addThread(_interrupt_thread)
+                _interrupt_thread.start()
+
+def _interrupt_unroute(interrupt):
+    # must be called with _interrupt_cond held
+    if interrupt.dio is not None:
+        interrupt.dio.unregister('value', interrupt.cb)
+        interrupt.dio = None
+        interrupt.cb = None
+
 def initializeInterrupts(interrupt_index, watcher, status):
-    assert False # TODO
+    status.value = 0
+    return types.Interrupt(interrupt_index, watcher)
 
 def cleanInterrupts(interrupt, status):
-    assert False # TODO
+    status.value = 0
+    with _interrupt_cond:
+        _interrupt_unroute(interrupt)
+        interrupt.handler = None
+        interrupt.enabled = False
+        interrupt.valid = False
+        # wake up anything waiting for it
+        hooks.notifyCondition(_interrupt_cond)
 
 def waitForInterrupt(interrupt, timeout, ignorePrevious, status):
-    assert False # TODO
+    status.value = 0
+    with _interrupt_cond:
+        if ignorePrevious:
+            interrupt.pending = 0
+
+        if not interrupt.pending:
+            # a timeout isn't an error, the result is 0. If the interrupt
+            # isn't routed to an input, it still waits for the timeout.
+            deadline = hooks.getFPGATime() + int(timeout * 1000000)
+            while not interrupt.pending and interrupt.valid:
+                remaining = deadline - hooks.getFPGATime()
+                if remaining <= 0:
+                    break
+                if not hooks.waitOnCondition(_interrupt_cond, remaining / 1000000.0):
+                    break
+
+        mask = interrupt.pending
+        interrupt.pending = 0
+        return mask
 
 def enableInterrupts(interrupt, status):
-    assert False # TODO
+    status.value = 0
+    with _interrupt_cond:
+        interrupt.enabled = True
 
 def disableInterrupts(interrupt, status):
-    assert False # TODO
+    status.value = 0
+    with _interrupt_cond:
+        interrupt.enabled = False
 
 def readRisingTimestamp(interrupt, status):
-    assert False # TODO
+    status.value = 0
+    return interrupt.risingTimestamp * 1e-6
 
 def readFallingTimestamp(interrupt, status):
-    assert False # TODO
+    status.value = 0
+    return interrupt.fallingTimestamp * 1e-6
 
 def requestInterrupts(interrupt, routing_module, routing_pin, routing_analog_trigger, status):
-    assert False # TODO
+    assert not routing_analog_trigger, "Interrupts from analog triggers are not simulated"
+    status.value = 0
+
+    dio = hal_data['dio'][routing_pin]
+    cb = lambda k, v: _interrupt_edge(interrupt, v)
+
+    with _interrupt_cond:
+        _interrupt_unroute(interrupt)
+        interrupt.dio = dio
+        interrupt.cb = cb
+        interrupt.pending = 0
+        # every edge matters, even in batch mode
+        dio.register('value', cb, batch=False)
 
 def attachInterruptHandler(interrupt, handler, param, status):
-    assert False # TODO
+    status.value = 0
+    with _interrupt_cond:
+        interrupt.handler = handler
+        interrupt.param = param
 
 def setInterruptUpSourceEdge(interrupt, rising_edge, falling_edge, status):
-    assert False # TODO
+    status.value = 0
+    with _interrupt_cond:
+        interrupt.rising = bool(rising_edge)
+        interrupt.falling = bool(falling_edge)
 
 
 #############################################################################
 # Notifier
 #############################################################################
 
+# All notifiers are serviced by a single alarm thread, which sleeps until the
+# earliest alarm expires. Alarms are kept in a heap of (triggerTime, sequence,
+# notifier); when an alarm is moved or stopped, the old entry is left in the
+# heap and thrown away when it reaches the front.
+
+_notifier_cond = threading.Condition()
+_notifier_queue = []
+_notifier_sequence = itertools.count()
+_notifier_thread = None
+
+def _notifier_run():
+    global _notifier_thread
+
+    queue = _notifier_queue
+
+    while True:
+        with _notifier_cond:
+            while True:
+                # discard stale alarms
+                while queue and queue[0][2].alarm != queue[0][1]:
+                    heapq.heappop(queue)
+
+                if not queue:
+                    if _notifier_thread is threading.current_thread():
+                        _notifier_thread = None
+                    return
+
+                triggerTime, _, notifier = queue[0]
+                currentTime = hooks.getFPGATime()
+
+                if triggerTime <= currentTime:
+                    heapq.heappop(queue)
+                    notifier.alarm = None
+                    processQueue = notifier.processQueue
+                    break
+
+                if not hooks.waitOnCondition(_notifier_cond, (triggerTime - currentTime) / 1000000.0):
+                    # the simulation has stopped, so the alarm will never expire
+                    if _notifier_thread is threading.current_thread():
+                        _notifier_thread = None
+                    return
+
+        # The callback may update the alarm, so don't hold the lock
+        try:
+            processQueue(currentTime, notifier.param)
+        except:
+            logger.exception("Unhandled exception in notifier callback")
+
 def initializeNotifier(processQueue, param, status):
-    assert False # TODO
+    status.value = 0
+    return types.Notifier(processQueue, param)
 
 def cleanNotifier(notifier, status):
-    assert False # TODO
+    status.value = 0
+    with _notifier_cond:
+        notifier.alarm = None
+        notifier.processQueue = None
     
 def getNotifierParam(notifier, status):
-    assert False # TODO
+    status.value = 0
+    return notifier.param
 
 def updateNotifierAlarm(notifier, triggerTime, status):
-    assert False # TODO
+    global _notifier_thread
+
+    status.value = 0
+    with _notifier_cond:
+        if notifier.processQueue is None:
+            return
+
+        notifier.alarm = next(_notifier_sequence)
+        heapq.heappush(_notifier_queue, (triggerTime, notifier.alarm, notifier))
+
+        if _notifier_thread is None:
+            _notifier_thread = threading.Thread(target=_notifier_run, name="HALNotifier", daemon=True)
+            hooks.addThread(_notifier_thread)
+            _notifier_thread.start()
+        else:
+            # the new alarm may be earlier than the one being waited on
+            hooks.notifyCondition(_notifier_cond)
 
 def stopNotifierAlarm(notifier, status):
-    assert False # TODO
+    status.value = 0
+    with _notifier_cond:
+        notifier.alarm = None
 
 #############################################################################
 # PDP
@@ -1360,18 +1574,18 @@ def checkSolenoidModule(module):
 
 def getSolenoid(solenoid_port, status):
     status.value = 0
-    return hal_data['solenoid'][solenoid_port.pin]['value']
+    return hal_data['solenoid'].columns['value'][solenoid_port.pin]
 
 def getAllSolenoids(solenoid_port, status):
     status.value = 0
     value = 0
-    for i, s in enumerate(hal_data['solenoid']):
-        value |= (1 if s['value'] else 0) << i
+    for i, v in enumerate(hal_data['solenoid'].columns['value']):
+        value |= (1 if v else 0) << i
     return value
 
 def setSolenoid(solenoid_port, value, status):
     status.value = 0
-    hal_data['solenoid'][solenoid_port.pin]['value'] = value
+    hal_data['solenoid'].set(solenoid_port.pin, 'value', value)
 
 def getPCMSolenoidBlackList(solenoid_port, status):
     status.value = 0
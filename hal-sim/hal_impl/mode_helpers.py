@@ -9,6 +9,11 @@ from . import functions as fns
 def notify_new_ds_data():
     '''Called when driver station data is modified'''
     
+    data.flush_notifications()
+    
+    if data._recorder is not None:
+        data._recorder.record_ds()
+
     if data.hal_newdata_sem is not None:
         fns.giveMultiWait(data.hal_newdata_sem)
 
@@ -42,8 +42,9 @@ def reverseByType(defining_val , value=None):
             raise ValueError("Must have a value to translate")
     
     else:
-        type = hal_data['pwm'][defining_val]['type']
-        trans_val = hal_data['pwm'][defining_val]['raw_value']
+        columns = hal_data['pwm'].columns
+        type = columns['type'][defining_val]
+        trans_val = columns['raw_value'][defining_val]
     
     vals = rev_types.get(type)
     if vals:
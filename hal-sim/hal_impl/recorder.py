@@ -0,0 +1,427 @@
+'''
+    Records what happens to hal_data during a simulation, so that it can be
+    examined or replayed later.
+
+    The recorder writes a stream of timestamped changes to a file:
+
+    - Inputs passed to :func:`.update_hal_data` or
+      :func:`.update_hal_data_delta`
+    - The robot mode when recording starts, and each driver station packet
+      with any change of robot mode
+    - Outputs that are stored in a :class:`.NotifyDict` (PWM, DIO, relays,
+      solenoids, analog, compressor...), whenever they change
+
+    Changes are encoded on the robot thread and written to the file by a
+    background thread. If the writer falls behind, changes are dropped
+    rather than slowing down the robot, and :attr:`Recorder.dropped` is
+    incremented. Recording an output costs a few microseconds.
+
+    Usage::
+
+        from hal_impl.recorder import Recorder
+
+        recorder = Recorder('robot.halrec')
+        recorder.start()
+        ...
+        recorder.stop()
+
+    Recording stops when the HAL is reset.
+
+    File format
+    -----------
+
+    The file starts with :data:`MAGIC`, followed by frames. Each frame is a
+    header (type, payload length, FPGA timestamp in microseconds) followed
+    by the payload. Keys are identified by a number, which is defined by a
+    ``KEY`` frame containing the JSON encoded path of the key in hal_data
+    (such as ``["pwm", 3, "value"]``) before the key is first used. The
+    payload of the other frames is a list of (key number, value) entries.
+'''
+
+import collections
+import json
+import struct
+import threading
+
+from . import data
+from . import functions
+
+import logging
+logger = logging.getLogger('hal.recorder')
+
+__all__ = ['Recorder', 'RecordingReader']
+
+#: First bytes of a recording
+MAGIC = b'HALREC\x00\x01'
+
+#: Frame types
+KEY = ord('K')
+INPUT = ord('I')
+OUTPUT = ord('O')
+DS = ord('D')
+STATE = ord('S')
+
+# type, payload length, timestamp
+_header = struct.Struct('<BIq')
+_key = struct.Struct('<H')
+_int = struct.Struct('<q')
+_float = struct.Struct('<d')
+_len = struct.Struct('<I')
+
+# value tags
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _JSON = range(7)
+
+# frames containing a single value, which are packed in one go
+_tag_frame = struct.Struct('<BIqHB')
+_int_frame = struct.Struct('<BIqHBq')
+_float_frame = struct.Struct('<BIqHBd')
+
+_ds_keys = [('control', k) for k in ('enabled', 'autonomous', 'test', 'eStop',
+                                     'fms_attached', 'ds_attached')] + \
+           [('time', 'match_start')]
+
+
+def _encode_value(v, out):
+    if v is None:
+        out.append(_NONE)
+    elif v is True:
+        out.append(_TRUE)
+    elif v is False:
+        out.append(_FALSE)
+    elif type(v) is float:
+        out.append(_FLOAT)
+        out += _float.pack(v)
+    elif type(v) is int and -(1 << 63) <= v < (1 << 63):
+        out.append(_INT)
+        out += _int.pack(v)
+    elif type(v) is str:
+        b = v.encode('utf-8')
+        out.append(_STR)
+        out += _len.pack(len(b))
+        out += b
+    else:
+        b = json.dumps(v).encode('utf-8')
+        out.append(_JSON)
+        out += _len.pack(len(b))
+        out += b
+
+
+def _value_frame(frame_type, key, v, now):
+    # equivalent to a frame containing a single _encode_value, but faster
+    t = type(v)
+    if t is float:
+        return _float_frame.pack(frame_type, 11, now, key, _FLOAT, v)
+    elif t is bool:
+        return _tag_frame.pack(frame_type, 3, now, key, _TRUE if v else _FALSE)
+    elif t is int and -(1 << 63) <= v < (1 << 63):
+        return _int_frame.pack(frame_type, 11, now, key, _INT, v)
+    elif v is None:
+        return _tag_frame.pack(frame_type, 3, now, key, _NONE)
+
+    payload = bytearray(_key.pack(key))
+    _encode_value(v, payload)
+    return _header.pack(frame_type, len(payload), now) + payload
+
+
+def _decode_value(buf, offset):
+    tag = buf[offset]
+    offset += 1
+    if tag == _NONE:
+        return None, offset
+    elif tag == _TRUE:
+        return True, offset
+    elif tag == _FALSE:
+        return False, offset
+    elif tag == _FLOAT:
+        return _float.unpack_from(buf, offset)[0], offset + 8
+    elif tag == _INT:
+        return _int.unpack_from(buf, offset)[0], offset + 8
+    elif tag in (_STR, _JSON):
+        n = _len.unpack_from(buf, offset)[0]
+        offset += 4
+        s = bytes(buf[offset:offset+n]).decode('utf-8')
+        return (s if tag == _STR else json.loads(s)), offset + n
+    else:
+        raise ValueError("Invalid value tag %d" % tag)
+
+
+def _flatten(d, path, out):
+    # Finds the paths of the values in an input dictionary, in the same way
+    # that update_hal_data walks it
+    for k, v in d.items():
+        p = path + (k,)
+        if isinstance(v, dict):
+            _flatten(v, p, out)
+        elif isinstance(v, list):
+            for i, vv in enumerate(v):
+                if isinstance(vv, dict):
+                    _flatten(vv, p + (i,), out)
+                else:
+                    out.append((p + (i,), vv))
+        else:
+            out.append((p, v))
+
+
+class Recorder:
+    '''
+        Records changes to hal_data to a file. See the module documentation
+        for details.
+    '''
+
+    def __init__(self, f, max_pending=100000, flush_period=0.1):
+        '''
+            :param f: Filename or binary file object to write to
+            :param max_pending: Maximum number of frames waiting to be
+                                written before changes are dropped
+            :param flush_period: How often (in seconds of wall clock time)
+                                 the background thread writes to the file
+        '''
+        if isinstance(f, str):
+            self.file = open(f, 'wb')
+            self.close_file = True
+        else:
+            self.file = f
+            self.close_file = False
+
+        self.max_pending = max_pending
+        self.flush_period = flush_period
+
+        #: Number of frames that were dropped because too many were waiting
+        #: to be written
+        self.dropped = 0
+
+        self.keys = {}
+        self.registered = []
+        self.last_ds = {}
+
+        # local.updating is set while a thread applies inputs, so outputs
+        # set by other threads at the same time are still recorded
+        self.local = threading.local()
+
+        # frames waiting to be written. Outputs are appended without
+        # holding the lock, which only keeps key numbers consistent
+        self.pending = collections.deque()
+        self.lock = threading.Lock()
+
+        self.running = False
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        '''Starts recording'''
+        if self.running:
+            return
+
+        self.file.write(MAGIC)
+
+        self.running = True
+        self.thread = threading.Thread(target=self._writer, name='HALRecorder', daemon=True)
+        self.thread.start()
+
+        # Listen for outputs
+        self._register(data.hal_data, ())
+        self._record_ds(STATE)
+
+        data._recorder = self
+
+    def stop(self):
+        '''Stops recording, and waits for everything to be written'''
+        if not self.running:
+            return
+
+        if data._recorder is self:
+            data._recorder = None
+
+        for d, k, cb in self.registered:
+            d.unregister(k, cb)
+        self.registered = []
+
+        self.running = False
+        self.wakeup.set()
+        self.thread.join()
+
+        if self.close_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def _register(self, d, path):
+        if isinstance(d, data.NotifyDict):
+            for k in list(d.keys()):
+                cb = self._output_cb(path + (k,))
+                d.register(k, cb)
+                self.registered.append((d, k, cb))
+
+        elif isinstance(d, dict):
+            for k, v in d.items():
+                if isinstance(v, (dict, list)):
+                    self._register(v, path + (k,))
+
+        elif isinstance(d, list):
+            for i, v in enumerate(d):
+                if isinstance(v, dict):
+                    self._register(v, path + (i,))
+
+    def _output_cb(self, path):
+        # This is called every time an output changes, so it avoids the
+        # lock by defining the key up front
+        with self.lock:
+            frame = self._key(path)
+            if frame:
+                self.pending.append(frame)
+            key = self.keys[path]
+
+        pending = self.pending
+        local = self.local
+
+        def _cb(k, v):
+            if getattr(local, 'updating', False):
+                return
+            if len(pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            pending.append(_value_frame(OUTPUT, key, v, functions.hooks.getFPGATime()))
+
+        return _cb
+
+    def update_hal_data(self, in_dict, update):
+        '''Called by :func:`.update_hal_data` to record the inputs and then
+        apply them. Values that are set by the update aren't also recorded
+        as outputs.'''
+        values = []
+        _flatten(in_dict, (), values)
+        if values:
+            self._record(INPUT, values)
+
+        self.local.updating = True
+        try:
+            update(in_dict, data.hal_data)
+        finally:
+            self.local.updating = False
+
+    def update_hal_data_delta(self, changes, update):
+        '''Called by :func:`.update_hal_data_delta`, the same as
+        :meth:`update_hal_data`'''
+        if changes:
+            self._record(INPUT, list(changes.items()))
+
+        self.local.updating = True
+        try:
+            update(changes)
+        finally:
+            self.local.updating = False
+
+    def record_ds(self):
+        '''Called when a driver station packet arrives. Records the packet,
+        and any change to the robot mode'''
+        self._record_ds(DS)
+
+    def _record_ds(self, frame_type):
+        hal_data = data.hal_data
+        last = self.last_ds
+        values = []
+        for path in _ds_keys:
+            v = hal_data[path[0]][path[1]]
+            if last.get(path, values) != v:
+                last[path] = v
+                values.append((path, v))
+        self._record(frame_type, values)
+
+    def _key(self, path):
+        # must be called with the lock held. Returns the frame defining
+        # the key if it is new, otherwise an empty bytes
+        if path in self.keys:
+            return b''
+
+        key = len(self.keys)
+        self.keys[path] = key
+        payload = _key.pack(key) + json.dumps(path).encode('utf-8')
+        return _header.pack(KEY, len(payload), 0) + payload
+
+    def _record(self, frame_type, values):
+        now = functions.hooks.getFPGATime()
+
+        with self.lock:
+            keys = bytearray()
+            payload = bytearray()
+            for path, v in values:
+                keys += self._key(path)
+                payload += _key.pack(self.keys[path])
+                _encode_value(v, payload)
+
+            # key definitions are always kept, or the rest of the file
+            # couldn't be decoded
+            if keys:
+                self.pending.append(keys)
+
+            if len(self.pending) >= self.max_pending:
+                self.dropped += 1
+            else:
+                self.pending.append(_header.pack(frame_type, len(payload), now) + payload)
+
+    def _writer(self):
+        pending = self.pending
+        while True:
+            self.wakeup.wait(self.flush_period)
+            running = self.running
+
+            frames = []
+            try:
+                while True:
+                    frames.append(pending.popleft())
+            except IndexError:
+                pass
+
+            if frames:
+                try:
+                    self.file.write(b''.join(frames))
+                except Exception:
+                    logger.exception("Error writing recording")
+
+            if not running:
+                break
+
+
+class RecordingReader:
+    '''
+        Reads a recording made by :class:`Recorder`. The recording can be
+        any object supporting the buffer protocol, such as bytes or an
+        mmap, so that large recordings don't need to be read into memory.
+    '''
+
+    def __init__(self, buf):
+        self.buf = memoryview(buf)
+        if bytes(self.buf[:len(MAGIC)]) != MAGIC:
+            raise ValueError("Not a HAL recording")
+
+    def __iter__(self):
+        '''
+            Yields (frame type, timestamp, [(path, value), ...]) for each
+            frame except key definitions
+        '''
+        buf = self.buf
+        end = len(buf)
+        offset = len(MAGIC)
+        keys = {}
+
+        while offset + _header.size <= end:
+            frame_type, length, timestamp = _header.unpack_from(buf, offset)
+            offset += _header.size
+            frame_end = offset + length
+            if frame_end > end:
+                # the recording was cut off
+                break
+
+            if frame_type == KEY:
+                key = _key.unpack_from(buf, offset)[0]
+                path = json.loads(bytes(buf[offset+2:frame_end]).decode('utf-8'))
+                keys[key] = tuple(path)
+            else:
+                values = []
+                while offset < frame_end:
+                    key = _key.unpack_from(buf, offset)[0]
+                    v, offset = _decode_value(buf, offset + 2)
+                    values.append((keys[key], v))
+                yield frame_type, timestamp, values
+
+            offset = frame_end
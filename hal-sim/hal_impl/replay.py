@@ -0,0 +1,190 @@
+'''
+    Replays a recording made by :class:`.Recorder`, so that the robot code
+    sees the same inputs and driver station packets at the same times as it
+    did when the recording was made.
+
+    Replay runs on the virtual clock of :class:`.VirtualTimeSimHooks`, so a
+    long recording replays as fast as the robot code can run. Each recorded
+    input is applied using :func:`.update_hal_data`, and each driver station
+    packet changes the robot mode using :func:`.mode_helpers.set_mode`. The
+    recording is memory mapped and decoded as it is replayed, so it doesn't
+    need to fit in memory.
+
+    To find out what the robot did differently, record the outputs while
+    replaying and compare them to the original recording::
+
+        import hal_impl.functions
+        from hal_impl.replay import ReplaySimHooks
+
+        hooks = ReplaySimHooks('robot.halrec')
+        hal_impl.functions.hooks = hooks
+
+        robot = MyRobot()
+        thread = threading.Thread(target=robot.startCompetition, daemon=True)
+        hooks.addThread(thread)
+        thread.start()
+
+        hooks.waitForEnd()
+'''
+
+import mmap
+import threading
+
+from . import data
+from . import mode_helpers
+from .recorder import RecordingReader, INPUT, DS, STATE
+from .sim_hooks import VirtualTimeSimHooks
+
+__all__ = ['ReplaySimHooks']
+
+
+def _inputs_dict(values):
+    # Converts recorded (path, value) pairs into a dictionary that can be
+    # passed to update_hal_data
+    in_dict = {}
+    for path, v in values:
+        d = in_dict
+        current = data.hal_data
+        for k in path[:-1]:
+            current = current[k]
+            child = d[k] if isinstance(d, list) else d.get(k)
+            if child is None:
+                if isinstance(current, list):
+                    # dicts that aren't being updated are left empty, and
+                    # other values keep their current value
+                    child = [{} if isinstance(c, dict) else c for c in current]
+                else:
+                    child = {}
+                d[k] = child
+            d = child
+        d[path[-1]] = v
+    return in_dict
+
+
+class ReplaySimHooks(VirtualTimeSimHooks):
+    '''
+        Hooks that replay a recording on the virtual clock. The clock starts
+        at the time of the first recorded frame. Driver station packets are
+        only sent when they were recorded.
+    '''
+
+    def __init__(self, filename):
+        '''
+            :param filename: Recording made by :class:`.Recorder`
+        '''
+        super().__init__(dsPacketPeriod=None)
+
+        self.file = open(filename, 'rb')
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.reader = RecordingReader(self.mmap)
+        self.frames = iter(self.reader)
+
+        # the recorded driver station state, only changes are recorded
+        self.ds = {}
+
+        self.finished = False
+        self.endCond = threading.Condition()
+
+        self.nextFrame = None
+        self._readFrame()
+        if self.nextFrame is not None:
+            self.now = self.nextFrame[1]
+
+    def waitForEnd(self):
+        '''Waits (on the virtual clock) until the whole recording has been
+        replayed'''
+        with self.endCond:
+            while not self.finished:
+                self.waitOnCondition(self.endCond, None)
+
+    def close(self):
+        '''Closes the recording. Call once the replay is done'''
+        self.frames = None
+        self.nextFrame = None
+        self.reader.buf.release()
+        self.mmap.close()
+        self.file.close()
+
+    def _readFrame(self):
+        # outputs are only recorded for comparison, so they're skipped
+        for frame in self.frames:
+            if frame[0] in (INPUT, DS, STATE):
+                self.nextFrame = frame
+                return
+        self.nextFrame = None
+
+    #
+    # Events, called with the lock held
+    #
+
+    def _nextEvent(self):
+        frame = self.nextFrame
+        if frame is not None:
+            # frames recorded by different threads may be slightly out of order
+            return max(frame[1], self.now), frame[0] == DS
+        elif not self.finished:
+            return self.now, False
+        return None, False
+
+    def _takeEvent(self):
+        frame = self.nextFrame
+        if frame is None:
+            return self._end
+
+        self._readFrame()
+        frame_type, _, values = frame
+        if frame_type == INPUT:
+            return lambda: data.update_hal_data(_inputs_dict(values))
+        elif frame_type == DS:
+            return lambda: self._replayDs(values)
+        else:
+            return lambda: self._replayState(values)
+
+    #
+    # Event processing, called without the lock held
+    #
+
+    def _end(self):
+        with self.endCond:
+            self.finished = True
+            self.notifyCondition(self.endCond)
+
+    def _replayState(self, values):
+        # sets the mode that the recording started in, which isn't a packet
+        self.ds.update(values)
+        hal_data = data.hal_data
+        for (group, k), v in values:
+            hal_data[group][k] = v
+
+    def _replayDs(self, values):
+        ds = self.ds
+        ds.update(values)
+        control = data.hal_data['control']
+
+        for k in ('fms_attached', 'ds_attached'):
+            v = ds.get(('control', k))
+            if v is not None:
+                control[k] = v
+
+        if ds.get(('control', 'eStop')):
+            if not control['eStop']:
+                mode_helpers.set_estop()
+                return
+        else:
+            control['eStop'] = False
+
+            if ds.get(('control', 'autonomous')):
+                mode = 'auto'
+            elif ds.get(('control', 'test')):
+                mode = 'test'
+            else:
+                mode = 'teleop'
+            enabled = bool(ds.get(('control', 'enabled')))
+
+            if control['enabled'] != enabled or control['autonomous'] != (mode == 'auto') or \
+               control['test'] != (mode == 'test'):
+                # sends the packet
+                mode_helpers.set_mode(mode, enabled)
+                return
+
+        mode_helpers.notify_new_ds_data()
@@ -1,5 +1,10 @@
 
+import heapq
+import itertools
+import threading
 import time
+import weakref
+from . import data
 from .data import hal_data
 
 class SimHooks:
@@ -24,10 +29,372 @@ class SimHooks:
     
     def delaySeconds(self, s):
         time.sleep(s)
+    
+    def waitOnCondition(self, cond, timeout):
+        '''Waits until cond is notified or timeout seconds have passed. If
+        timeout is None, waits until cond is notified. cond is already held
+        by the caller, exactly once.
+        
+        :returns: False if the simulation has stopped, and time will not
+                  move forward anymore. The caller should stop waiting
+                  for the timeout.
+        '''
+        cond.wait(timeout)
+        return True
+    
+    def notifyCondition(self, cond):
+        '''Wakes all threads waiting on cond. cond is already held by the
+        caller.'''
+        cond.notify_all()
+    
+    def addThread(self, thread):
+        '''Called with threads started by the simulated HAL, before they
+        are started'''
+        pass
+
+
+class _Waiter:
+    def __init__(self, thread, cond, deadline):
+        self.thread = thread
+        self.cond = cond
+        self.deadline = deadline
+        self.woken = False
+
+
+class _ExitSentinel:
+    pass
+
+
+class _SimulationStopped(BaseException):
+    '''Raised by a delay when the simulation has stopped, and caught when
+    it reaches the top of a thread added with addThread'''
+
+
+def _threadExited(self_ref, thread):
+    hooks = self_ref()
+    if hooks is not None:
+        hooks.removeThread(thread)
+
+
+class VirtualTimeSimHooks(SimHooks):
+    '''
+        Hooks that run the simulation on a virtual clock instead of the
+        wall clock, so that a simulated match finishes as fast as the robot
+        code can run.
+        
+        Time only moves forward once every tracked thread is waiting on the
+        clock, and then it jumps straight to the next thing that is supposed
+        to happen: a delay or timeout expiring, or the next driver station
+        packet. Delays, notifiers (and therefore PIDControllers) and
+        DriverStation.waitForData all wait on the clock, so a run sees the
+        same sequence of timestamps each time regardless of how fast the
+        computer is.
+        
+        A thread is tracked once it first waits on the clock, and stops being
+        tracked when it exits. The thread that creates the hooks is tracked
+        from the start; other threads that do work before they first wait
+        (such as a thread running the robot) should be added with
+        :meth:`addThread` before they are started, or the clock may run
+        ahead of them. A tracked thread must not block on anything other
+        than the clock (such as joining another thread) without calling
+        :meth:`removeThread` first, or the simulation stops.
+        
+        Once :meth:`stop` is called, time doesn't move forward anymore.
+        Waits with a timeout return straight away, and waits without one
+        wait for the condition to be notified as usual. A delay exits the
+        thread instead, if it was added with :meth:`addThread`.
+        
+        Driver station packets are held back until the driver station thread
+        first waits for one. After that, a packet that arrives while it is
+        doing something else is lost, as it would be on a real robot.
+        
+        To use, set hal_impl.functions.hooks before creating the robot::
+        
+            import hal_impl.functions
+            from hal_impl.sim_hooks import VirtualTimeSimHooks
+            
+            hal_impl.functions.hooks = VirtualTimeSimHooks()
+    '''
+    
+    def __init__(self, dsPacketPeriod=0.02):
+        '''
+            :param dsPacketPeriod: Seconds between simulated driver station
+                                   packets, or None to not send any
+        '''
+        self.lock = threading.Condition()
+        
+        # current time in microseconds
+        self.now = 0
+        
+        # thread -> _Waiter, or None if running
+        self.threads = {}
+        
+        # holds an object for each tracked thread that is running, which
+        # stops tracking the thread when it is freed as the thread exits
+        self.local = threading.local()
+        self._track(threading.current_thread())
+        
+        # heap of (deadline, sequence, waiter)
+        self.timeouts = []
+        self.sequence = itertools.count()
+        
+        self.advancing = False
+        self.stopped = False
+        self.dsThreadWaited = False
+        
+        if dsPacketPeriod is None:
+            self.dsPacketPeriod = None
+            self.nextDsPacket = None
+        else:
+            self.dsPacketPeriod = int(dsPacketPeriod * 1000000)
+            self.nextDsPacket = self.dsPacketPeriod
+    
+    #
+    # Hook functions
+    #
+    
+    def getTime(self):
+        return self.now / 1000000.0
+    
+    def getFPGATime(self):
+        return self.now
+    
+    def delayMillis(self, ms):
+        self.delaySeconds(ms * 0.001)
+    
+    def delaySeconds(self, s):
+        with self.lock:
+            if not self.stopped:
+                waiter = self._addWaiter(None, s)
+                if self._wait(waiter):
+                    return
+        
+        raise _SimulationStopped()
+    
+    def waitOnCondition(self, cond, timeout):
+        with self.lock:
+            stopped = self.stopped
+            if not stopped:
+                waiter = self._addWaiter(cond, timeout)
+        
+        if not stopped:
+            cond.release()
+            try:
+                with self.lock:
+                    if self._wait(waiter):
+                        return True
+            finally:
+                cond.acquire()
+        
+        if timeout is not None:
+            return False
+        
+        # nothing else will happen on the clock, but the condition can
+        # still be notified (such as when the DriverStation is reset)
+        self.removeThread()
+        cond.wait()
+        return True
+    
+    def notifyCondition(self, cond):
+        with self.lock:
+            for waiter in self.threads.values():
+                if waiter is not None and waiter.cond is cond:
+                    self._wake(waiter)
+        cond.notify_all()
+    
+    #
+    # Clock control
+    #
+    
+    def addThread(self, thread=None):
+        '''Tracks a thread, so that the clock does not move forward
+        unless it is waiting on the clock. The thread does not need to be
+        started yet.
+        
+        :param thread: Thread to track, defaults to the current thread
+        '''
+        if thread is None:
+            thread = threading.current_thread()
+        with self.lock:
+            if thread not in self.threads:
+                self._track(thread)
+    
+    def removeThread(self, thread=None):
+        '''Stops tracking a thread, for threads that will wait on
+        something other than the clock (such as joining another thread)
+        
+        :param thread: Thread to stop tracking, defaults to the current thread
+        '''
+        if thread is None:
+            thread = threading.current_thread()
+        with self.lock:
+            self.threads.pop(thread, None)
+            self.lock.notify_all()
+    
+    def stop(self, timeout=1.0):
+        '''Stops the simulation, see above for what happens to the threads
+        waiting on the clock. Must be called from a thread that doesn't
+        wait on the clock, such as when a test finishes.
+        
+        :param timeout: Seconds to wait for the tracked threads to exit, or
+                        to wait without the clock
+        '''
+        current = threading.current_thread()
+        deadline = time.monotonic() + timeout
+        
+        with self.lock:
+            self.stopped = True
+            self.lock.notify_all()
+            
+            while True:
+                running = [t for t in self.threads
+                           if t is not current and t.is_alive()]
+                remaining = deadline - time.monotonic()
+                if not running or remaining <= 0:
+                    break
+                self.lock.wait(remaining)
+    
+    #
+    # Internal functions, must be called with the lock held
+    #
+    
+    def _track(self, thread):
+        self.threads[thread] = None
+        
+        if thread is threading.current_thread():
+            self._watchExit(thread)
+        elif thread.ident is None:
+            # not started yet, start watching when it starts
+            run = thread.run
+            def _run():
+                self._watchExit(thread)
+                try:
+                    run()
+                except _SimulationStopped:
+                    pass
+                finally:
+                    self.removeThread(thread)
+            thread.run = _run
+    
+    def _watchExit(self, thread):
+        '''Stops tracking thread when it exits. Must be called from the
+        thread itself.'''
+        if getattr(self.local, 'exit', None) is None:
+            self_ref = weakref.ref(self)
+            self.local.exit = exit = _ExitSentinel()
+            weakref.finalize(exit, _threadExited, self_ref, thread)
+    
+    def _addWaiter(self, cond, timeout):
+        thread = threading.current_thread()
+        self._watchExit(thread)
+        if timeout is None:
+            deadline = None
+        else:
+            deadline = self.now + max(int(round(timeout * 1000000)), 0)
+        
+        waiter = _Waiter(thread, cond, deadline)
+        self.threads[thread] = waiter
+        
+        sem = data.hal_newdata_sem
+        if sem is not None and cond is sem.cond:
+            self.dsThreadWaited = True
+        
+        # threads waiting for this one to wait can now check again
+        self.lock.notify_all()
         
+        if deadline is not None:
+            if deadline <= self.now:
+                waiter.woken = True
+            else:
+                heapq.heappush(self.timeouts, (deadline, next(self.sequence), waiter))
         
+        return waiter
     
+    def _wake(self, waiter):
+        waiter.woken = True
+        self.lock.notify_all()
     
+    def _wait(self, waiter):
+        '''Returns True once the waiter is woken, or False if the
+        simulation is stopped first'''
+        lock = self.lock
+        try:
+            while not waiter.woken:
+                if self.stopped:
+                    return False
+                if not self.advancing and self._allWaiting():
+                    self._advance()
+                else:
+                    # woken when any thread waits, is woken or exits
+                    lock.wait()
+            return True
+        finally:
+            if waiter.thread in self.threads:
+                self.threads[waiter.thread] = None
+    
+    def _allWaiting(self):
+        for waiter in self.threads.values():
+            if waiter is None or waiter.woken:
+                return False
+        return True
+    
+    def _advance(self):
+        '''Moves the clock to the next event and processes it'''
+        
+        timeouts = self.timeouts
+        while timeouts and timeouts[0][2].woken:
+            heapq.heappop(timeouts)
+        
+        next_time = None
+        if timeouts:
+            next_time = timeouts[0][0]
+        event_time, ds_packet = self._nextEvent()
+        if event_time is not None and (next_time is None or event_time < next_time):
+            next_time = event_time
+        
+        if next_time is None:
+            # nothing will ever happen
+            self.lock.wait()
+            return
+        
+        if next_time == event_time and ds_packet and \
+           data.hal_newdata_sem is not None and not self.dsThreadWaited:
+            # the driver station thread hasn't started waiting for packets
+            # yet, and would miss this one
+            self.lock.wait()
+            return
+        
+        if next_time > self.now:
+            self.now = next_time
+        
+        while timeouts and timeouts[0][0] <= self.now:
+            _, _, waiter = heapq.heappop(timeouts)
+            if not waiter.woken:
+                self._wake(waiter)
+        
+        if event_time is not None and event_time <= self.now:
+            event = self._takeEvent()
+            
+            # Other threads must not move the clock until the event has
+            # been processed, and the lock can't be held while doing so
+            self.advancing = True
+            self.lock.release()
+            try:
+                event()
+            finally:
+                self.lock.acquire()
+                self.advancing = False
+                self.lock.notify_all()
     
+    def _nextEvent(self):
+        '''Returns the time of the next event that isn't a timeout (or None
+        if there isn't one), and whether it is a driver station packet'''
+        return self.nextDsPacket, True
     
-    
\ No newline at end of file
+    def _takeEvent(self):
+        '''Called when the time of the next event is reached. Returns a
+        function that processes the event, which is called without the
+        lock held'''
+        self.nextDsPacket += self.dsPacketPeriod
+        from .mode_helpers import notify_new_ds_data
+        return notify_new_ds_data
@@ -157,16 +157,37 @@ Encoder_ptr = fake_pointer(Encoder)
 
 # opaque interrupt
 class Interrupt:
-    pass
+    def __init__(self, index, watcher):
+        self.index = index
+        self.watcher = watcher
+        # the digital input being watched, and the callback registered on it
+        self.dio = None
+        self.cb = None
+        self.rising = True
+        self.falling = False
+        # asynchronous interrupts start disabled
+        self.enabled = False
+        self.handler = None
+        self.param = None
+        # FPGA time of the last edges, in microseconds
+        self.risingTimestamp = 0
+        self.fallingTimestamp = 0
+        # edges that haven't been waited for
+        self.pending = 0
+        # set to False by cleanInterrupts
+        self.valid = True
 Interrupt_ptr = fake_pointer(Interrupt)
 
 #############################################################################
 # Notifier
 #############################################################################
 
-# opaque Notifier
 class Notifier:
-    pass
+    def __init__(self, processQueue, param):
+        self.processQueue = processQueue
+        self.param = param
+        # identifies the currently armed alarm, None if not armed
+        self.alarm = None
 Notifier_ptr = fake_pointer(Notifier)
 
 #############################################################################
@@ -1,6 +1,10 @@
 import pytest
 from unittest.mock import MagicMock, patch
 
+# networktables can only be initialized once per process, so it is imported
+# here rather than being reloaded with wpilib for each test
+import networktables as _networktables
+
 @pytest.fixture(scope="function")
 def _module_patch(request):
     '''This patch forces wpilib to reload each time we do this'''
@@ -39,6 +43,20 @@ def hal_data(_module_patch):
     hal_impl.functions.reset_hal()
     return hal_impl.data.hal_data
 
+@pytest.fixture(scope="function")
+def virtual_hooks(wpilib, monkeypatch):
+    """Runs the simulation on a virtual clock, see VirtualTimeSimHooks"""
+    import hal_impl.functions
+    from hal_impl.sim_hooks import VirtualTimeSimHooks
+
+    hooks = VirtualTimeSimHooks()
+    monkeypatch.setattr(hal_impl.functions, 'hooks', hooks)
+    yield hooks
+
+    # hal_impl isn't always reloaded between tests, so stop the threads that
+    # are waiting on the virtual clock before the hooks are put back
+    hooks.stop()
+
 @pytest.fixture(scope="function")
 def frccan(request):
     
@@ -71,9 +89,9 @@ def wpilib(_module_patch, hal, hal_data):
 @pytest.fixture(scope="function")
 def networktables():
     """Networktables instance"""
-    import networktables
-    networktables.NetworkTable.setTestMode()
-    return networktables
+    if _networktables.NetworkTable._staticProvider is None:
+        _networktables.NetworkTable.setTestMode()
+    return _networktables
 
 #
 # Mock fixtures for testing things that don't have to interact with 
@@ -0,0 +1,178 @@
+import pytest
+
+
+@pytest.fixture(scope="function")
+def scheduler(wpilib, hal_impl_mode_helpers):
+    from wpilib.command import Scheduler
+    wpilib.RobotBase.initializeHardwareConfiguration()
+    hal_impl_mode_helpers.set_mode('teleop', True)
+    return Scheduler.getInstance()
+
+
+@pytest.fixture(scope="function")
+def ds(wpilib):
+    return wpilib.DriverStation.getInstance()
+
+
+def _command(wpilib):
+    from wpilib.command import Command
+
+    class _Command(Command):
+        def isFinished(self):
+            return False
+
+    return _Command()
+
+
+def test_joystickbutton_whenPressed(wpilib, hal_data, ds, scheduler):
+    from wpilib.buttons import JoystickButton
+
+    stick = wpilib.Joystick(1)
+    command = _command(wpilib)
+    JoystickButton(stick, 2).whenPressed(command)
+
+    calls = []
+    getStickButton = ds.getStickButton
+    ds.getStickButton = lambda *a: calls.append(a) or getStickButton(*a)
+
+    ds.getData()
+    scheduler.run()
+    scheduler.run()
+    assert not command.isRunning()
+
+    hal_data['joysticks'][1]['buttons'][2] = True
+    ds.getData()
+    scheduler.run()
+    scheduler.run()
+    assert command.isRunning()
+
+    command.cancel()
+    scheduler.run()
+    assert not command.isRunning()
+
+    # still held, so it isn't started again
+    ds.getData()
+    scheduler.run()
+    assert not command.isRunning()
+
+    # the scheduler looked the button up itself
+    assert calls == []
+
+
+def test_joystickbutton_whileHeld(wpilib, hal_data, ds, scheduler):
+    from wpilib.buttons import JoystickButton
+
+    stick = wpilib.Joystick(0)
+    command = _command(wpilib)
+    JoystickButton(stick, 1).whileHeld(command)
+
+    hal_data['joysticks'][0]['buttons'][1] = True
+    ds.getData()
+    scheduler.run()
+    scheduler.run()
+    assert command.isRunning()
+
+    # restarted while held, even without a new packet
+    command.cancel()
+    scheduler.run()
+    scheduler.run()
+    assert command.isRunning()
+
+    hal_data['joysticks'][0]['buttons'][1] = False
+    ds.getData()
+    scheduler.run()
+    scheduler.run()
+    assert not command.isRunning()
+
+
+def test_custom_trigger(wpilib, scheduler):
+    from wpilib.buttons import Trigger
+
+    class _Trigger(Trigger):
+        value = False
+        calls = 0
+
+        def get(self):
+            self.calls += 1
+            return self.value
+
+    trigger = _Trigger()
+    command = _command(wpilib)
+    trigger.whenActive(command)
+
+    calls = trigger.calls
+    scheduler.run()
+    scheduler.run()
+    assert trigger.calls == calls + 2
+
+    trigger.value = True
+    scheduler.run()
+    scheduler.run()
+    assert command.isRunning()
+
+
+def test_plain_button_function(scheduler):
+    calls = []
+    scheduler.addButton(lambda: calls.append(1))
+    scheduler.run()
+    assert calls == [1]
+
+
+def test_joystickbutton_grouped_by_stick(wpilib, hal_data, ds, scheduler):
+    from wpilib.buttons import JoystickButton
+
+    calls = []
+    b1 = JoystickButton(wpilib.Joystick(1), 1)
+    b2 = JoystickButton(wpilib.Joystick(2), 1)
+    b1.whenPressed(_command(wpilib))
+    b2.whenPressed(_command(wpilib))
+    b1.whileHeld(_command(wpilib))
+
+    def _spy(button):
+        def _fn(*args):
+            calls.append(scheduler.buttons.index(button))
+            return button(*args)
+        return _fn
+
+    # the bindings were filed once, by joystick
+    assert sorted(scheduler.stickButtonBindings) == [1, 2]
+    assert [b[0] for b in scheduler.polledButtons] == [2]
+
+    for bindings in [scheduler.polledButtons] + list(scheduler.stickButtonBindings.values()):
+        bindings[:] = [(i, _spy(b), source) for i, b, source in bindings]
+
+    # first packet: everything, in priority order
+    ds.getData()
+    scheduler.run()
+    assert calls == [2, 1, 0]
+
+    # only the joystick that changed, and the button called on every run
+    del calls[:]
+    hal_data['joysticks'][2]['buttons'][1] = True
+    ds.getData()
+    scheduler.run()
+    assert calls == [2, 1]
+
+    del calls[:]
+    scheduler.run()
+    assert calls == [2]
+
+
+def test_joystickbutton_table(wpilib, hal_data, ds, scheduler, networktables):
+    from wpilib.buttons import JoystickButton
+
+    button = JoystickButton(wpilib.Joystick(1), 1)
+    command = _command(wpilib)
+    button.whenPressed(command)
+    assert 1 in scheduler.stickButtonBindings
+
+    # once the dashboard can press it, it is polled
+    table = networktables.NetworkTable.getTable('test_joystickbutton_table')
+    button.initTable(table)
+    assert scheduler.stickButtonBindings == {}
+    assert [source for _, _, source in scheduler.polledButtons] == [None]
+
+    table.putBoolean('pressed', True)
+    scheduler.run()
+    scheduler.run()
+    assert command.isRunning()
@@ -0,0 +1,232 @@
+import ctypes
+import socket
+import struct
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="function")
+def camera_server(wpilib, monkeypatch):
+    from wpilib.cameraserver import CameraServer
+
+    # any free port
+    monkeypatch.setattr(CameraServer, 'kPort', 0)
+    server = CameraServer.getInstance()
+    assert server.mjpegServer.listening.wait(5)
+    yield server
+    CameraServer._reset()
+
+
+def _read_frame(sock):
+    header = b''
+    while len(header) < 8:
+        header += sock.recv(8 - len(header))
+    assert header[:4] == bytes([1, 0, 0, 0])
+    size = struct.unpack('!i', header[4:])[0]
+
+    data = bytearray()
+    while len(data) < size:
+        data += sock.recv(size - len(data))
+    return bytes(data)
+
+
+def test_simcamera_pattern(wpilib):
+    from wpilib._impl.simcamera import USBCamera, getFrameInfo
+
+    camera = USBCamera()
+    camera.setFPS(50)
+    camera.setSize(160, 120)
+    camera.startCapture()
+
+    data = (ctypes.c_ubyte * 100000)()
+    start = wpilib.Timer.getFPGATimestamp()
+    for i in range(5):
+        size = camera.getImageData(data, 100000)
+        image = bytes(data[:size])
+        assert image[:2] == b'\xff\xd8'
+        assert image[-2:] == b'\xff\xd9'
+        # width and height are in the frame header
+        sof = image.index(b'\xff\xc0')
+        assert struct.unpack('!HH', image[sof+5:sof+9]) == (120, 160)
+        assert getFrameInfo(image)[1] == i
+
+    # the images are produced at the frame rate
+    assert wpilib.Timer.getFPGATimestamp() - start >= 0.075
+
+    with pytest.raises(ValueError):
+        camera.getImageData(data, 100)
+
+    assert getFrameInfo(b'\xff\xd8\xff\xdb' + bytes(100)) is None
+
+
+def test_simcamera_virtual_time(wpilib, virtual_hooks):
+    from wpilib._impl.simcamera import USBCamera
+
+    camera = USBCamera()
+    camera.setFPS(10)
+    camera.setSize(160, 120)
+    camera.startCapture()
+
+    # the frames are paced by the simulation's clock
+    data = bytearray(100000)
+    for _ in range(5):
+        camera.getImageData(data, len(data))
+    assert virtual_hooks.getFPGATime() == 400000
+
+
+def test_simcamera_directory(wpilib, tmpdir):
+    from wpilib._impl.simcamera import USBCamera, encodeBlocks, getFrameInfo
+
+    images = [encodeBlocks([i * 10] * 4, 16, 16) for i in range(3)]
+    for i, image in enumerate(images):
+        tmpdir.join('%d.jpg' % i).write_binary(image)
+    tmpdir.join('notes.txt').write('not an image')
+
+    camera = USBCamera()
+    camera.setFPS(1000)
+    camera.setImageDirectory(str(tmpdir))
+
+    data = bytearray(1000)
+    for i in range(4):
+        size = camera.getImageData(data, len(data))
+        info = getFrameInfo(data[:size])
+        assert info[1] == i
+
+        # the frame information is added after the start of image
+        expected = images[i % 3]
+        assert data[:2] == expected[:2]
+        assert data[size-len(expected)+2:size] == expected[2:]
+
+    with pytest.raises(ValueError):
+        camera.setImageDirectory(str(tmpdir.mkdir('empty')))
+
+
+def test_cameraserver_simcamera(wpilib, camera_server):
+    from wpilib._impl.simcamera import getFrameInfo
+
+    # in simulation, dashboards can only connect from this computer
+    assert camera_server.mjpegServer.address == '127.0.0.1'
+
+    camera = wpilib.USBCamera()
+    camera_server.startAutomaticCapture(camera)
+    assert camera_server.isAutoCaptureStarted()
+
+    sock = socket.create_connection(('127.0.0.1', camera_server.mjpegServer.port), timeout=5)
+    sock.sendall(struct.pack('!iii', 15, -1, camera_server.kSize160x120))
+
+    last = -1
+    for _ in range(3):
+        image = _read_frame(sock)
+        frameNumber = getFrameInfo(image)[1]
+        assert frameNumber > last
+        last = frameNumber
+
+    # the dashboard's settings were applied to the camera
+    assert camera.fps == 15
+    assert (camera.width, camera.height) == (160, 120)
+
+    for _ in range(100):
+        stats = camera_server.getStats()
+        if stats['sent'] >= 3:
+            break
+        time.sleep(0.01)
+
+    assert stats['clients'] == 1
+    assert stats['sent'] >= 3
+    assert stats['captured'] >= 3
+    assert stats['pool']['count'] == 3
+
+    sock.close()
+
+
+def test_cameraserver_buffers_in_use(wpilib, camera_server):
+    camera = wpilib.USBCamera()
+    camera.setFPS(1000)
+
+    # the dashboards are holding on to every buffer
+    held = [camera_server.framePool.acquire() for _ in range(3)]
+
+    camera_server.startAutomaticCapture(camera)
+
+    # so the capture waits for one, without allocating more
+    for _ in range(100):
+        if camera_server.framePool.getStats()['waits'] >= 1:
+            break
+        time.sleep(0.01)
+
+    stats = camera_server.getStats()
+    assert stats['captured'] == 0
+    assert stats['pool']['count'] == 3
+
+    # and carries on once they are released
+    for frame in held:
+        frame.release()
+
+    for _ in range(100):
+        if camera_server.getStats()['captured'] >= 5:
+            break
+        time.sleep(0.01)
+
+    stats = camera_server.getStats()
+    assert stats['captured'] >= 5
+    assert stats['pool']['count'] == 3
+
+
+class _FakeNivision:
+    # just enough of nivision to flatten an image that is already a JPEG
+
+    IMAQ_FLATTEN_IMAGE = 1
+    IMAQ_COMPRESSION_JPEG = 1
+
+    def __init__(self):
+        self.flattened = {}
+        self.disposed = []
+
+    def imaqFlatten(self, image, type, compression, quality):
+        data = ctypes.create_string_buffer(image, len(image))
+        vdata = ctypes.addressof(data)
+        self.flattened[vdata] = data
+        return vdata, len(image)
+
+    def imaqDispose(self, vdata):
+        self.disposed.append(vdata)
+
+
+def test_cameraserver_set_image(wpilib, camera_server, monkeypatch):
+    from wpilib import cameraserver
+
+    nivision = _FakeNivision()
+    monkeypatch.setattr(cameraserver, 'nivision', nivision)
+
+    sock = socket.create_connection(('127.0.0.1', camera_server.mjpegServer.port), timeout=5)
+    sock.sendall(struct.pack('!iii', 30, -1, camera_server.kSize160x120))
+    for _ in range(500):
+        if all(c.fps is not None for c in camera_server.mjpegServer.clients) and \
+           camera_server.mjpegServer.getClientCount() == 1:
+            break
+        time.sleep(0.01)
+
+    # the image is sent from the flattened data, without the bytes before
+    # the start of the JPEG
+    camera_server.setImage(b'junk\xff\xd8image1')
+    assert _read_frame(sock) == b'\xff\xd8image1'
+    first = list(nivision.flattened)
+
+    # an image that isn't a JPEG is disposed of straight away
+    with pytest.raises(ValueError):
+        camera_server.setImage(b'junk')
+    assert nivision.disposed == list(nivision.flattened)[1:]
+
+    # and the latest image is disposed of once it has been replaced, and
+    # the dashboard has been sent the new one
+    camera_server.setImage(b'\xff\xd8image2')
+    assert _read_frame(sock) == b'\xff\xd8image2'
+    for _ in range(500):
+        if len(nivision.disposed) == 2:
+            break
+        time.sleep(0.01)
+    assert nivision.disposed[1:] == first
+    assert camera_server.getStats()['pool']['free'] == 3
+
+    sock.close()
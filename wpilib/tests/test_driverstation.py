@@ -19,6 +19,21 @@ def ds(wpilib, hal_data):
     return myds
 
 
+def _setJoystickData(ds, stick, axes=None, povs=None, buttons=None):
+    from wpilib.driverstation import _JoystickData
+    data = ds.joystickData
+    axesList = list(data.axes)
+    povsList = list(data.povs)
+    buttonsList = list(data.buttons)
+    if axes is not None:
+        axesList[stick] = axes
+    if povs is not None:
+        povsList[stick] = povs
+    if buttons is not None:
+        buttonsList[stick] = buttons
+    ds.joystickData = _JoystickData(axesList, povsList, buttonsList, data.changed)
+
+
 #
 # Tests
 #
@@ -65,6 +80,7 @@ def test_task(dsmock, halmock):
     dsmock.task()
     assert dsmock.getData.called
     assert dsmock.dataSem.notify_all.called
+    halmock.giveMultiWait.assert_called_once_with(dsmock.waitForDataSem)
 
 def test_task_safetyCounter(dsmock, halmock):
     # exit function after 5 iterations
@@ -92,13 +108,19 @@ def test_task_usermode(mode, dsmock, halmock):
     dsmock.task()
     assert getattr(halmock, "HALNetworkCommunicationObserveUserProgram"+mode).called
 
-def test_waitForData(dsmock):
+def test_waitForData(dsmock, halmock):
+    def newPacket(sem, mutex):
+        dsmock.packetCount += 1
+    halmock.takeMultiWait.side_effect = newPacket
     dsmock.waitForData()
-    dsmock.dataSem.wait.assert_called_once_with(None)
+    halmock.takeMultiWait.assert_called_once_with(dsmock.waitForDataSem,
+                                                  dsmock.waitForDataMutex)
 
-def test_waitForData_timeout(dsmock):
-    dsmock.waitForData(5.0)
-    dsmock.dataSem.wait.assert_called_once_with(5.0)
+def test_waitForData_timeout(ds, wpilib):
+    start = wpilib.Timer.getFPGATimestamp()
+    ds.waitForData(0.05)
+    assert wpilib.Timer.getFPGATimestamp() - start >= 0.05
+    assert ds.waitForDataDeadlines == []
 
 def test_getData(dsmock, halmock):
     halmock.getFPGATime.return_value = 1000
@@ -110,9 +132,9 @@ def test_getBatteryVoltage(dsmock, halmock):
     assert dsmock.getBatteryVoltage() == halmock.getVinVoltage.return_value
 
 def test_getStickAxis(dsmock):
-    dsmock.joystickAxes[2][0] = 127
+    _setJoystickData(dsmock, 2, axes=(127,))
     assert dsmock.getStickAxis(2, 0) == 1.0
-    dsmock.joystickAxes[0][1] = -128
+    _setJoystickData(dsmock, 0, axes=(0, -128))
     assert dsmock.getStickAxis(0, 1) == -1.0
 
 def test_getStickAxis_limits(dsmock, halmock):
@@ -126,7 +148,7 @@ def test_getStickAxis_limits(dsmock, halmock):
         dsmock.getStickAxis(0, halmock.kMaxJoystickAxes)
 
 def test_getStickPOV(dsmock):
-    dsmock.joystickPOVs[2][0] = 30
+    _setJoystickData(dsmock, 2, povs=(30,))
     assert dsmock.getStickPOV(2, 0) == 30
 
 def test_getStickPOV_limits(dsmock, halmock):
@@ -143,8 +165,10 @@ def test_getStickButton(dsmock):
     class ButtonsMock:
         buttons = 0x13
         count = 12
-    dsmock.joystickButtons[0] = ButtonsMock()
+    _setJoystickData(dsmock, 0, buttons=ButtonsMock())
     assert dsmock.getStickButton(0, 1) == True
+    assert dsmock.getStickButton(0, 3) == False
+    assert dsmock.getStickButtons(0).buttons == 0x13
 
 def test_getStickButton_limits(dsmock):
     with pytest.raises(IndexError):
@@ -152,6 +176,112 @@ def test_getStickButton_limits(dsmock):
     with pytest.raises(IndexError):
         dsmock.getStickButton(dsmock.kJoystickPorts, 1)
 
+def test_getData_snapshot(ds, hal_data):
+    hal_data['joysticks'][1]['axes'][2] = -1
+    hal_data['joysticks'][1]['povs'][0] = 90
+    hal_data['joysticks'][1]['buttons'][3] = True
+
+    old = ds.joystickData
+    ds.getData()
+
+    # each packet is a new snapshot, so readers of the old data aren't
+    # affected by the update, however long they keep it
+    data = ds.joystickData
+    assert data is not old
+    assert old.axes[1][2] == 0
+
+    assert ds.getStickAxis(1, 2) == -1.0
+    assert ds.getStickPOV(1, 0) == 90
+    assert ds.getStickButton(1, 3)
+    assert not ds.getStickButton(1, 2)
+
+    hal_data['joysticks'][1]['axes'][2] = 1
+    hal_data['joysticks'][1]['buttons'][3] = False
+    ds.getData()
+    ds.getData()
+    assert data.axes[1][2] == -128
+    assert data.buttons[1].buttons == 0x4
+    assert ds.getStickAxis(1, 2) == 1.0
+    assert not ds.getStickButton(1, 3)
+
+    # ports that didn't change share their values with the last packet
+    assert ds.joystickData.axes[0] is data.axes[0]
+    assert ds.joystickData.buttons[1] is not data.buttons[1]
+
+def test_getData_changed(ds, hal_data):
+    ds.getData()
+    ds.getData()
+    assert not any(ds.isStickChanged(i) for i in range(ds.kJoystickPorts))
+
+    hal_data['joysticks'][1]['buttons'][2] = True
+    ds.getData()
+    assert [ds.isStickChanged(i) for i in range(ds.kJoystickPorts)] == \
+           [False, True, False, False, False, False]
+
+    ds.getData()
+    assert not ds.isStickChanged(1)
+
+    hal_data['joysticks'][4]['axes'][0] = 0.5
+    ds.getData()
+    assert ds.isStickChanged(4)
+
+def test_getData_unplugged(ds, hal):
+    # only port 0 has anything plugged into it
+    calls = []
+
+    def _fill(attr, value):
+        def _fn(stick, s):
+            calls.append(stick)
+            s.count = 4 if stick == 0 else 0
+            setattr(s, attr, value)
+            return s
+        return _fn
+
+    hal.HALGetJoystickAxes = _fill('axes', [0]*4)
+    hal.HALGetJoystickPOVs = _fill('povs', [0]*4)
+    hal.HALGetJoystickButtons = _fill('buttons', 0)
+
+    ds.getData()
+    assert len(calls) == 3*ds.kJoystickPorts
+    assert ds.getStickAxisCount(1) == 0
+
+    # unplugged ports are skipped until it's time to check them again
+    for _ in range(ds.kUnpluggedPollInterval - 2):
+        del calls[:]
+        ds.getData()
+        assert calls == [0, 0, 0]
+
+    del calls[:]
+    ds.getData()
+    assert len(calls) == 3*ds.kJoystickPorts
+
+def test_getData_unplugged_stale(ds, hal):
+    plugged = [True]
+
+    def _fill(attr, value):
+        def _fn(stick, s):
+            s.count = 4 if stick == 1 and plugged[0] else 0
+            setattr(s, attr, value if s.count else type(value)())
+            return s
+        return _fn
+
+    hal.HALGetJoystickAxes = _fill('axes', [100]*4)
+    hal.HALGetJoystickPOVs = _fill('povs', [90]*4)
+    hal.HALGetJoystickButtons = _fill('buttons', 0x5)
+
+    ds.getData()
+    ds.getData()
+    assert ds.getStickButtons(1).buttons == 0x5
+
+    # once unplugged, nothing from before is left
+    plugged[0] = False
+    for _ in range(4):
+        ds.getData()
+        assert ds.getStickButtons(1).buttons == 0
+        assert ds.getStickAxisCount(1) == 0
+        assert not any(ds.joystickData.axes[1])
+        assert not any(ds.joystickData.povs[1])
+
 def test_getJoystickIsXbox(ds, hal_data):
     hal_data['joysticks'][0]['isXbox'] = True
     assert ds.getJoystickIsXbox(0)
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+
+def test_framepool_reuse(wpilib):
+    from wpilib._impl.framepool import FramePool
+
+    pool = FramePool(2, 16)
+    a = pool.acquire()
+    b = pool.acquire()
+    assert a is not b
+    assert a.refs == 1
+
+    # every frame is in use
+    assert pool.acquire(0) is None
+    assert pool.getStats() == {'count': 2, 'free': 0, 'waits': 1, 'timeouts': 1}
+
+    # a frame can have several references
+    generation = b.generation
+    assert b.addRef(generation)
+    b.release()
+    assert pool.acquire(0) is None
+
+    # the frame released first is reused first
+    b.release()
+    a.release()
+    c = pool.acquire()
+    assert c is b
+
+    # which means it doesn't hold the old image anymore
+    assert not b.addRef(generation)
+
+    # but the other one still does
+    assert a.addRef(a.generation)
+    assert pool.getStats()['free'] == 0
+
+
+def test_framepool_wait(wpilib):
+    from wpilib._impl.framepool import FramePool
+
+    pool = FramePool(1, 16)
+    a = pool.acquire()
+
+    acquired = []
+    t = threading.Thread(target=lambda: acquired.append(pool.acquire(5)))
+    t.start()
+
+    a.release()
+    t.join()
+    assert acquired == [a]
+    assert pool.getStats()['waits'] == 1
+
+
+def test_framepool_set_count(wpilib):
+    from wpilib._impl.framepool import Frame, FramePool
+
+    pool = FramePool(2, 16)
+    a = pool.acquire()
+
+    pool.setCount(1)
+    assert pool.getStats()['count'] == 1
+    assert pool.acquire(0) is None
+
+    pool.setCount(3)
+    b = pool.acquire(0)
+    assert b is not None
+    a.release()
+    b.release()
+    assert pool.getStats() == {'count': 3, 'free': 3, 'waits': 1, 'timeouts': 1}
+
+    with pytest.raises(ValueError):
+        pool.setCount(0)
+
+    # frames without a pool can always be referenced
+    frame = Frame(b'\xff\xd8data')
+    assert frame.size == 6
+    assert frame.addRef(12)
+    assert bytes(frame.view()) == b'\xff\xd8data'
+
+
+def test_frame_dispose(wpilib):
+    from wpilib._impl.framepool import Frame
+
+    disposed = []
+    frame = Frame(b'\xff\xd8data', dispose=lambda: disposed.append(True))
+    assert frame.addRef()
+    generation = frame.generation
+    assert frame.addRef(generation)
+
+    frame.release()
+    assert disposed == []
+
+    # disposed of when the last reference is released, and can't be
+    # referenced after that
+    frame.release()
+    assert disposed == [True]
+    assert not frame.addRef(generation)
+    assert not frame.addRef()
@@ -29,3 +29,408 @@ def test_hal_update(wpilib, hal_data):
     update_hal_data(in_dict, hal_data)
     
     assert hal_data['compressor']['on'] == True 
+
+
+def test_hal_update_delta(wpilib, hal_data):
+    import pytest
+    import hal_impl.functions
+    from hal_impl import data
+
+    calls = []
+    hal_data['dio'][2].register('value', lambda k, v: calls.append(v))
+
+    data.update_hal_data_delta({
+        ('joysticks', 1, 'axes', 2): 0.5,
+        ('dio', 2, 'value'): True,
+        ('compressor', 'pressure_switch'): True,
+    })
+
+    assert hal_data['joysticks'][1]['axes'] == [0, 0, 0.5] + [0]*9
+    assert hal_data['dio'][2]['value'] == True
+    assert hal_data['compressor']['pressure_switch'] == True
+    assert calls == [True]
+
+    # only inputs can be set
+    with pytest.raises(KeyError):
+        data.update_hal_data_delta({('pwm', 1, 'value'): 1})
+    with pytest.raises(KeyError):
+        data.update_hal_data_delta({('joysticks', 1, 'axes'): [1]})
+
+    # a dict or list that is replaced by the simulator is updated, rather
+    # than the one that was there before
+    axes = [0]*12
+    hal_data['joysticks'][1]['axes'] = axes
+    data.update_hal_data_delta({('joysticks', 1, 'axes', 3): 0.25})
+    assert axes[3] == 0.25
+
+    # the paths follow a reset
+    paths = data.get_input_paths()
+    hal_impl.functions.reset_hal()
+    assert data.get_input_paths() is not paths
+
+    data.update_hal_data_delta({('dio', 2, 'value'): True})
+    assert data.hal_data['dio'][2]['value'] == True
+
+
+def test_channel_store(wpilib, hal_data):
+    import copy
+    import json
+
+    pwm = hal_data['pwm']
+    assert len(pwm) == 20
+
+    # the channel dictionaries read and write the store
+    pwm[3]['raw_value'] = 1200
+    assert pwm.columns['raw_value'][3] == 1200
+    assert pwm[3]['raw_value'] == 1200
+    assert pwm[4]['raw_value'] == 0
+
+    pwm.set(3, 'raw_value', 1300)
+    assert pwm[3]['raw_value'] == 1300
+    assert pwm[3].get('raw_value') == 1300
+
+    # and otherwise behave like dictionaries
+    assert set(pwm[3].keys()) == {'initialized', 'type', 'raw_value', 'value',
+                                  'period_scale', 'zero_latch'}
+    assert dict(pwm[3])['raw_value'] == 1300
+    assert pwm[3] == copy.deepcopy(pwm[3])
+    assert json.loads(json.dumps(pwm[3])) == pwm[3]
+
+    # keys that aren't fields are stored in the dictionary
+    pwm[3]['custom'] = 1
+    assert pwm[3]['custom'] == 1
+    assert 'custom' not in pwm[4]
+
+
+def test_channel_store_callbacks(wpilib, hal_data):
+    dio = hal_data['dio']
+    calls = []
+
+    dio[2].register('value', lambda k, v: calls.append((k, v)))
+    assert dio.watched == 1
+
+    port = wpilib.DigitalOutput(2)
+    port.set(True)
+    dio[2]['value'] = False
+    dio[3]['value'] = True
+
+    assert calls == [('value', True), ('value', False)]
+
+
+def test_notifydict_changes_only(wpilib, hal_data):
+    compressor = hal_data['compressor']
+    calls = []
+    cb = lambda k, v: calls.append((k, v))
+
+    assert compressor.get_subscriber_count('on') == 0
+    compressor.register('on', cb)
+    assert compressor.get_subscriber_count('on') == 1
+
+    compressor['on'] = True
+    compressor['on'] = True
+    compressor['on'] = False
+    compressor['current'] = 1.0
+    assert calls == [('on', True), ('on', False)]
+
+    compressor.unregister('on', cb)
+    assert compressor.get_subscriber_count('on') == 0
+    compressor['on'] = True
+    assert len(calls) == 2
+
+    # channel stores behave the same way
+    pwm = hal_data['pwm']
+    pwm[1].register('raw_value', cb)
+    pwm.set(1, 'raw_value', 1000)
+    pwm.set(1, 'raw_value', 1000)
+    pwm[1]['raw_value'] = 1000
+    assert calls[2:] == [('raw_value', 1000)]
+
+    pwm[1].unregister('raw_value', cb)
+    assert pwm.watched == 0
+
+
+def test_notifydict_batch(wpilib, hal, hal_data, hal_impl_mode_helpers):
+    from hal_impl import data
+
+    calls = []
+    cb = lambda k, v: calls.append((k, v))
+    hal_data['dio'][1].register('value', cb)
+    hal_data['dio'][2].register('value', cb)
+    hal_data['compressor'].register('on', cb)
+
+    data.set_batch_mode(True)
+    try:
+        for i in range(10):
+            hal_data['dio'][1]['value'] = bool(i % 2)
+        hal_data['dio'][2]['value'] = True
+        hal_data['dio'][2]['value'] = False
+        hal_data['compressor']['on'] = True
+        assert calls == []
+
+        # delivered once with the last value, and only if it changed
+        data.flush_notifications()
+        assert sorted(calls) == [('on', True), ('value', True)]
+
+        # the robot loop delivers them
+        del calls[:]
+        hal_data['compressor']['on'] = False
+        hal.HALNetworkCommunicationObserveUserProgramTeleop()
+        assert calls == [('on', False)]
+
+        # and so do driver station packets
+        del calls[:]
+        hal_data['compressor']['on'] = True
+        hal_impl_mode_helpers.notify_new_ds_data()
+        assert calls == [('on', True)]
+
+        del calls[:]
+        hal_data['compressor']['on'] = False
+    finally:
+        data.set_batch_mode(False)
+
+    assert calls == [('on', False)]
+    hal_data['compressor']['on'] = True
+    assert calls == [('on', False), ('on', True)]
+
+
+def test_recorder(wpilib, hal, hal_data, hal_impl_mode_helpers):
+    import io
+    import hal_impl.data
+    from hal_impl.data import update_hal_data
+    from hal_impl.recorder import Recorder, RecordingReader, INPUT, OUTPUT, DS, STATE
+
+    f = io.BytesIO()
+    recorder = Recorder(f)
+    recorder.start()
+
+    pwm = wpilib.PWM(1)
+    pwm.setRaw(1200)
+    pwm.setRaw(1200)
+    update_hal_data({'compressor': {'pressure_switch': True},
+                     'dio': [{}, {'value': True}]})
+    hal_impl.data.update_hal_data_delta({('dio', 2, 'value'): True})
+    hal_impl_mode_helpers.set_mode('teleop', True)
+
+    recorder.stop()
+    assert recorder.dropped == 0
+    from hal_impl import data
+    assert data._recorder is None
+
+    frames = list(RecordingReader(f.getvalue()))
+    timestamps = [frame[1] for frame in frames]
+    assert timestamps == sorted(timestamps)
+
+    frames = [(t, v) for t, _, v in frames]
+    assert (OUTPUT, [(('pwm', 1, 'raw_value'), 1200)]) in frames
+    assert frames.count((OUTPUT, [(('pwm', 1, 'raw_value'), 1200)])) == 1
+
+    # inputs aren't also recorded as outputs
+    assert (INPUT, [(('compressor', 'pressure_switch'), True),
+                    (('dio', 1, 'value'), True)]) in frames or \
+           (INPUT, [(('dio', 1, 'value'), True),
+                    (('compressor', 'pressure_switch'), True)]) in frames
+    assert not [v for t, v in frames if t == OUTPUT and (('dio', 1, 'value'), True) in v]
+    assert (INPUT, [(('dio', 2, 'value'), True)]) in frames
+    assert not [v for t, v in frames if t == OUTPUT and (('dio', 2, 'value'), True) in v]
+
+    # only changes to the DS state are recorded
+    assert frames[0][0] == STATE
+    assert dict(frames[0][1])[('control', 'enabled')] == False
+    ds = [dict(v) for t, v in frames if t == DS]
+    assert ds[-1][('control', 'enabled')] == True
+    assert ('control', 'test') not in ds[-1]
+
+
+def test_recorder_update_other_thread(wpilib, hal_data):
+    import io
+    import threading
+    from hal_impl.recorder import Recorder, RecordingReader, OUTPUT
+
+    f = io.BytesIO()
+    recorder = Recorder(f)
+    recorder.start()
+
+    # an output set by another thread while inputs are applied is recorded
+    def _update(changes):
+        th = threading.Thread(target=hal_data['pwm'][3].__setitem__,
+                              args=('raw_value', 700))
+        th.start()
+        th.join()
+        hal_data['dio'][3]['value'] = True
+
+    recorder.update_hal_data_delta({('dio', 3, 'value'): True}, _update)
+    recorder.stop()
+
+    frames = [v for t, _, v in RecordingReader(f.getvalue()) if t == OUTPUT]
+    assert [(('pwm', 3, 'raw_value'), 700)] in frames
+    assert not [v for v in frames if (('dio', 3, 'value'), True) in v]
+
+
+def test_recorder_dropped(wpilib, hal_data):
+    import io
+    from hal_impl.recorder import Recorder, RecordingReader, OUTPUT
+
+    f = io.BytesIO()
+    recorder = Recorder(f, flush_period=60)
+    recorder.start()
+    # room for a few changes, which won't be written until the recording stops
+    recorder.max_pending = len(recorder.pending) + 5
+
+    for i in range(1, 21):
+        hal_data['pwm'][1]['raw_value'] = i
+    hal_data['pwm'][2]['raw_value'] = 5
+
+    recorder.stop()
+    assert recorder.dropped > 0
+
+    # the file can still be read, and only later changes are missing
+    frames = [v for t, _, v in RecordingReader(f.getvalue()) if t == OUTPUT]
+    assert frames[0] == [(('pwm', 1, 'raw_value'), 1)]
+    assert len(frames) + recorder.dropped == 21
+
+
+def _reimport_hal():
+    import sys
+    for name in list(sys.modules):
+        if name == 'hal' or name.startswith(('hal.', 'hal_impl')):
+            del sys.modules[name]
+
+    import hal
+    return hal
+
+
+def test_fndef_cache(hal):
+    import os
+    import pytest
+    from hal_impl import fndef
+
+    assert os.path.exists(fndef._cache_file)
+    generated = hal.setPWM
+
+    # the cache is only used with the same version of every file that the
+    # functions depend on
+    import hal_impl.types
+    assert hal_impl.types.__file__ in fndef._source_files()
+
+    # import again, which loads the functions from the cache
+    hal = _reimport_hal()
+    from hal_impl import fndef
+    assert fndef._cache is not None
+    assert fndef._generated is None
+
+    # the cached functions are the same as the generated functions
+    assert hal.setPWM is not generated
+    name, _, params, _ = generated.fndata
+    assert hal.setPWM.fndata[0] == name
+    assert [p[0] for p in hal.setPWM.fndata[2]] == [p[0] for p in params]
+    assert hal.delaySeconds.__code__.co_filename == '<hal_impl.fndef cache>'
+    with pytest.raises(AssertionError):
+        hal.delaySeconds('foo')
+
+
+def test_fndef_cache_cleanup(hal):
+    import os
+    import sys
+    from hal_impl import fndef
+
+    cache_dir = os.path.dirname(fndef._cache_file)
+    tag = sys.implementation.cache_tag
+    stale = os.path.join(cache_dir, 'fndef.0123456789abcdef.%s.pyc' % tag)
+    other = os.path.join(cache_dir, 'fndef.0123456789abcdef.other-99.pyc')
+    for fname in (stale, other):
+        with open(fname, 'wb'):
+            pass
+
+    # generating the functions again replaces stale caches for this interpreter
+    os.unlink(fndef._cache_file)
+    try:
+        hal = _reimport_hal()
+        from hal_impl import fndef
+        assert os.path.exists(fndef._cache_file)
+        assert not os.path.exists(stale)
+        assert os.path.exists(other)
+    finally:
+        if os.path.exists(other):
+            os.unlink(other)
+
+
+def test_fndef_no_validation(hal, monkeypatch):
+    monkeypatch.setenv('HAL_VALIDATE', '0')
+    hal = _reimport_hal()
+    import hal_impl.functions
+
+    assert hal.getPortWithModule is hal_impl.functions.getPortWithModule
+    hal.getPortWithModule(0, 1000)
+
+    # the implementation isn't changed
+    from hal_impl import fndef
+    assert not hasattr(hal_impl.functions.getPortWithModule, 'fndata')
+    assert fndef.fndata['getPortWithModule'][0] == 'getPortWithModule'
+
+
+def test_fndef_sampled_validation(hal, monkeypatch):
+    import pytest
+
+    monkeypatch.setenv('HAL_VALIDATE', '3')
+    hal = _reimport_hal()
+
+    for i in range(7):
+        if i % 3 == 0:
+            with pytest.raises(AssertionError):
+                hal.getPortWithModule(0, 1000)
+        else:
+            hal.getPortWithModule(0, 1000)
+
+
+def test_status_nested(wpilib, hal, hal_data):
+    import pytest
+
+    dport = hal.initializeDigitalPort(hal.getPort(1))
+    assert hal.allocatePWMChannel(dport)
+    with pytest.raises(hal.HALError):
+        hal.allocatePWMChannel(dport)
+
+    # a HAL function called while another is running gets its own status
+    errors = []
+    def cb(k, v):
+        try:
+            hal.allocatePWMChannel(dport)
+        except hal.HALError as e:
+            errors.append(e)
+
+    hal_data['pwm'][1].register('raw_value', cb)
+    hal.setPWM(dport, 1000)
+    assert len(errors) == 1
+    assert hal_data['pwm'][1]['raw_value'] == 1000
+
+
+def test_callstats(hal, monkeypatch):
+    import io
+    import json
+
+    # not instrumented unless it is enabled
+    assert not hasattr(hal.getFPGATime, '__wrapped__')
+
+    monkeypatch.setenv('HAL_PROFILE', '1')
+    hal = _reimport_hal()
+    from hal import callstats
+    assert callstats.enabled
+
+    callstats.reset()
+    dport = hal.initializeDigitalPort(hal.getPort(1))
+    for _ in range(10):
+        hal.getDIO(dport)
+
+    stats = callstats.get_stats()
+    assert stats['getDIO']['count'] == 10
+    assert stats['getDIO']['callers'] == {__name__: 10}
+    assert 0 < stats['getDIO']['max'] <= stats['getDIO']['total']
+    assert 'getFPGATime' not in stats
+
+    out = io.StringIO()
+    callstats.dump_table(out)
+    assert 'getDIO' in out.getvalue()
+
+    out = io.StringIO()
+    callstats.dump_json(out)
+    assert json.loads(out.getvalue()) == json.loads(json.dumps(stats))
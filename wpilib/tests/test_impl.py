@@ -38,3 +38,35 @@ def test_match_arglist(wpilib):
         _, _ = wpilib._impl.utils.match_arglist("", [True, bar, False], {}, argument_templates)
 
 
+
+
+def test_lazy_exports(wpilib):
+    import importlib
+    import sys
+
+    # classes are only imported when they are used
+    assert 'wpilib.robotdrive' not in sys.modules
+    assert wpilib.RobotDrive is sys.modules['wpilib.robotdrive'].RobotDrive
+
+    # every public name of each module is exported
+    for module in set(wpilib._exports.values()):
+        try:
+            m = importlib.import_module('wpilib.' + module)
+        except ImportError:
+            continue
+        for name in getattr(m, '__all__', []):
+            assert wpilib._exports.get(name) == module, name
+
+    ns = {}
+    exec('from wpilib import *', ns)
+    assert set(wpilib.__all__) <= set(ns)
+    assert 'RobotDrive' in dir(wpilib)
+
+    # and so are the submodules, as they were when they were all imported
+    import hal
+    assert ns['command'] is sys.modules['wpilib.command']
+    assert ns['livewindow'] is sys.modules['wpilib.livewindow']
+    assert ns['hal'] is hal
+
+    with pytest.raises(AttributeError):
+        wpilib.NotAClass
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+
+def test_interrupt_handler(wpilib, hal_data):
+    calls = []
+    threads = set()
+    done = threading.Event()
+
+    def _handler(mask):
+        calls.append(mask)
+        threads.add(threading.current_thread().name)
+        if len(calls) == 2:
+            done.set()
+
+    di = wpilib.DigitalInput(3)
+    di.requestInterrupts(_handler)
+    index = di.interruptIndex
+
+    # not enabled yet
+    hal_data['dio'][3]['value'] = False
+    hal_data['dio'][3]['value'] = True
+    time.sleep(0.05)
+    assert calls == []
+
+    di.enableInterrupts()
+    di.setUpSourceEdge(True, True)
+
+    hal_data['dio'][3]['value'] = False
+    hal_data['dio'][3]['value'] = True
+
+    assert done.wait(1)
+    assert calls == [1 << (8 + index), 1 << index]
+    assert threads == {'HALInterrupts'}
+
+    di.cancelInterrupts()
+    hal_data['dio'][3]['value'] = False
+    time.sleep(0.05)
+    assert len(calls) == 2
+
+
+def test_interrupt_wait(wpilib, hal_data):
+    di = wpilib.DigitalInput(2)
+    di.requestInterrupts()
+    index = di.interruptIndex
+
+    def _toggle():
+        time.sleep(0.05)
+        hal_data['dio'][2]['value'] = False
+        hal_data['dio'][2]['value'] = True
+
+    start = wpilib.Timer.getFPGATimestamp()
+    th = threading.Thread(target=_toggle, daemon=True)
+    th.start()
+    assert di.waitForInterrupt(5) == 1 << index
+    th.join()
+
+    # only rising edges by default
+    assert di.readRisingTimestamp() >= start
+    assert di.readFallingTimestamp() == 0
+
+    # a timeout isn't an error
+    assert di.waitForInterrupt(0.05) == 0
+
+    # previous edges are kept if asked for
+    di.setUpSourceEdge(True, True)
+    hal_data['dio'][2]['value'] = False
+    assert di.waitForInterrupt(0.05) == 0
+    hal_data['dio'][2]['value'] = True
+    assert di.waitForInterrupt(0.05, False) == 1 << index
+
+    assert di.readFallingTimestamp() >= start
+    assert di.readFallingTimestamp() <= di.readRisingTimestamp()
+
+    di.cancelInterrupts()
+
+
+def test_interrupt_analog_trigger(wpilib, hal):
+    interrupt = hal.initializeInterrupts(0, True)
+    with pytest.raises(AssertionError):
+        hal.requestInterrupts(interrupt, 0, 0, True)
+    hal.cleanInterrupts(interrupt)
+
+
+def test_interrupt_batch_mode(wpilib, hal_data):
+    from hal_impl import data
+
+    di = wpilib.DigitalInput(4)
+    di.requestInterrupts()
+    di.setUpSourceEdge(True, True)
+    index = di.interruptIndex
+
+    # batching would merge the changes into a single change
+    data.set_batch_mode(True)
+    try:
+        hal_data['dio'][4]['value'] = True
+        hal_data['dio'][4]['value'] = False
+        hal_data['dio'][4]['value'] = True
+        assert di.waitForInterrupt(0.05, False) == (1 << index) | (1 << (8 + index))
+    finally:
+        data.set_batch_mode(False)
+
+    di.cancelInterrupts()
+
+
+def test_interrupt_virtual_time(wpilib, hal_data, virtual_hooks):
+    di = wpilib.DigitalInput(1)
+    di.requestInterrupts()
+
+    # time only moves forward while the waiting thread is blocked
+    assert di.waitForInterrupt(2.5) == 0
+    assert wpilib.Timer.getFPGATimestamp() == 2.5
+
+    wpilib.Timer.delay(1)
+    hal_data['dio'][1]['value'] = False
+    hal_data['dio'][1]['value'] = True
+    assert di.waitForInterrupt(1, False) == 1 << di.interruptIndex
+    assert di.readRisingTimestamp() == 3.5
+
+    di.cancelInterrupts()
+
+
+def test_interrupt_unrouted_timeout(wpilib, hal, virtual_hooks):
+    interrupt = hal.initializeInterrupts(0, True)
+
+    # nothing can interrupt it, but it still waits for the timeout
+    assert hal.waitForInterrupt(interrupt, 0.5, True) == 0
+    assert wpilib.Timer.getFPGATimestamp() == 0.5
+    hal.cleanInterrupts(interrupt)
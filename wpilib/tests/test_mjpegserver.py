@@ -0,0 +1,242 @@
+import socket
+import struct
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="function")
+def mjpeg_server(wpilib):
+    from wpilib._impl.mjpegserver import MjpegServer
+
+    configured = []
+    server = MjpegServer(0, lambda *args: configured.append(args))
+    server.configured = configured
+    server.start()
+    assert server.listening.wait(5)
+    yield server
+    server.stop()
+
+
+def _connect(server, fps, compression=-1, size=1):
+    sock = socket.create_connection(('127.0.0.1', server.port), timeout=5)
+    sock.sendall(struct.pack('!iii', fps, compression, size))
+    return sock
+
+
+def _read_frame(sock):
+    header = b''
+    while len(header) < 8:
+        header += sock.recv(8 - len(header))
+    assert header[:4] == bytes([1, 0, 0, 0])
+    size = struct.unpack('!i', header[4:])[0]
+
+    data = bytearray()
+    while len(data) < size:
+        data += sock.recv(size - len(data))
+    return bytes(data)
+
+
+def _wait_for_clients(server, n):
+    for _ in range(500):
+        if server.getClientCount() == n and \
+           all(c.fps is not None for c in server.clients):
+            return
+        time.sleep(0.01)
+    assert False, "clients did not connect"
+
+
+def test_mjpegserver_multiple_clients(wpilib, mjpeg_server):
+    from wpilib._impl.framepool import Frame
+
+    c1 = _connect(mjpeg_server, 10, size=2)
+    _wait_for_clients(mjpeg_server, 1)
+    c2 = _connect(mjpeg_server, 30)
+    _wait_for_clients(mjpeg_server, 2)
+
+    # the camera is set to the fastest rate that a client wants
+    assert mjpeg_server.configured == [(10, -1, 2), (30, -1, 1)]
+
+    frame1 = Frame(b'\xff\xd8frame1')
+    mjpeg_server.putFrame(frame1)
+    assert _read_frame(c1) == b'\xff\xd8frame1'
+    assert _read_frame(c2) == b'\xff\xd8frame1'
+
+    mjpeg_server.putFrame(Frame(b'\xff\xd8frame2'))
+    assert _read_frame(c2) == b'\xff\xd8frame2'
+    assert _read_frame(c1) == b'\xff\xd8frame2'
+
+    # each client released the frame once it was sent, which the server
+    # notices after the client has already read it
+    for _ in range(500):
+        if frame1.refs == 0 and mjpeg_server.getStats()['sent'] == 4:
+            break
+        time.sleep(0.01)
+
+    assert frame1.refs == 0
+    assert mjpeg_server.getStats() == {'clients': 2, 'sent': 4, 'dropped': 0, 'stalled': 0}
+
+    c1.close()
+    _wait_for_clients(mjpeg_server, 1)
+    c2.close()
+    _wait_for_clients(mjpeg_server, 0)
+
+
+def test_mjpegserver_slow_client(wpilib, mjpeg_server):
+    from wpilib._impl.framepool import FramePool
+
+    # a client that never reads must not hold up the other clients, or
+    # the thread putting frames
+    slow = _connect(mjpeg_server, 1000)
+    fast = _connect(mjpeg_server, 1000)
+    _wait_for_clients(mjpeg_server, 2)
+
+    frames = 100
+    size = 200000
+    pool = FramePool(3, size)
+
+    for i in range(frames):
+        frame = pool.acquire()
+        frame.size = size
+        frame.buffer[0] = i
+        mjpeg_server.putFrame(frame)
+        frame.release()
+        time.sleep(0.002)
+
+    # the fast client keeps up, skipping frames if needed
+    last = -1
+    while last != frames - 1:
+        data = _read_frame(fast)
+        assert len(data) == size
+        assert data[0] > last
+        last = data[0]
+
+    # the slow client is still sending an old frame
+    assert pool.getStats()['free'] < 3
+    stats = mjpeg_server.getStats()
+    assert stats['dropped'] > 0
+    assert stats['sent'] < frames * 2
+
+    # once nothing is sending them, the frames are back in the pool
+    slow.close()
+    for _ in range(500):
+        if pool.getStats()['free'] == 3:
+            break
+        time.sleep(0.01)
+    assert pool.getStats()['free'] == 3
+
+    fast.close()
+
+
+def test_mjpegserver_reused_frame(wpilib, mjpeg_server):
+    from wpilib._impl.framepool import Frame, FramePool
+
+    client = _connect(mjpeg_server, 5)
+    _wait_for_clients(mjpeg_server, 1)
+
+    # the client won't want another frame for a while
+    mjpeg_server.putFrame(Frame(b'frame0'))
+    assert _read_frame(client) == b'frame0'
+
+    pool = FramePool(1, 16)
+    frame = pool.acquire()
+    frame.size = 6
+    frame.buffer[:6] = b'frame1'
+    mjpeg_server.putFrame(frame)
+    frame.release()
+
+    # the buffer is reused before the client is ready for it, so the
+    # server doesn't send it
+    frame = pool.acquire()
+    frame.size = 6
+    frame.buffer[:6] = b'frame2'
+    time.sleep(0.3)
+
+    mjpeg_server.putFrame(frame)
+    frame.release()
+
+    assert _read_frame(client) == b'frame2'
+    assert mjpeg_server.getStats()['dropped'] == 1
+    client.close()
+
+
+def test_mjpegserver_stalled_client(wpilib):
+    from wpilib._impl.framepool import FramePool
+    from wpilib._impl.mjpegserver import MjpegServer
+
+    server = MjpegServer(0, stallTimeout=0.2)
+    server.start()
+    assert server.listening.wait(5)
+
+    # a client that never reads holds a frame until it is disconnected
+    client = _connect(server, 1000)
+    client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    _wait_for_clients(server, 1)
+
+    pool = FramePool(1, 4000000)
+    frame = pool.acquire()
+    frame.size = 4000000
+    server.putFrame(frame)
+    frame.release()
+
+    for _ in range(500):
+        if server.getClientCount() == 0:
+            break
+        time.sleep(0.01)
+
+    assert server.getStats()['stalled'] == 1
+    assert pool.getStats()['free'] == 1
+
+    server.stop()
+    client.close()
+
+
+def test_mjpegserver_no_handshake(wpilib):
+    from wpilib._impl.mjpegserver import MjpegServer
+
+    server = MjpegServer(0, stallTimeout=0.2)
+    server.start()
+    assert server.listening.wait(5)
+
+    # a client that never sends its handshake is disconnected too
+    client = socket.create_connection(('127.0.0.1', server.port), timeout=5)
+    assert client.recv(1) == b''
+    assert server.getStats() == {'clients': 0, 'sent': 0, 'dropped': 0, 'stalled': 1}
+
+    server.stop()
+    client.close()
+
+
+def test_mjpegserver_stop(wpilib):
+    from wpilib._impl.framepool import Frame
+    from wpilib._impl.mjpegserver import MjpegServer
+
+    server = MjpegServer(0)
+    server.start()
+    assert server.listening.wait(5)
+
+    client = _connect(server, 30)
+    _wait_for_clients(server, 1)
+
+    server.putFrame(Frame(b'frame'))
+    assert _read_frame(client) == b'frame'
+    server.stop()
+    assert not server.listening.is_set()
+    assert client.recv(1) == b''
+    client.close()
+
+
+def test_find_jpeg_start(wpilib):
+    import ctypes
+    from wpilib._impl.mjpegserver import findJpegStart
+
+    data = (ctypes.c_ubyte * 16)()
+    assert findJpegStart(data) == -1
+
+    data[5] = 0xff
+    data[6] = 0xd8
+    data[10] = 0xff
+    data[11] = 0xd8
+    assert findJpegStart(data) == 5
+    assert findJpegStart(memoryview(data)[6:]) == 4
+    assert findJpegStart(data, 6) == 10
@@ -0,0 +1,107 @@
+import threading
+import time
+
+
+def test_hal_notifier(hal):
+    calls = []
+    evt = threading.Event()
+
+    def _process(currentTime):
+        calls.append(currentTime)
+        evt.set()
+
+    notifier = hal.initializeNotifier(_process)
+
+    trigger = hal.getFPGATime() + 20000
+    hal.updateNotifierAlarm(notifier, trigger)
+
+    assert evt.wait(1)
+    assert len(calls) == 1
+    assert calls[0] >= trigger
+
+    # alarms are one-shot
+    time.sleep(0.05)
+    assert len(calls) == 1
+
+    # stopped alarms don't fire
+    hal.updateNotifierAlarm(notifier, hal.getFPGATime() + 20000)
+    hal.stopNotifierAlarm(notifier)
+    time.sleep(0.05)
+    assert len(calls) == 1
+
+    hal.cleanNotifier(notifier)
+
+
+def test_hal_notifier_order(hal):
+    '''Alarms set later but expiring earlier run first'''
+    calls = []
+    done = threading.Event()
+
+    def _make(name):
+        def _process(currentTime):
+            calls.append(name)
+            if len(calls) == 3:
+                done.set()
+        return _process
+
+    a = hal.initializeNotifier(_make('a'))
+    b = hal.initializeNotifier(_make('b'))
+    c = hal.initializeNotifier(_make('c'))
+
+    now = hal.getFPGATime()
+    hal.updateNotifierAlarm(a, now + 60000)
+    hal.updateNotifierAlarm(b, now + 40000)
+    hal.updateNotifierAlarm(c, now + 20000)
+
+    assert done.wait(1)
+    assert calls == ['c', 'b', 'a']
+
+    for n in (a, b, c):
+        hal.cleanNotifier(n)
+
+
+def test_notifier_single(wpilib):
+    evt = threading.Event()
+    notifier = wpilib.Notifier(evt.set)
+
+    notifier.startSingle(0.01)
+    assert evt.wait(1)
+
+    evt.clear()
+    time.sleep(0.05)
+    assert not evt.is_set()
+
+    notifier.free()
+
+
+def test_notifier_periodic(wpilib):
+    calls = []
+    notifier = wpilib.Notifier(lambda: calls.append(wpilib.Timer.getFPGATimestamp()))
+
+    notifier.startPeriodic(0.01)
+    time.sleep(0.1)
+    notifier.stop()
+
+    ncalls = len(calls)
+    assert ncalls > 3
+
+    time.sleep(0.05)
+    assert len(calls) == ncalls
+
+    notifier.free()
+
+
+def test_notifier_free(wpilib):
+    calls = []
+    notifier = wpilib.Notifier(lambda: calls.append(1))
+
+    notifier.startPeriodic(0.01)
+    notifier.free()
+
+    time.sleep(0.05)
+    assert calls == []
+
+    # starting a freed notifier does nothing
+    notifier.startSingle(0)
+    time.sleep(0.02)
+    assert calls == []
@@ -0,0 +1,294 @@
+import time
+
+import pytest
+
+
+@pytest.fixture(scope="function")
+def scheduler(wpilib, hal_impl_mode_helpers):
+    from wpilib.command import Scheduler
+    wpilib.RobotBase.initializeHardwareConfiguration()
+    hal_impl_mode_helpers.set_mode('teleop', True)
+    return Scheduler.getInstance()
+
+
+def _command(wpilib, *requirements, interruptible=True):
+    from wpilib.command import Command
+
+    class _Command(Command):
+        def isFinished(self):
+            return False
+
+    command = _Command()
+    for requirement in requirements:
+        command.requires(requirement)
+    command.setInterruptible(interruptible)
+    return command
+
+
+def _subsystem(wpilib, name):
+    from wpilib.command import Subsystem
+    return Subsystem(name)
+
+
+def test_default_command(wpilib, scheduler):
+    s1 = _subsystem(wpilib, 's1')
+    default = _command(wpilib, s1)
+    s1.setDefaultCommand(default)
+
+    scheduler.run()
+    assert s1.getCurrentCommand() is default
+    assert default.isRunning()
+    assert not scheduler.dirtySubsystems
+
+    # a new command takes over, and the default comes back when it's done
+    command = _command(wpilib, s1)
+    command.start()
+    scheduler.run()
+    assert s1.getCurrentCommand() is command
+    assert not default.isRunning()
+
+    command.cancel()
+    scheduler.run()
+    scheduler.run()
+    assert s1.getCurrentCommand() is default
+    assert default.isRunning()
+    assert not scheduler.dirtySubsystems
+
+
+def test_default_command_blocked(wpilib, scheduler):
+    s1 = _subsystem(wpilib, 's1')
+    s2 = _subsystem(wpilib, 's2')
+
+    default = _command(wpilib, s1, s2)
+    s1.setDefaultCommand(default)
+
+    blocker = _command(wpilib, s2, interruptible=False)
+    blocker.start()
+
+    scheduler.run()
+    assert s1.getCurrentCommand() is None
+    assert s2.getCurrentCommand() is blocker
+
+    # s1 is retried until the default command can run
+    assert s1 in scheduler.dirtySubsystems
+
+    scheduler.remove(blocker)
+    scheduler.run()
+    assert s1.getCurrentCommand() is default
+    assert s2.getCurrentCommand() is default
+
+
+def test_command_conflict(wpilib, scheduler):
+    s1 = _subsystem(wpilib, 's1')
+    s2 = _subsystem(wpilib, 's2')
+
+    c1 = _command(wpilib, s1, s2)
+    c2 = _command(wpilib, s2)
+
+    c1.start()
+    scheduler.run()
+    assert c1.isRunning()
+
+    c2.start()
+    scheduler.run()
+    assert not c1.isRunning()
+    assert c2.isRunning()
+    assert s1.getCurrentCommand() is None
+    assert s2.getCurrentCommand() is c2
+
+
+def test_commandgroup_conflict(wpilib, scheduler):
+    from wpilib.command import CommandGroup
+
+    s1 = _subsystem(wpilib, 's1')
+    s2 = _subsystem(wpilib, 's2')
+
+    c1 = _command(wpilib, s1)
+    c2 = _command(wpilib, s2)
+    c3 = _command(wpilib, s1)
+
+    group = CommandGroup()
+    group.addParallel(c1)
+    group.addParallel(c2)
+    group.addSequential(c3)
+
+    group.start()
+    scheduler.run()
+    scheduler.run()
+    scheduler.run()
+
+    # c3 requires s1, so only c1 is cancelled
+    assert not c1.isRunning()
+    assert c2.isRunning()
+    assert c3.isRunning()
+    assert group.children == [group.commands[1]]
+
+
+def test_profiler(wpilib, scheduler):
+    from wpilib.command import Command
+
+    assert scheduler.getProfiler() is None
+
+    class _Slow(Command):
+        def execute(self):
+            time.sleep(0.03)
+
+        def isFinished(self):
+            return False
+
+    fast = _command(wpilib)
+    slow = _Slow('Slow')
+    buttons = []
+    scheduler.addButton(lambda: buttons.append(1))
+
+    profiler = scheduler.enableProfiling(period=0.02, window=10)
+    assert scheduler.getProfiler() is profiler
+
+    fast.start()
+    slow.start()
+    for _ in range(3):
+        scheduler.run()
+
+    loop = profiler.getLoopStats()
+    assert loop['count'] == 3
+    assert loop['overruns'] == 2
+    assert loop['max'] >= loop['p99'] >= loop['p50'] >= loop['p50'] > 0
+
+    commands = dict(profiler.getCommandStats())
+    assert commands['Slow']['count'] == 2
+    assert commands['Slow']['overruns'] == 2
+    assert commands[fast.getName()]['overruns'] == 0
+
+    assert [stats['count'] for _, stats in profiler.getButtonStats()] == [3]
+    assert len(buttons) == 3
+
+    # the loop comes first, followed by the slowest
+    names = [name for name, _ in profiler.getStats()]
+    assert names[:2] == ['Scheduler.run', 'Slow']
+
+    scheduler.disableProfiling()
+    scheduler.run()
+    assert profiler.getLoopStats()['count'] == 3
+    assert len(buttons) == 4
+
+
+def test_profiler_commands_by_name(wpilib, scheduler):
+    from wpilib.command import Command
+
+    class _OneShot(Command):
+        def isFinished(self):
+            return True
+
+    profiler = scheduler.enableProfiling()
+
+    # commands created for each loop share their statistics
+    for _ in range(5):
+        _OneShot('OneShot').start()
+        scheduler.run()
+    # the last one is added at the end of the loop, and runs in the next
+    scheduler.run()
+
+    commands = profiler.getCommandStats()
+    assert [name for name, _ in commands] == ['OneShot']
+    assert commands[0][1]['count'] == 5
+
+
+def test_profiler_table(wpilib, networktables, scheduler):
+    from networktables import NetworkTable, StringArray, NumberArray
+
+    wpilib.SmartDashboard.putData(scheduler)
+    scheduler.enableProfiling()
+    scheduler.addButton(lambda: None)
+    scheduler.run()
+
+    table = NetworkTable.getTable('SmartDashboard').getSubTable('Scheduler').getSubTable('Profile')
+    names = StringArray()
+    table.retrieveValue('Names', names)
+    counts = NumberArray()
+    table.retrieveValue('Count', counts)
+
+    assert list(names)[0] == 'Scheduler.run'
+    assert len(names) == len(counts) == 2
+
+
+def test_timingstats(wpilib):
+    from wpilib._impl.profiler import TimingStats
+
+    stats = TimingStats('test', 10, 0.5)
+    for i in range(20):
+        stats.add(i / 10)
+
+    assert stats.getPercentile(0) == 1.0
+    assert stats.getPercentile(100) == 1.9
+
+    s = stats.getStats()
+    assert s['count'] == 20
+    assert s['overruns'] == 14
+    assert s['max'] == 1.9
+    assert s['last'] == 1.9
+    assert abs(s['avg'] - 0.95) < 1e-9
+
+
+def _table_commands(scheduler):
+    from networktables import StringArray, NumberArray
+
+    names = StringArray()
+    ids = NumberArray()
+    scheduler.getTable().retrieveValue('Names', names)
+    scheduler.getTable().retrieveValue('Ids', ids)
+    return sorted(zip(ids, names))
+
+
+def test_updateTable(wpilib, networktables, scheduler):
+    c1 = _command(wpilib)
+    c2 = _command(wpilib)
+    c3 = _command(wpilib)
+
+    c1.start()
+    scheduler.run()
+
+    # commands that are already running are published
+    wpilib.SmartDashboard.putData(scheduler)
+    assert _table_commands(scheduler) == [(id(c1), c1.getName())]
+
+    c2.start()
+    c3.start()
+    scheduler.run()
+    assert _table_commands(scheduler) == sorted((id(c), c.getName()) for c in (c1, c2, c3))
+
+    c1.cancel()
+    scheduler.run()
+    assert _table_commands(scheduler) == sorted((id(c), c.getName()) for c in (c2, c3))
+    assert scheduler.tableIndex == {id(c2): 1, id(c3): 0} or \
+           scheduler.tableIndex == {id(c2): 0, id(c3): 1}
+
+    scheduler.removeAll()
+    scheduler.run()
+    assert _table_commands(scheduler) == []
+    assert scheduler.tableIndex == {}
+
+
+def test_updateTable_cancel(wpilib, networktables, scheduler):
+    from networktables import NumberArray
+
+    c1 = _command(wpilib)
+    c2 = _command(wpilib)
+    c1.start()
+    c2.start()
+
+    wpilib.SmartDashboard.putData(scheduler)
+    scheduler.run()
+
+    cancel = NumberArray()
+    cancel.append(float(id(c2)))
+    cancel.append(1.0)
+    scheduler.getTable().putValue('Cancel', cancel)
+
+    scheduler.run()
+    assert c1.isRunning()
+    assert c2.isCanceled()
+
+    scheduler.run()
+    assert not c2.isRunning()
+    assert _table_commands(scheduler) == [(id(c1), c1.getName())]
+    assert scheduler.commandIds == {id(c1): c1}
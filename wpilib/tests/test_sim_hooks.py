@@ -0,0 +1,236 @@
+import threading
+
+
+def test_virtual_delay(wpilib, virtual_hooks):
+    assert wpilib.Timer.getFPGATimestamp() == 0
+
+    wpilib.Timer.delay(100)
+    assert wpilib.Timer.getFPGATimestamp() == 100
+
+    wpilib.Timer.delay(0.001)
+    assert virtual_hooks.getFPGATime() == 100001000
+
+
+def test_virtual_notifier(wpilib, virtual_hooks):
+    calls = []
+    notifier = wpilib.Notifier(lambda: calls.append(wpilib.Utility.getFPGATime()))
+    notifier.startPeriodic(0.02)
+
+    wpilib.Timer.delay(1.001)
+    notifier.stop()
+
+    assert calls == [i*20000 for i in range(1, 51)]
+
+
+def test_virtual_stop(wpilib):
+    from hal_impl.sim_hooks import VirtualTimeSimHooks
+
+    hooks = VirtualTimeSimHooks()
+    delayed = []
+
+    def _run():
+        hooks.delaySeconds(1)
+        delayed.append(True)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    hooks.addThread(thread)
+    thread.start()
+
+    # the clock can't move forward while this thread isn't waiting on it,
+    # so the delay never finishes, and the thread exits quietly
+    hooks.stop()
+    assert not thread.is_alive()
+    assert delayed == []
+    assert hooks.getFPGATime() == 0
+
+    # a wait with a timeout returns straight away once stopped
+    cond = threading.Condition()
+    with cond:
+        assert not hooks.waitOnCondition(cond, 1)
+
+
+def test_virtual_waitForData(wpilib, virtual_hooks):
+    ds = wpilib.DriverStation.getInstance()
+
+    # the clock moves forward to the timeout
+    ds.waitForData(0.005)
+    assert wpilib.Utility.getFPGATime() == 5000
+
+    # or to the next packet, whichever comes first
+    ds.waitForData(1.0)
+    assert wpilib.Utility.getFPGATime() == 20000
+
+
+def test_virtual_waitForData_no_timeout(wpilib, virtual_hooks):
+    ds = wpilib.DriverStation.getInstance()
+
+    waited = []
+    def waiter():
+        ds.waitForData()
+        waited.append(wpilib.Utility.getFPGATime())
+
+    thread = threading.Thread(target=waiter, daemon=True)
+    virtual_hooks.addThread(thread)
+    thread.start()
+
+    # another call timing out doesn't wake up a call without a timeout
+    ds.waitForData(0.005)
+    assert waited == []
+
+    wpilib.Timer.delay(0.02)
+    assert waited == [20000]
+
+
+def test_virtual_iterative_robot(wpilib, networktables, virtual_hooks, hal_impl_mode_helpers):
+
+    class Robot(wpilib.IterativeRobot):
+
+        def robotInit(self):
+            self.counts = {'disabled': 0, 'auto': 0, 'teleop': 0}
+
+        def disabledPeriodic(self):
+            self.counts['disabled'] += 1
+
+        def autonomousPeriodic(self):
+            self.counts['auto'] += 1
+
+        def teleopPeriodic(self):
+            self.counts['teleop'] += 1
+
+    robot = Robot()
+
+    thread = threading.Thread(target=robot.startCompetition, daemon=True)
+    virtual_hooks.addThread(thread)
+    thread.start()
+
+    wpilib.Timer.delay(1)
+    hal_impl_mode_helpers.set_mode('auto', True)
+    wpilib.Timer.delay(15)
+    hal_impl_mode_helpers.set_mode('teleop', True)
+    wpilib.Timer.delay(135)
+
+    assert wpilib.Timer.getFPGATimestamp() == 151
+
+    # one periodic call per driver station packet
+    counts = robot.counts
+    assert abs(counts['disabled'] - 50) <= 1
+    assert abs(counts['auto'] - 750) <= 1
+    assert abs(counts['teleop'] - 6750) <= 1
+
+
+def test_virtual_timed_robot(wpilib, networktables, virtual_hooks, hal_impl_mode_helpers):
+
+    class Robot(wpilib.TimedRobot):
+
+        def robotInit(self):
+            self.calls = []
+            self.fast = 0
+
+        def disabledPeriodic(self):
+            self.calls.append(('disabled', wpilib.Utility.getFPGATime()))
+
+        def autonomousPeriodic(self):
+            self.calls.append(('auto', wpilib.Utility.getFPGATime()))
+            # takes too long every 10th loop
+            if len(self.calls) % 10 == 0:
+                wpilib.Timer.delay(0.03)
+
+        def fastPeriodic(self):
+            self.fast += 1
+
+    robot = Robot(period=0.02, fastPeriod=0.005)
+
+    thread = threading.Thread(target=robot.startCompetition, daemon=True)
+    virtual_hooks.addThread(thread)
+    thread.start()
+
+    wpilib.Timer.delay(0.999)
+    hal_impl_mode_helpers.set_mode('auto', True)
+    wpilib.Timer.delay(1)
+
+    calls = robot.calls
+
+    # periodic functions are called on the 20ms boundaries
+    disabled = [t for mode, t in calls if mode == 'disabled']
+    assert disabled[:50] == [i*20000 for i in range(50)]
+
+    auto = [t for mode, t in calls if mode == 'auto']
+    assert auto
+    assert all(t % 20000 == 0 for t in auto)
+
+    # slow loops are skipped
+    assert 40 < len(auto) < 50
+    stats = robot.getLoopStats()
+    assert stats['overruns'] == len(auto) // 10 >= 4
+    assert stats['max'] >= 0.03
+
+    # the fast loop still runs
+    assert abs(robot.fast - 400) <= 40
+    assert robot.getFastLoopStats()['count'] == robot.fast
+
+
+def test_replay(wpilib, networktables, virtual_hooks, hal_impl_mode_helpers, tmpdir, monkeypatch):
+    import hal_impl.functions
+    from hal_impl.data import update_hal_data
+    from hal_impl.recorder import Recorder
+    from hal_impl.replay import ReplaySimHooks
+
+    # record a short match
+    filename = str(tmpdir.join('match.halrec'))
+    recorder = Recorder(filename)
+    recorder.start()
+
+    update_hal_data({'dio': [{}, {'value': True}]})
+    wpilib.Timer.delay(0.5)
+    hal_impl_mode_helpers.set_mode('auto', True)
+    wpilib.Timer.delay(0.1)
+    update_hal_data({'dio': [{}, {'value': False}]})
+    wpilib.Timer.delay(0.4)
+    hal_impl_mode_helpers.set_mode('teleop', True)
+    wpilib.Timer.delay(0.5)
+
+    recorder.stop()
+
+    # replay it into a robot
+    hal_impl.functions.reset_hal()
+    hooks = ReplaySimHooks(filename)
+    monkeypatch.setattr(hal_impl.functions, 'hooks', hooks)
+
+    class Robot(wpilib.IterativeRobot):
+
+        def robotInit(self):
+            self.calls = []
+            self.input = wpilib.DigitalInput(1)
+
+        def disabledPeriodic(self):
+            self.calls.append(('disabled', wpilib.Utility.getFPGATime(), self.input.get()))
+
+        def autonomousPeriodic(self):
+            self.calls.append(('auto', wpilib.Utility.getFPGATime(), self.input.get()))
+
+        def teleopPeriodic(self):
+            self.calls.append(('teleop', wpilib.Utility.getFPGATime(), self.input.get()))
+
+    robot = Robot()
+    thread = threading.Thread(target=robot.startCompetition, daemon=True)
+    hooks.addThread(thread)
+    thread.start()
+
+    hooks.waitForEnd()
+    hooks.stop()
+    hooks.close()
+
+    # the robot sees the recorded inputs and packets at the recorded times
+    calls = robot.calls
+    assert calls[0] == ('disabled', 20000, True)
+    assert [c for c in calls if c[0] == 'disabled'][-1] == ('disabled', 500000, True)
+
+    auto = [c for c in calls if c[0] == 'auto']
+    assert auto[0] == ('auto', 500000, True)
+    # the packet at 0.6s was sent before the input changed
+    assert [c[2] for c in auto] == [t <= 600000 for _, t, _ in auto]
+    assert [t for _, t, _ in auto] == list(range(500000, 1000001, 20000))
+
+    teleop = [c for c in calls if c[0] == 'teleop']
+    assert teleop[0] == ('teleop', 1000000, False)
+    assert teleop[-1][1] == 1500000
@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+def test_timertaskrunner_single_thread(wpilib):
+    from wpilib._impl.timertask import TimerTaskRunner
+
+    runner = TimerTaskRunner()
+    threads = set()
+    calls = {'a': 0, 'b': 0}
+
+    def _task(name):
+        def _fn():
+            threads.add(threading.current_thread())
+            calls[name] += 1
+        return _fn
+
+    a = runner.schedule('a', 0.01, _task('a'))
+    b = runner.schedule('b', 0.02, _task('b'))
+
+    assert runner.getTasks() == [a, b] or runner.getTasks() == [b, a]
+
+    time.sleep(0.25)
+
+    a.cancel()
+    b.cancel()
+
+    assert len(threads) == 1
+    assert calls['a'] > calls['b'] > 0
+
+    stats = a.getStats()
+    assert stats['count'] == calls['a']
+    assert stats['jitter_max'] >= stats['jitter_avg'] >= 0
+
+    # everything ran on the notifier thread
+    assert threads == {runner.thread}
+    assert runner.getTasks() == []
+
+    # cancelled tasks are not called again
+    ncalls = dict(calls)
+    time.sleep(0.05)
+    assert calls == ncalls
+
+
+def test_timertaskrunner_exception(wpilib):
+    from wpilib._impl.timertask import TimerTaskRunner
+
+    runner = TimerTaskRunner()
+    calls = []
+
+    def _bad():
+        raise ValueError()
+
+    bad = runner.schedule('bad', 0.01, _bad)
+    good = runner.schedule('good', 0.01, lambda: calls.append(1))
+
+    time.sleep(0.1)
+    good.cancel()
+
+    # a broken task only cancels itself
+    assert bad.cancelled
+    assert len(calls) > 1
+
+
+def test_pidcontroller_shares_runner(wpilib):
+    from wpilib._impl.timertask import TimerTaskRunner
+
+    runner = TimerTaskRunner.getInstance()
+
+    pid1 = wpilib.PIDController(1, 0, 0, lambda: 0, lambda v: None)
+    pid2 = wpilib.PIDController(1, 0, 0, lambda: 0, lambda v: None, 0.02)
+
+    tasks = runner.getTasks()
+    assert pid1.pid_task in tasks
+    assert pid2.pid_task in tasks
+
+    pid1.free()
+    pid2.free()
+
+    assert runner.getTasks() == []
@@ -16,79 +16,147 @@
 
 '''
 
-from .adxl345_i2c import *
-from .adxl345_spi import *
-from .adxl362 import *
-from .adxrs450_gyro import *
-from .analogaccelerometer import *
-from .analoginput import *
-from .analoggyro import *
-from .analogoutput import *
-from .analogpotentiometer import *
-from .analogtrigger import *
-from .analogtriggeroutput import *
-from .builtinaccelerometer import *
-from .canjaguar import *
-from .cantalon import *
-from .compressor import *
-from .controllerpower import *
-from .counter import *
-from .digitalglitchfilter import *
-from .digitalinput import *
-from .digitaloutput import *
-from .digitalsource import *
-from .doublesolenoid import *
-from .driverstation import *
-from .encoder import *
-from .filter import *
-from .geartooth import *
-from .gyrobase import *
-from .i2c import *
-from .interruptablesensorbase import *
-from .iterativerobot import *
-from .jaguar import *
-from .joystick import *
-from .lineardigitalfilter import *
-from .livewindow import *
-from .livewindowsendable import *
-from .motorsafety import *
-from .pidcontroller import *
-from .powerdistributionpanel import *
-from .preferences import *
-from .pwm import *
-from .relay import *
-from .resource import *
-from .robotbase import *
-from .robotdrive import *
-from .robotstate import *
-from .safepwm import *
-from .samplerobot import *
-from .sd540 import *
-from .sendable import *
-from .sendablechooser import *
-from .sensorbase import *
-from .servo import *
-from .smartdashboard import *
-from .solenoidbase import *
-from .solenoid import *
-from .spark import *
-from .spi import *
-from .talon import *
-from .talonsrx import *
-from .timer import *
-from .ultrasonic import *
-from .utility import *
-from .victor import *
-from .victorsp import *
+import importlib as _importlib
+import sys as _sys
 
-# Provide dummy implementations if pynivision isn't available.
-try:
-    from .cameraserver import *
-    from .usbcamera import *
-except ImportError:
-    from ._impl.dummycamera import *
+# The classes are only imported when they are first used, so that robot
+# code doesn't have to wait for all of them to load. This maps the name of
+# each class to the module that it is in.
+_exports = {
+    'ADXL345_I2C': 'adxl345_i2c',
+    'ADXL345_SPI': 'adxl345_spi',
+    'ADXL362': 'adxl362',
+    'ADXRS450_Gyro': 'adxrs450_gyro',
+    'AnalogAccelerometer': 'analogaccelerometer',
+    'AnalogInput': 'analoginput',
+    'AnalogGyro': 'analoggyro',
+    'AnalogOutput': 'analogoutput',
+    'AnalogPotentiometer': 'analogpotentiometer',
+    'AnalogTrigger': 'analogtrigger',
+    'AnalogTriggerOutput': 'analogtriggeroutput',
+    'BuiltInAccelerometer': 'builtinaccelerometer',
+    'CANJaguar': 'canjaguar',
+    'CANTalon': 'cantalon',
+    'Compressor': 'compressor',
+    'ControllerPower': 'controllerpower',
+    'Counter': 'counter',
+    'DigitalGlitchFilter': 'digitalglitchfilter',
+    'DigitalInput': 'digitalinput',
+    'DigitalOutput': 'digitaloutput',
+    'DigitalSource': 'digitalsource',
+    'DoubleSolenoid': 'doublesolenoid',
+    'DriverStation': 'driverstation',
+    'Encoder': 'encoder',
+    'Filter': 'filter',
+    'GearTooth': 'geartooth',
+    'GyroBase': 'gyrobase',
+    'I2C': 'i2c',
+    'InterruptableSensorBase': 'interruptablesensorbase',
+    'IterativeRobot': 'iterativerobot',
+    'Jaguar': 'jaguar',
+    'Joystick': 'joystick',
+    'LinearDigitalFilter': 'lineardigitalfilter',
+    'LiveWindow': 'livewindow',
+    'LiveWindowSendable': 'livewindowsendable',
+    'MotorSafety': 'motorsafety',
+    'Notifier': 'notifier',
+    'PIDController': 'pidcontroller',
+    'PowerDistributionPanel': 'powerdistributionpanel',
+    'Preferences': 'preferences',
+    'PWM': 'pwm',
+    'Relay': 'relay',
+    'Resource': 'resource',
+    'RobotBase': 'robotbase',
+    'RobotDrive': 'robotdrive',
+    'RobotState': 'robotstate',
+    'SafePWM': 'safepwm',
+    'SampleRobot': 'samplerobot',
+    'SD540': 'sd540',
+    'Sendable': 'sendable',
+    'SendableChooser': 'sendablechooser',
+    'SensorBase': 'sensorbase',
+    'Servo': 'servo',
+    'SmartDashboard': 'smartdashboard',
+    'SolenoidBase': 'solenoidbase',
+    'Solenoid': 'solenoid',
+    'Spark': 'spark',
+    'SPI': 'spi',
+    'Talon': 'talon',
+    'TalonSRX': 'talonsrx',
+    'TimedRobot': 'timedrobot',
+    'Timer': 'timer',
+    'Ultrasonic': 'ultrasonic',
+    'Utility': 'utility',
+    'Victor': 'victor',
+    'VictorSP': 'victorsp',
+    'CameraServer': 'cameraserver',
+    'USBCamera': 'usbcamera',
+    'run': '_impl.main',
+}
+
+# Modules that `from wpilib import *` has always provided, because they
+# used to be imported along with the classes
+_modules = [
+    'adxl345_i2c', 'adxl345_spi', 'adxl362', 'adxrs450_gyro',
+    'analogaccelerometer', 'analoggyro', 'analoginput', 'analogoutput',
+    'analogpotentiometer', 'analogtrigger', 'analogtriggeroutput',
+    'builtinaccelerometer', 'canjaguar', 'cantalon', 'command', 'compressor',
+    'controllerpower', 'counter', 'digitalglitchfilter', 'digitalinput',
+    'digitaloutput', 'digitalsource', 'doublesolenoid', 'driverstation',
+    'encoder', 'filter', 'geartooth', 'gyrobase', 'hal', 'i2c', 'interfaces',
+    'interruptablesensorbase', 'iterativerobot', 'jaguar', 'joystick',
+    'lineardigitalfilter', 'livewindow', 'livewindowsendable', 'motorsafety',
+    'notifier', 'pidcontroller', 'powerdistributionpanel', 'preferences',
+    'pwm', 'relay', 'resource', 'robotbase', 'robotdrive', 'robotstate',
+    'safepwm', 'samplerobot', 'sd540', 'sendable', 'sendablechooser',
+    'sensorbase', 'servo', 'smartdashboard', 'solenoid', 'solenoidbase',
+    'spark', 'spi', 'talon', 'talonsrx', 'timedrobot', 'timer', 'ultrasonic',
+    'utility', 'victor', 'victorsp',
+]
+
+__all__ = list(_exports) + _modules
+
+def _load(name):
+    module = _exports[name]
+    try:
+        value = getattr(_importlib.import_module('.' + module, __name__), name)
+    except ImportError:
+        # Provide a simulated camera if pynivision isn't available.
+        if module != 'usbcamera':
+            raise
+        from ._impl import simcamera
+        value = getattr(simcamera, name)
+
+    globals()[name] = value
+    return value
+
+def __getattr__(name):
+    if name in _exports:
+        return _load(name)
+
+    if name == 'hal':
+        return _importlib.import_module('hal')
+
+    # submodules that haven't been imported yet
+    if not name.startswith('__'):
+        try:
+            return _importlib.import_module('.' + name, __name__)
+        except ImportError as e:
+            # ModuleNotFoundError is Python 3.6+
+            if e.name != __name__ + '.' + name:
+                raise
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
 
-from ._impl.main import run
+# Module __getattr__ requires Python 3.7
+if _sys.version_info < (3, 7):
+    for _name in _exports:
+        _load(_name)
+    for _name in _modules:
+        globals()[_name] = __getattr__(_name)
 
 try:
     from .version import __version__
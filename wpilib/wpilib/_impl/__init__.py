@@ -0,0 +1,14 @@
+import importlib as _importlib
+
+
+def __getattr__(name):
+    # submodules are imported when they are first used
+    if not name.startswith('__'):
+        try:
+            return _importlib.import_module('.' + name, __name__)
+        except ImportError as e:
+            # ModuleNotFoundError is Python 3.6+
+            if e.name != __name__ + '.' + name:
+                raise
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
@@ -0,0 +1,200 @@
+# novalidate
+'''
+    A fixed number of image buffers that are reused by the
+    :class:`.CameraServer`, so that a buffer isn't allocated for each
+    frame.
+
+    Each buffer is held by a :class:`Frame`, which counts the references
+    to it. A frame that is being sent to a dashboard is referenced by each
+    client that is sending it, so any number of clients can send the same
+    frame without copying it. Once nothing references a frame it goes back
+    to the pool, but its contents stay valid until the pool hands it out
+    again. The frames that have been unreferenced the longest are reused
+    first, so the latest image is still there for a client that wants it.
+
+    A :class:`Frame` can also wrap a buffer that doesn't belong to a pool,
+    such as an image flattened by IMAQ. It can be given a function to free
+    the buffer, which is called when its last reference is released.
+
+    If every frame is referenced, :meth:`FramePool.acquire` waits for one
+    to be released. This keeps the capture from getting ahead of the
+    clients, without using more memory.
+'''
+
+import collections
+import ctypes
+import threading
+
+__all__ = ["Frame", "FramePool"]
+
+
+class Frame:
+    '''
+        A buffer holding one image. The image is ``size`` bytes long and
+        starts ``start`` bytes into the buffer.
+    '''
+
+    def __init__(self, buffer, size=None, pool=None, dispose=None):
+        '''
+            :param buffer: Anything supporting the buffer protocol
+            :param size: Size of the image, defaults to the whole buffer
+            :param pool: The pool that owns the buffer. A frame without
+                         a pool is never reused.
+            :param dispose: For a frame without a pool, called with no
+                            arguments when its last reference is released.
+                            The frame can't be referenced after that.
+        '''
+        self.buffer = buffer
+        self.start = 0
+        self.size = memoryview(buffer).nbytes if size is None else size
+        self.pool = pool
+        self.dispose = dispose
+
+        self.refs = 0
+        self.disposed = False
+        if pool is None:
+            self.lock = threading.Lock()
+
+        #: Incremented each time the frame is reused for another image
+        self.generation = 0
+
+    def view(self):
+        ''':returns: memoryview of the image'''
+        return memoryview(self.buffer).cast('B')[self.start:self.start+self.size]
+
+    def addRef(self, generation=None):
+        '''Adds a reference to the frame, so that it isn't reused until
+        :meth:`release` is called
+
+        :param generation: If specified, the reference is only added if the
+                           frame still holds the image that it held when
+                           :attr:`generation` had this value
+        :returns: True if the reference was added
+        '''
+        if self.pool is not None:
+            return self.pool._addRef(self, generation)
+
+        with self.lock:
+            if self.disposed:
+                return False
+            self.refs += 1
+            return True
+
+    def release(self):
+        '''Removes a reference to the frame'''
+        if self.pool is not None:
+            self.pool._release(self)
+            return
+
+        with self.lock:
+            self.refs -= 1
+            if self.refs != 0 or self.dispose is None:
+                return
+            self.disposed = True
+            self.generation += 1
+
+        self.dispose()
+
+
+class FramePool:
+    '''
+        A bounded pool of :class:`Frame` objects. All access is thread safe.
+    '''
+
+    def __init__(self, count, bufferSize):
+        '''
+            :param count: Number of frames in the pool
+            :param bufferSize: Size of the buffer for each frame
+        '''
+        self.bufferSize = bufferSize
+        self.cond = threading.Condition(threading.Lock())
+
+        self.count = 0
+        # unreferenced frames, the ones released longest ago first
+        self.free = collections.deque()
+
+        #: Number of times that every frame was in use, and acquire had to
+        #: wait for one to be released
+        self.waits = 0
+        #: Number of times that acquire gave up waiting
+        self.timeouts = 0
+
+        self.setCount(count)
+
+    def setCount(self, count):
+        '''Changes the number of frames in the pool. If there are too many,
+        they are discarded when they are released.
+
+        :param count: Number of frames in the pool, at least 1
+        '''
+        if count < 1:
+            raise ValueError("A frame pool needs at least one frame")
+
+        with self.cond:
+            while len(self.free) > 0 and self.count > count:
+                frame = self.free.popleft()
+                frame.generation += 1
+                self.count -= 1
+
+            while self.count < count:
+                self.free.append(Frame((ctypes.c_ubyte * self.bufferSize)(), 0, self))
+                self.count += 1
+
+            self.targetCount = count
+            self.cond.notify_all()
+
+    def acquire(self, timeout=None):
+        '''Takes an unreferenced frame from the pool, waiting for a frame to
+        be released if they are all in use. The frame has one reference,
+        which must be released with :meth:`Frame.release`.
+
+        :param timeout: Maximum time to wait in seconds, or None to wait
+                        forever
+        :returns: The frame, or None if the timeout expired
+        '''
+        with self.cond:
+            if not self.free:
+                self.waits += 1
+                if not self.cond.wait_for(lambda: self.free, timeout):
+                    self.timeouts += 1
+                    return None
+
+            frame = self.free.popleft()
+            frame.generation += 1
+            frame.start = 0
+            frame.size = 0
+            frame.refs = 1
+            return frame
+
+    def getStats(self):
+        '''
+            :returns: dictionary of count (number of frames), free (number of
+                      unreferenced frames), waits and timeouts
+        '''
+        with self.cond:
+            return {
+                'count': self.count,
+                'free': len(self.free),
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+            }
+
+    def _addRef(self, frame, generation):
+        with self.cond:
+            if generation is not None and generation != frame.generation:
+                return False
+            if frame.refs == 0:
+                self.free.remove(frame)
+            frame.refs += 1
+            return True
+
+    def _release(self, frame):
+        with self.cond:
+            frame.refs -= 1
+            if frame.refs == 0:
+                if self.count > self.targetCount:
+                    self.count -= 1
+                    frame.generation += 1
+                else:
+                    self.free.append(frame)
+                    self.cond.notify()
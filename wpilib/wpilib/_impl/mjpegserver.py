@@ -0,0 +1,414 @@
+# novalidate
+'''
+    The network side of the :class:`.CameraServer`: an M-JPEG server that
+    sends the latest frame to any number of dashboard clients.
+
+    All of the clients are served by a single thread using :mod:`selectors`.
+    Frames are handed to the server with :meth:`MjpegServer.putFrame`,
+    which never blocks on the network, so a slow or stalled client can't
+    hold up the thread capturing images. Each client is sent frames at the
+    rate that it asked for in its handshake, and a client that can't keep
+    up skips to the latest frame instead of falling further behind. A
+    client that stops receiving altogether is disconnected, so that it
+    doesn't hold on to a frame forever, and so is a client that never
+    sends its handshake.
+
+    Frames aren't copied: each client sends straight from the buffer of the
+    :class:`.Frame` that was passed to :meth:`MjpegServer.putFrame`, and
+    holds a reference to the frame until it has been sent. The server
+    doesn't hold a reference to the latest frame, so if the buffer is
+    reused before a client gets to it, the client waits for the next
+    frame instead. Where it is available, ``socket.sendmsg`` sends the
+    frame header and the image in one call.
+'''
+
+import logging
+import re
+import selectors
+import socket
+import struct
+import threading
+import time
+
+__all__ = ["MjpegServer"]
+
+logger = logging.getLogger(__name__)
+
+_haveSendmsg = hasattr(socket.socket, 'sendmsg')
+
+_soi = re.compile(b'\xff\xd8')
+
+
+def findJpegStart(data, start=0):
+    '''Finds the JPEG start of image marker, without copying the data
+
+    :param data: Anything supporting the buffer protocol
+    :returns: Index of the marker, or -1 if it wasn't found
+    '''
+    m = _soi.search(data, start)
+    return -1 if m is None else m.start()
+
+
+class _Client:
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.connectTime = time.monotonic()
+
+        # the handshake is three ints: fps, compression, size
+        self.handshake = b''
+        self.fps = None
+        self.period = 0.0
+
+        # when the next frame may be started
+        self.nextTime = 0.0
+        self.lastFrameId = None
+
+        # the frame being sent, and what is left of it to send
+        self.frame = None
+        self.out = None
+        self.writing = False
+        # when the last part of the frame was sent
+        self.lastProgress = 0.0
+
+
+class MjpegServer:
+    '''
+        Serves frames using the protocol understood by the FRC dashboards.
+        A client connects and sends three network byte order ints (frames
+        per second, compression, size), and then receives each frame as
+        the magic number, the size of the frame as an int, and the JPEG
+        data.
+    '''
+
+    kMagicNumber = bytes([0x01, 0x00, 0x00, 0x00])
+
+    intStruct = struct.Struct("!i")
+    handshakeStruct = struct.Struct("!iii")
+
+    def __init__(self, port, configure=None, stallTimeout=5.0, address=''):
+        '''
+            :param port: Port to listen on, 0 to choose any free port
+            :param configure: Called with (fps, compression, size) when a
+                              client connects, from the server thread. fps
+                              is the highest frame rate requested by any
+                              connected client.
+            :param stallTimeout: A client that doesn't receive any of a
+                                 frame for this many seconds, or doesn't
+                                 send its handshake this many seconds
+                                 after connecting, is disconnected
+            :param address: Address to listen on, '' for all interfaces
+        '''
+        self.port = port
+        self.address = address
+        self.configure = configure
+        self.stallTimeout = stallTimeout
+
+        self.lock = threading.Lock()
+
+        # the latest frame, which hasn't been picked up by the server thread
+        self.frame = None
+        self.frameCount = 0
+        self.wakeupPending = False
+
+        #: Number of frames sent to clients
+        self.sent = 0
+        #: Number of frames that a client skipped, because a newer frame
+        #: arrived before it was ready to send it
+        self.dropped = 0
+        #: Number of clients disconnected because they stopped receiving, or
+        #: never sent a handshake
+        self.stalled = 0
+
+        # set once the server is accepting connections
+        self.listening = threading.Event()
+        self.running = False
+        self.thread = None
+
+        self.clients = []
+
+        # only used by the server thread, (frame, generation, id, header)
+        self.current = None
+
+        self.wakeupRecv, self.wakeupSend = socket.socketpair()
+        self.wakeupRecv.setblocking(False)
+        self.wakeupSend.setblocking(False)
+
+    def start(self):
+        '''Starts the server thread'''
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, name="CameraServer")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        '''Stops the server thread, and disconnects all clients'''
+        self.running = False
+        try:
+            self.wakeupSend.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.wakeupRecv.close()
+        self.wakeupSend.close()
+
+    def putFrame(self, frame):
+        '''Makes a frame the latest frame to be sent to clients. The server
+        doesn't keep a reference to the frame, so the caller may release
+        it straight away.
+
+        :param frame: JPEG image
+        :type frame: :class:`.Frame`
+        '''
+        with self.lock:
+            self.frameCount += 1
+            self.frame = (frame, frame.generation, self.frameCount)
+            self._wakeup()
+
+    def getStats(self):
+        ''':returns: dictionary of clients (number connected), sent,
+        dropped and stalled'''
+        return {
+            'clients': len(self.clients),
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'stalled': self.stalled,
+        }
+
+    def getClientCount(self):
+        ''':returns: Number of connected clients'''
+        return len(self.clients)
+
+    def _wakeup(self):
+        # wakes the server thread up, must be called with the lock held
+        if not self.wakeupPending:
+            self.wakeupPending = True
+            try:
+                self.wakeupSend.send(b'\0')
+            except (BlockingIOError, OSError):
+                pass
+
+    #
+    # Everything below here is only called from the server thread
+    #
+
+    def _serve(self):
+        sel = selectors.DefaultSelector()
+
+        try:
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.address, self.port))
+            listener.listen(socket.SOMAXCONN)
+            listener.setblocking(False)
+        except IOError:
+            logger.exception("error starting camera server")
+            return
+
+        self.port = listener.getsockname()[1]
+        self.sel = sel
+
+        sel.register(listener, selectors.EVENT_READ, self._accept)
+        sel.register(self.wakeupRecv, selectors.EVENT_READ, self._wakeupEvent)
+
+        self.listening.set()
+
+        try:
+            while self.running:
+                for key, mask in sel.select(self._timeout()):
+                    key.data(key.fileobj, mask)
+                self._closeStalled()
+                self._sendFrames()
+        finally:
+            for client in list(self.clients):
+                self._close(client)
+            sel.close()
+            listener.close()
+            self.current = None
+            self.listening.clear()
+
+    def _timeout(self):
+        # how long to wait until a client is due to be sent the latest frame,
+        # or a client is due to be checked for a stall
+        timeout = None
+        now = time.monotonic()
+        for client in self.clients:
+            if client.fps is None:
+                t = client.connectTime + self.stallTimeout - now
+            elif client.out is not None:
+                t = client.lastProgress + self.stallTimeout - now
+            elif self.current is not None and client.fps is not None and \
+                 client.lastFrameId != self.current[2]:
+                t = client.nextTime - now
+            else:
+                continue
+
+            t = max(t, 0.0)
+            if timeout is None or t < timeout:
+                timeout = t
+        return timeout
+
+    def _closeStalled(self):
+        deadline = time.monotonic() - self.stallTimeout
+        for client in list(self.clients):
+            if client.fps is None and client.connectTime < deadline:
+                logger.warning("Client %s didn't send a handshake, disconnecting it" % (client.addr,))
+            elif client.out is not None and client.lastProgress < deadline:
+                logger.warning("Client %s stopped receiving, disconnecting it" % (client.addr,))
+            else:
+                continue
+
+            self.stalled += 1
+            self._close(client)
+
+    def _wakeupEvent(self, sock, mask):
+        try:
+            while sock.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        self._takeFrame()
+
+    def _takeFrame(self):
+        with self.lock:
+            self.wakeupPending = False
+            latest = self.frame
+            self.frame = None
+
+        if latest is not None:
+            frame, generation, frameId = latest
+            header = self.kMagicNumber + self.intStruct.pack(frame.size)
+            self.current = (frame, generation, frameId, header)
+
+    def _accept(self, listener, mask):
+        # accept everyone that is waiting, so they aren't left in the backlog
+        while True:
+            try:
+                sock, addr = listener.accept()
+            except BlockingIOError:
+                return
+
+            sock.setblocking(False)
+            client = _Client(sock, addr)
+            self.clients.append(client)
+            self.sel.register(sock, selectors.EVENT_READ,
+                              lambda s, m, client=client: self._clientEvent(client, m))
+
+    def _clientEvent(self, client, mask):
+        if mask & selectors.EVENT_READ:
+            try:
+                data = client.sock.recv(4096)
+            except BlockingIOError:
+                data = None
+            except IOError:
+                data = b''
+
+            if data == b'':
+                self._close(client)
+                return
+
+            if data and client.fps is None:
+                client.handshake += data
+                if len(client.handshake) >= self.handshakeStruct.size:
+                    self._handshake(client)
+
+        if mask & selectors.EVENT_WRITE and client.out is not None:
+            self._send(client)
+
+    def _handshake(self, client):
+        fps, compression, size = self.handshakeStruct.unpack_from(client.handshake)
+        client.handshake = None
+
+        logger.info("Client connected: %d fps, %d compression, %d size" % (fps, compression, size))
+
+        fps = max(fps, 1)
+
+        # the client isn't sent frames until the camera has been configured
+        if self.configure is not None:
+            maxFPS = max([c.fps for c in self.clients if c.fps is not None] + [fps])
+            try:
+                self.configure(maxFPS, compression, size)
+            except Exception:
+                logger.exception("error configuring camera")
+
+        client.fps = fps
+        client.period = 1.0 / fps
+
+    def _sendFrames(self):
+        if self.current is None:
+            return
+
+        frame, generation, frameId, header = self.current
+        now = time.monotonic()
+        for client in list(self.clients):
+            if client.fps is None or client.out is not None or \
+               client.lastFrameId == frameId or now < client.nextTime:
+                continue
+
+            if not frame.addRef(generation):
+                # the buffer has already been reused for a newer frame
+                self.current = None
+                return
+
+            # frames that arrived since the last one was sent are skipped
+            if client.lastFrameId is not None:
+                self.dropped += frameId - client.lastFrameId - 1
+            client.lastFrameId = frameId
+            client.nextTime = max(client.nextTime + client.period, now)
+            client.frame = frame
+            client.out = [memoryview(header), frame.view()]
+            client.lastProgress = now
+            self._send(client)
+
+    def _send(self, client):
+        out = client.out
+        try:
+            if _haveSendmsg:
+                sent = client.sock.sendmsg(out)
+            else:
+                sent = client.sock.send(out[0])
+        except BlockingIOError:
+            sent = 0
+        except IOError:
+            logger.info("Client %s disconnected" % (client.addr,))
+            self._close(client)
+            return
+
+        if sent:
+            client.lastProgress = time.monotonic()
+
+        # drop whatever was sent
+        while out and sent >= len(out[0]):
+            sent -= len(out.pop(0))
+        if sent:
+            out[0] = out[0][sent:]
+
+        if not out:
+            self.sent += 1
+            self._sent(client)
+            if client.writing:
+                self._setWriting(client, False)
+        elif not client.writing:
+            self._setWriting(client, True)
+
+    def _sent(self, client):
+        client.out = None
+        client.frame.release()
+        client.frame = None
+
+    def _setWriting(self, client, writing):
+        # only wait for the socket to be writable while a frame is being sent
+        events = selectors.EVENT_READ | selectors.EVENT_WRITE if writing else selectors.EVENT_READ
+        self.sel.modify(client.sock, events, self.sel.get_key(client.sock).data)
+        client.writing = writing
+
+    def _close(self, client):
+        self.clients.remove(client)
+        self.sel.unregister(client.sock)
+        client.sock.close()
+        if client.frame is not None:
+            self._sent(client)
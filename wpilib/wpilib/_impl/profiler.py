@@ -0,0 +1,251 @@
+# novalidate
+'''
+    Timing instrumentation for the command :class:`.Scheduler`. When a
+    loop takes longer than it is supposed to, the profiler can be used
+    to find the commands or buttons that are responsible.
+
+    Profiling is off by default, and costs almost nothing when it is off.
+    To enable it::
+
+        profiler = Scheduler.getInstance().enableProfiling()
+        ...
+        print(profiler.getStats())
+'''
+
+import collections
+import time
+
+__all__ = ["TimingStats", "SchedulerProfiler"]
+
+
+def _percentile(samples, percent):
+    # samples must be sorted
+    if not samples:
+        return 0.0
+    return samples[int(round((len(samples) - 1) * percent / 100.0))]
+
+
+class TimingStats:
+    '''
+        Keeps track of how long something takes. Percentiles are computed
+        from the most recent samples, everything else is over all samples
+        since the last reset.
+    '''
+
+    def __init__(self, name, window, threshold):
+        '''
+            :param name: Name to report the statistics under
+            :param window: Number of recent samples to compute percentiles from
+            :param threshold: Samples longer than this (in seconds) are
+                              counted as overruns
+        '''
+        self.name = name
+        self.threshold = threshold
+        self.samples = collections.deque(maxlen=window)
+        self.reset()
+
+    def reset(self):
+        '''Clears all of the recorded samples'''
+        self.samples.clear()
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+        self.overruns = 0
+
+    def add(self, duration):
+        '''Records a single sample
+
+        :param duration: time taken, in seconds
+        '''
+        self.samples.append(duration)
+        self.count += 1
+        self.total += duration
+        self.last = duration
+        if duration > self.max:
+            self.max = duration
+        if duration > self.threshold:
+            self.overruns += 1
+
+    def getPercentile(self, percent):
+        '''
+            :param percent: Percentile to compute (0-100)
+            :returns: The duration (in seconds) that the given percent of
+                      recent samples took no longer than
+        '''
+        return _percentile(sorted(self.samples), percent)
+
+    def getStats(self):
+        '''
+            :returns: A dictionary of timing statistics (in seconds):
+
+                      - count: number of samples
+                      - overruns: number of samples over the threshold
+                      - last, avg, max: duration of the last sample, the
+                        average duration and the longest duration
+                      - p50, p90, p99: percentiles of the recent samples
+        '''
+        samples = sorted(self.samples)
+        count = self.count
+        return {
+            'count': count,
+            'overruns': self.overruns,
+            'last': self.last,
+            'avg': self.total / count if count else 0.0,
+            'max': self.max,
+            'p50': _percentile(samples, 50),
+            'p90': _percentile(samples, 90),
+            'p99': _percentile(samples, 99),
+        }
+
+
+class SchedulerProfiler:
+    '''
+        Records how long each iteration of :meth:`.Scheduler.run` takes,
+        as well as how long each command and button takes during that
+        iteration. Create one using :meth:`.Scheduler.enableProfiling`.
+
+        Commands and buttons are recorded by name, so commands that are
+        created as they are needed don't each add to the statistics, and
+        all commands with the same name are recorded together.
+    '''
+
+    #: Name that the statistics for the whole loop are reported under
+    loopName = 'Scheduler.run'
+
+    #: Minimum time between updates to NetworkTables, in seconds
+    kPublishPeriod = 1.0
+
+    def __init__(self, period=0.02, window=250):
+        '''
+            :param period: The amount of time (in seconds) that a loop is
+                           supposed to take. A loop, command or button that
+                           takes longer than this is counted as an overrun.
+            :param window: Number of recent samples that percentiles are
+                           computed from
+        '''
+        self.period = period
+        self.window = window
+
+        self.loop = TimingStats(self.loopName, window, period)
+        # name -> TimingStats
+        self.commands = collections.OrderedDict()
+        self.buttons = collections.OrderedDict()
+
+        self.loopStart = None
+        self.lastPublish = None
+
+    def reset(self):
+        '''Clears all of the recorded statistics'''
+        self.loop.reset()
+        self.commands.clear()
+        self.buttons.clear()
+
+    def startLoop(self):
+        self.loopStart = time.perf_counter()
+
+    def endLoop(self):
+        if self.loopStart is not None:
+            self.loop.add(time.perf_counter() - self.loopStart)
+            self.loopStart = None
+
+    def runCommand(self, command):
+        '''Calls command.run() and records how long it took
+
+        :returns: the return value of command.run()
+        '''
+        start = time.perf_counter()
+        try:
+            return command.run()
+        finally:
+            duration = time.perf_counter() - start
+            name = command.getName()
+            stats = self.commands.get(name)
+            if stats is None:
+                stats = TimingStats(name, self.window, self.period)
+                self.commands[name] = stats
+            stats.add(duration)
+
+    def runButton(self, button, *args):
+        '''Calls a button function that was registered with the
+        :class:`.Scheduler` and records how long it took'''
+        start = time.perf_counter()
+        try:
+            button(*args)
+        finally:
+            duration = time.perf_counter() - start
+            name = self._buttonName(button)
+            stats = self.buttons.get(name)
+            if stats is None:
+                stats = TimingStats(name, self.window, self.period)
+                self.buttons[name] = stats
+            stats.add(duration)
+
+    @staticmethod
+    def _buttonName(button):
+        trigger = getattr(button, 'trigger', None)
+        if trigger is None:
+            return getattr(button, '__qualname__', repr(button))
+
+        source = getattr(button, 'joystickButton', None)
+        if source is not None:
+            return '%s(%s, %s)' % ((trigger.__class__.__name__,) + source)
+        return trigger.__class__.__name__
+
+    def getLoopStats(self):
+        '''
+            :returns: Statistics for the whole of :meth:`.Scheduler.run`. See
+                      :meth:`TimingStats.getStats` for the contents.
+        '''
+        return self.loop.getStats()
+
+    def getCommandStats(self):
+        '''
+            :returns: A list of (name, stats) for each command name that has
+                      been run since the last reset
+        '''
+        return [(name, stats.getStats()) for name, stats in self.commands.items()]
+
+    def getButtonStats(self):
+        '''
+            :returns: A list of (name, stats) for each button name that has
+                      been polled since the last reset
+        '''
+        return [(name, stats.getStats()) for name, stats in self.buttons.items()]
+
+    def getStats(self):
+        '''
+            :returns: A list of (name, stats) for the loop, every command and
+                      every button, slowest (by maximum time) first after the
+                      loop itself
+        '''
+        items = list(self.commands.values()) + list(self.buttons.values())
+        items.sort(key=lambda stats: stats.max, reverse=True)
+        return [(stats.name, stats.getStats()) for stats in [self.loop] + items]
+
+    def updateTable(self, table):
+        '''Publishes the statistics to a NetworkTables subtable as parallel
+        arrays, in the same format as :meth:`getStats`. Statistics are
+        published at most once every :attr:`kPublishPeriod` seconds.
+
+        :param table: the subtable to publish to
+        '''
+        now = time.monotonic()
+        if self.lastPublish is not None and now - self.lastPublish < self.kPublishPeriod:
+            return
+        self.lastPublish = now
+
+        from networktables import StringArray, NumberArray
+
+        names = StringArray()
+        columns = collections.OrderedDict((key, NumberArray()) for key in
+                                          ('count', 'overruns', 'avg', 'max', 'p50', 'p90', 'p99'))
+
+        for name, stats in self.getStats():
+            names.append(name)
+            for key, values in columns.items():
+                values.append(stats[key])
+
+        table.putValue("Names", names)
+        for key, values in columns.items():
+            table.putValue(key.capitalize(), values)
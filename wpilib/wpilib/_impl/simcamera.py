@@ -0,0 +1,390 @@
+# novalidate
+'''
+    A simulated USB camera, which is used instead of :class:`.USBCamera`
+    when NI Vision isn't available.
+
+    The camera produces JPEG images at the frame rate and size that it is
+    set to, so that the :class:`.CameraServer` and anything else that uses
+    JPEG data from the camera can be run off the robot. By default it
+    generates a moving test pattern. To use real images instead, point it
+    at a directory of JPEG files, which are played in a loop::
+
+        camera = wpilib.USBCamera()
+        if wpilib.RobotBase.isSimulation():
+            camera.setImageDirectory('/path/to/images')
+
+    Each image has a comment added to it containing the time that it was
+    captured and a frame number, see :func:`getFrameInfo`.
+'''
+
+import os
+import struct
+import threading
+import time
+
+from ..timer import Timer
+
+__all__ = ["USBCamera", "getFrameInfo"]
+
+#: Start of the comment added to each image
+kFrameInfoMagic = b"SIMCAM"
+
+_frameInfo = struct.Struct("!6sdI")
+
+
+def getFrameInfo(data):
+    '''Reads the information added to an image by the simulated camera
+
+    :param data: JPEG image, anything supporting the buffer protocol
+    :returns: (time that the image was captured, as returned by
+              time.time(), frame number), or None if the image isn't from
+              the simulated camera
+    '''
+    data = memoryview(data).cast('B')
+    # SOI, then a COM segment
+    if len(data) < 6 + _frameInfo.size or bytes(data[:4]) != b"\xff\xd8\xff\xfe":
+        return None
+    magic, timestamp, frameNumber = _frameInfo.unpack_from(data, 6)
+    if magic != kFrameInfoMagic:
+        return None
+    return timestamp, frameNumber
+
+
+def _frameInfoSegment(timestamp, frameNumber):
+    payload = _frameInfo.pack(kFrameInfoMagic, timestamp, frameNumber)
+    return b"\xff\xfe" + struct.pack("!H", len(payload) + 2) + payload
+
+
+#
+# A minimal JPEG encoder for the test pattern. It encodes a greyscale image
+# made of 8x8 blocks that each have a single level, which only needs the DC
+# coefficients and is fast enough to do in Python.
+#
+
+# The standard luminance DC Huffman table
+_dcBits = [0, 1, 5, 1, 1, 1, 1, 1, 1, 0, 0, 0, 0, 0, 0, 0]
+_dcValues = list(range(12))
+
+# An AC table containing only end of block, as a one bit code
+_acBits = [1] + [0] * 15
+_acValues = [0]
+
+
+def _huffmanCodes(bits, values):
+    # the canonical codes for a table, {value: (code, length)}
+    codes = {}
+    code = 0
+    i = 0
+    for length, count in enumerate(bits, 1):
+        for _ in range(count):
+            codes[values[i]] = (code, length)
+            code += 1
+            i += 1
+        code <<= 1
+    return codes
+
+_dcCodes = _huffmanCodes(_dcBits, _dcValues)
+_eob = _huffmanCodes(_acBits, _acValues)[0]
+
+
+def _segment(marker, payload):
+    return bytes([0xff, marker]) + struct.pack("!H", len(payload) + 2) + payload
+
+
+def encodeBlocks(levels, width, height):
+    '''Encodes a greyscale JPEG in which each 8x8 block has one level
+
+    :param levels: Level (0-255) of each block, a row at a time
+    :param width: Width of the image in pixels
+    :param height: Height of the image in pixels
+    :returns: The JPEG image as bytes
+    '''
+    out = bytearray(b"\xff\xd8")
+
+    # quantization table of all 1s, so a block's DC coefficient is 8 times
+    # its level (shifted to be signed)
+    out += _segment(0xdb, bytes([0]) + bytes([1] * 64))
+    out += _segment(0xc0, struct.pack("!BHHBBBB", 8, height, width, 1, 1, 0x11, 0))
+    out += _segment(0xc4, bytes([0x00] + _dcBits + _dcValues))
+    out += _segment(0xc4, bytes([0x10] + _acBits + _acValues))
+    out += _segment(0xda, bytes([1, 1, 0x00, 0, 63, 0]))
+
+    # the entropy coded data
+    acc = 0
+    nbits = 0
+    data = bytearray()
+    eobCode, eobLength = _eob
+
+    last = 0
+    for level in levels:
+        dc = (level - 128) * 8
+        diff = dc - last
+        last = dc
+
+        size = abs(diff).bit_length()
+        code, length = _dcCodes[size]
+        if diff < 0:
+            diff += (1 << size) - 1
+
+        acc = (((acc << length | code) << size | diff) << eobLength) | eobCode
+        nbits += length + size + eobLength
+
+        while nbits >= 8:
+            nbits -= 8
+            b = (acc >> nbits) & 0xff
+            data.append(b)
+            if b == 0xff:
+                data.append(0)
+        acc &= (1 << nbits) - 1
+
+    # pad with 1 bits
+    if nbits:
+        b = ((acc << (8 - nbits)) | ((1 << (8 - nbits)) - 1)) & 0xff
+        data.append(b)
+        if b == 0xff:
+            data.append(0)
+
+    out += data
+    out += b"\xff\xd9"
+    return bytes(out)
+
+
+def testPattern(width, height, frameNumber):
+    '''Creates an image of a grey ramp, with a bar moving across it
+
+    :returns: The JPEG image as bytes
+    '''
+    bw = (width + 7) // 8
+    bh = (height + 7) // 8
+    bar = frameNumber % bw
+
+    row = [255 if x == bar else 32 + (x * 160) // bw for x in range(bw)]
+    return encodeBlocks(row * bh, width, height)
+
+
+class USBCamera:
+    kDefaultCameraName = b"cam0"
+
+    #: Number of different test pattern images that are cached
+    kPatternCacheSize = 64
+
+    class WhiteBalance:
+        kFixedIndoor = 3000
+        kFixedOutdoor1 = 4000
+        kFixedOutdoor2 = 5000
+        kFixedFluorescent1 = 5100
+        kFixedFlourescent2 = 5200
+
+    def __init__(self, name=None):
+        if name is None:
+            name = USBCamera.kDefaultCameraName
+        self.name = name
+        self.id = None
+        self.active = False
+        self.useJpeg = True
+
+        self.mutex = threading.RLock()
+
+        self.width = 320
+        self.height = 240
+        self.fps = 30
+        self.whiteBalance = "auto"
+        self.whiteBalanceValue = None
+        self.exposure = "auto"
+        self.exposureValue = None
+        self.brightness = 50
+        self.needSettingsUpdate = True
+
+        # where images come from
+        self.imageDirectory = None
+        self.images = []
+        self.patternCache = {}
+
+        self.frameNumber = 0
+        self.nextFrameTime = None
+
+        self.openCamera()
+
+    def setImageDirectory(self, path):
+        """Use the JPEG files in a directory as the images, in order of
+        their names. Only available in simulation.
+
+        :param path: Directory of JPEG files, or None to use the test pattern
+        """
+        images = []
+        if path is not None:
+            for name in sorted(os.listdir(path)):
+                if not name.lower().endswith(('.jpg', '.jpeg')):
+                    continue
+                with open(os.path.join(path, name), 'rb') as fp:
+                    data = fp.read()
+                if data[:2] != b"\xff\xd8":
+                    raise ValueError("%s is not a JPEG file" % name)
+                images.append(data)
+
+            if not images:
+                raise ValueError("No JPEG files found in %s" % path)
+
+        with self.mutex:
+            self.imageDirectory = path
+            self.images = images
+
+    def openCamera(self):
+        pass
+
+    def closeCamera(self):
+        pass
+
+    def startCapture(self):
+        self.active = True
+
+    def stopCapture(self):
+        self.active = False
+
+    def updateSettings(self):
+        pass
+
+    def setFPS(self, fps):
+        with self.mutex:
+            if fps != self.fps:
+                self.needSettingsUpdate = True
+                self.fps = fps
+
+    def setSize(self, width, height):
+        with self.mutex:
+            if width != self.width or height != self.height:
+                self.needSettingsUpdate = True
+                self.width = width
+                self.height = height
+
+    def setBrightness(self, brightness):
+        """Set the brightness, as a percentage (0-100).
+        """
+        with self.mutex:
+            if brightness > 100:
+                self.brightness = 100
+            elif brightness < 0:
+                self.brightness = 0
+            else:
+                self.brightness = brightness
+            self.needSettingsUpdate = True
+
+    def getBrightness(self):
+        """Get the brightness, as a percentage (0-100).
+        """
+        with self.mutex:
+            return self.brightness
+
+    def setWhiteBalanceAuto(self):
+        """Set the white balance to auto.
+        """
+        with self.mutex:
+            self.whiteBalance = "auto"
+            self.whiteBalanceValue = None
+            self.needSettingsUpdate = True
+
+    def setWhiteBalanceHoldCurrent(self):
+        """Set the white balance to hold current.
+        """
+        with self.mutex:
+            self.whiteBalance = "manual"
+            self.whiteBalanceValue = None
+            self.needSettingsUpdate = True
+
+    def setWhiteBalanceManual(self, value):
+        """Set the white balance to manual, with specified color temperature.
+        """
+        with self.mutex:
+            self.whiteBalance = "manual"
+            self.whiteBalanceValue = value
+            self.needSettingsUpdate = True
+
+    def setExposureAuto(self):
+        """Set the exposure to auto aperature.
+        """
+        with self.mutex:
+            self.exposure = "auto"
+            self.exposureValue = None
+            self.needSettingsUpdate = True
+
+    def setExposureHoldCurrent(self):
+        """Set the exposure to hold current.
+        """
+        with self.mutex:
+            self.exposure = "manual"
+            self.exposureValue = None
+            self.needSettingsUpdate = True
+
+    def setExposureManual(self, value):
+        """Set the exposure to manual, as a percentage (0-100).
+        """
+        with self.mutex:
+            self.exposure = "manual"
+            if value > 100:
+                self.exposureValue = 100
+            elif value < 0:
+                self.exposureValue = 0
+            else:
+                self.exposureValue = value
+            self.needSettingsUpdate = True
+
+    def getImage(self, image):
+        with self.mutex:
+            if self.needSettingsUpdate or self.useJpeg:
+                self.needSettingsUpdate = False
+                self.useJpeg = False
+                self.updateSettings()
+        raise NotImplementedError
+
+    def getImageData(self, data, maxsize):
+        """Waits for the next image, and copies it to data
+
+        :param data: Buffer for the JPEG image
+        :param maxsize: Size of the buffer
+        :returns: Size of the image
+        """
+        with self.mutex:
+            if self.needSettingsUpdate or not self.useJpeg:
+                self.needSettingsUpdate = False
+                self.useJpeg = True
+                self.updateSettings()
+
+            period = 1.0 / self.fps if self.fps > 0 else 0.0
+            width = self.width
+            height = self.height
+            images = self.images
+
+        # the camera produces images at its frame rate, on the same clock
+        # as the rest of the simulation
+        now = Timer.getFPGATimestamp()
+        if self.nextFrameTime is None:
+            self.nextFrameTime = now
+        elif now < self.nextFrameTime:
+            Timer.delay(self.nextFrameTime - now)
+            now = self.nextFrameTime
+        self.nextFrameTime = max(self.nextFrameTime + period, now)
+
+        frameNumber = self.frameNumber
+        self.frameNumber += 1
+
+        if images:
+            image = images[frameNumber % len(images)]
+        else:
+            key = (width, height, frameNumber % self.kPatternCacheSize)
+            image = self.patternCache.get(key)
+            if image is None:
+                if len(self.patternCache) >= self.kPatternCacheSize:
+                    self.patternCache.clear()
+                image = testPattern(width, height, key[2])
+                self.patternCache[key] = image
+
+        info = _frameInfoSegment(time.time(), frameNumber)
+        size = len(image) + len(info)
+        if size > maxsize:
+            raise ValueError("image is too large (%d bytes)" % size)
+
+        view = memoryview(data).cast('B')
+        view[:2] = image[:2]
+        view[2:2+len(info)] = info
+        view[2+len(info):size] = image[2:]
+        return size
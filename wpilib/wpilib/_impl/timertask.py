@@ -1,58 +1,239 @@
 # novalidate
 '''
-    An implementation of java.util.TimerTask which is needed for
-    the PID Controller
-    
-    TODO: Java switched to the notifier, so should we?
+    Periodic tasks, which are needed for the PID Controller
+
+    Running a thread per periodic task scales poorly when a robot has
+    several PID loops, as each thread competes for the GIL and has its
+    own independent jitter. :class:`TimerTaskRunner` multiplexes any
+    number of periodic tasks onto a single :class:`.Notifier`, running
+    whichever task expires first.
 '''
 
+import heapq
+import itertools
 import threading
+from ..notifier import Notifier
 from ..timer import Timer
 
 import logging
 
-class TimerTask(threading.Thread):
-    
-    def __init__(self, name, period, task_fn):
-        super().__init__(name=name, daemon=True)
-        self.logger = logging.getLogger('wpilib.%s' % name)
+__all__ = ["TimerTaskRunner", "PeriodicTask"]
+
+class PeriodicTask:
+    '''
+        A task that has been scheduled on a :class:`TimerTaskRunner`. Keeps
+        track of timing statistics for the task, which are useful for
+        determining whether the task is running when it is supposed to.
+    '''
+
+    def __init__(self, runner, name, period, task_fn):
+        self.runner = runner
+        self.name = name
         self.period = period
         self.task_fn = task_fn
-        
-        self.last_warning = -10
-        
-        self.stopped = False
-    
+
+        # time (in seconds) that the task is next supposed to run
+        self.expiration = None
+        self.cancelled = False
+
+        self.resetStats()
+
     def cancel(self):
-        self.stopped = True
-        self.join()
-    
-    def run(self):
-        
-        self.logger.info("Timer task started")
-        
-        try:
-            period = self.period
-            wait_til = Timer.getFPGATimestamp() + period
-            
-            while not self.stopped:
-                
+        '''Stops the task from running. If the task is currently running
+        on another thread, this waits until it has finished.'''
+        self.runner.cancel(self)
+
+    def resetStats(self):
+        '''Clears the timing statistics for this task'''
+        self.count = 0
+        self.overruns = 0
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+    def getStats(self):
+        '''
+            :returns: A dictionary of timing statistics (in seconds) for
+                      this task:
+
+                      - count: number of times the task has run
+                      - overruns: number of times the task was not finished
+                        by the time it was next supposed to run
+                      - jitter_last, jitter_max, jitter_avg: how late the
+                        task started relative to when it was scheduled
+                      - duration_last, duration_max: how long the task took
+        '''
+        count = self.count
+        return {
+            'count': count,
+            'overruns': self.overruns,
+            'jitter_last': self.last_jitter,
+            'jitter_max': self.max_jitter,
+            'jitter_avg': self.total_jitter / count if count else 0.0,
+            'duration_last': self.last_duration,
+            'duration_max': self.max_duration,
+        }
+
+
+class TimerTaskRunner:
+    '''
+        Runs any number of periodic tasks from a single :class:`.Notifier`.
+        Tasks are kept in a heap ordered by the next time that they are
+        supposed to run, and the notifier alarm is always set for the
+        earliest one.
+    '''
+
+    @staticmethod
+    def getInstance():
+        '''
+            :returns: The runner shared by all of WPILib
+            :rtype: :class:`TimerTaskRunner`
+        '''
+        if not hasattr(TimerTaskRunner, 'instance'):
+            TimerTaskRunner.instance = TimerTaskRunner()
+        return TimerTaskRunner.instance
+
+    def __init__(self, name='TimerTaskRunner'):
+        self.name = name
+        self.logger = logging.getLogger('wpilib.%s' % name)
+
+        self.cond = threading.Condition()
+
+        # heap of (expiration, sequence, task)
+        self.queue = []
+        self.sequence = itertools.count()
+
+        # created when the first task is scheduled
+        self.notifier = None
+
+        # the thread running the current task
+        self.thread = None
+        self.current = None
+
+        self.last_warning = -10
+
+    def schedule(self, name, period, task_fn):
+        '''Schedules a function to be called periodically. The first call
+        happens one period after this function is called.
+
+        :param name: Name of the task (used for logging)
+        :param period: Time between calls, in seconds
+        :param task_fn: Function to call
+
+        :returns: a task object that can be used to cancel the task
+        :rtype: :class:`PeriodicTask`
+        '''
+        task = PeriodicTask(self, name, period, task_fn)
+
+        with self.cond:
+            # the notifier is freed when wpilib is reset
+            if self.notifier is None or self.notifier.notifier is None:
+                self.notifier = Notifier(self._run)
+
+            now = Timer.getFPGATimestamp()
+            task.expiration = now + period
+            self._push(task)
+            self._updateAlarm(now)
+
+        return task
+
+    def cancel(self, task):
+        '''Stops a task from running. Cancelled tasks are discarded when
+        they reach the front of the queue.
+
+        :param task: A task returned by :meth:`schedule`
+        '''
+        with self.cond:
+            task.cancelled = True
+
+            # Don't return until the task has finished running, unless it
+            # is cancelling itself
+            if threading.current_thread() is not self.thread:
+                while self.current is task:
+                    self.cond.wait()
+
+    def getTasks(self):
+        '''
+            :returns: A list of all tasks that are currently scheduled
+        '''
+        with self.cond:
+            return [task for _, _, task in self.queue if not task.cancelled]
+
+    def _push(self, task):
+        heapq.heappush(self.queue, (task.expiration, next(self.sequence), task))
+
+    def _updateAlarm(self, now):
+        # must be called with self.cond held
+        queue = self.queue
+        while queue and queue[0][2].cancelled:
+            heapq.heappop(queue)
+
+        # if nothing is left the alarm is not rearmed
+        if queue:
+            self.notifier.startSingle(max(queue[0][0] - now, 0))
+
+    def _run(self):
+        # Called from the notifier thread; runs every task that has expired
+
+        queue = self.queue
+
+        while True:
+            with self.cond:
                 now = Timer.getFPGATimestamp()
-                delay = wait_til - now
-                
-                if delay > 0:
-                    Timer.delay(wait_til - now)
-                else:
-                    # only emit warning once per second
-                    if now - self.last_warning > 1:
-                        self.last_warning = now
-                        self.logger.warn("Delay time was negative (%02f: too much going on?)", delay)
-                
-                if self.stopped:
-                    break
-                
-                self.task_fn()
-                
-                wait_til += period
-        finally:
-            self.logger.info("Timer task exited")
+
+                while queue and queue[0][2].cancelled:
+                    heapq.heappop(queue)
+
+                if not queue or queue[0][0] > now:
+                    self._updateAlarm(now)
+                    return
+
+                _, _, task = heapq.heappop(queue)
+                self.thread = threading.current_thread()
+                self.current = task
+
+            try:
+                self._run_task(task, now)
+            finally:
+                with self.cond:
+                    self.current = None
+                    if not task.cancelled:
+                        self._push(task)
+                    self.cond.notify_all()
+
+    def _run_task(self, task, now):
+
+        jitter = now - task.expiration
+
+        try:
+            task.task_fn()
+        except:
+            # a broken task shouldn't stop all of the other tasks
+            self.logger.exception("Timer task %s raised an exception, cancelling it", task.name)
+            task.cancelled = True
+            return
+
+        end = Timer.getFPGATimestamp()
+        duration = end - now
+
+        task.count += 1
+        task.last_jitter = jitter
+        task.total_jitter += jitter
+        if jitter > task.max_jitter:
+            task.max_jitter = jitter
+        task.last_duration = duration
+        if duration > task.max_duration:
+            task.max_duration = duration
+
+        task.expiration += task.period
+
+        if task.expiration <= end:
+            task.overruns += 1
+
+            # only emit warning once per second
+            if end - self.last_warning > 1:
+                self.last_warning = end
+                self.logger.warn("%s is running late (%02f: too much going on?)",
+                                 task.name, task.expiration - end)
@@ -29,3 +29,13 @@ class JoystickButton(Button):
         :returns: The value of the joystick button
         """
         return self.joystick.getRawButton(self.buttonNumber)
+
+    def _getJoystickButton(self):
+        from ..joystick import Joystick
+
+        # Only if nothing else can change the state
+        if type(self).get is not JoystickButton.get or self.getTable() is not None:
+            return None
+        if type(self.joystick).getRawButton is not Joystick.getRawButton:
+            return None
+        return self.joystick.port, self.buttonNumber
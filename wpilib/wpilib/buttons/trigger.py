@@ -44,17 +44,17 @@ class Trigger:
 
         :param command: the command to start
         """
-        def execute():
-            if self.grab():
+        def execute(pressed=None):
+            if pressed is None:
+                pressed = self.grab()
+            if pressed:
                 if not execute.pressedLast:
                     execute.pressedLast = True
                     command.start()
             else:
                 execute.pressedLast = False
 
-        execute.pressedLast = self.grab()
-        from ..command import Scheduler
-        Scheduler.getInstance().addButton(execute)
+        self._addButton(execute, True)
 
     def whileActive(self, command):
         """Constantly starts the given command while the button is held.
@@ -64,8 +64,10 @@ class Trigger:
 
         :param command: the command to start
         """
-        def execute():
-            if self.grab():
+        def execute(pressed=None):
+            if pressed is None:
+                pressed = self.grab()
+            if pressed:
                 execute.pressedLast = True
                 command.start()
             else:
@@ -73,34 +75,34 @@ class Trigger:
                     execute.pressedLast = False
                     command.cancel()
 
-        execute.pressedLast = self.grab()
-        from ..command import Scheduler
-        Scheduler.getInstance().addButton(execute)
+        self._addButton(execute, False)
 
     def whenInactive(self, command):
         """Starts the command when the trigger becomes inactive.
 
         :param command: the command to start
         """
-        def execute():
-            if self.grab():
+        def execute(pressed=None):
+            if pressed is None:
+                pressed = self.grab()
+            if pressed:
                 execute.pressedLast = True
             else:
                 if execute.pressedLast:
                     execute.pressedLast = False
                     command.start()
 
-        execute.pressedLast = self.grab()
-        from ..command import Scheduler
-        Scheduler.getInstance().addButton(execute)
+        self._addButton(execute, True)
 
     def toggleWhenActive(self, command):
         """Toggles a command when the trigger becomes active.
 
         :param command: the command to toggle
         """
-        def execute():
-            if self.grab():
+        def execute(pressed=None):
+            if pressed is None:
+                pressed = self.grab()
+            if pressed:
                 if not execute.pressedLast:
                     execute.pressedLast = True
                     if command.isRunning():
@@ -110,27 +112,53 @@ class Trigger:
             else:
                 execute.pressedLast = False
 
-        execute.pressedLast = self.grab()
-        from ..command import Scheduler
-        Scheduler.getInstance().addButton(execute)
+        self._addButton(execute, True)
 
     def cancelWhenActive(self, command):
         """Cancels a command when the trigger becomes active.
 
         :param command: the command to cancel
         """
-        def execute():
-            if self.grab():
+        def execute(pressed=None):
+            if pressed is None:
+                pressed = self.grab()
+            if pressed:
                 if not execute.pressedLast:
                     execute.pressedLast = True
                     command.cancel()
             else:
                 execute.pressedLast = False
 
+        self._addButton(execute, True)
+
+    def _addButton(self, execute, edgeOnly):
+        """Registers a button function with the :class:`.Scheduler`.
+
+        :param execute: Called by the scheduler with the current state of
+                        the trigger, or with no arguments if it should call
+                        :meth:`grab` itself
+        :param edgeOnly: True if execute does nothing unless the state of
+                         the trigger has changed
+        """
         execute.pressedLast = self.grab()
+        execute.trigger = self
+        execute.edgeOnly = edgeOnly
+        # worked out once, so that the Scheduler can group the buttons by
+        # joystick
+        execute.joystickButton = self._getJoystickButton()
+        self.bound = True
         from ..command import Scheduler
         Scheduler.getInstance().addButton(execute)
 
+    def _getJoystickButton(self):
+        """If the state of this trigger is just the state of a joystick
+        button, returns (port, buttonNumber) so that the :class:`.Scheduler`
+        can look it up along with all other buttons on that joystick.
+        Otherwise returns None, and the Scheduler calls :meth:`grab`. This is
+        called once for each command bound to the trigger.
+        """
+        return None
+
     def getSmartDashboardType(self):
         """These methods continue to return the "Button" :class:`.SmartDashboard` type
         until we decided to create a Trigger widget type for the dashboard.
@@ -141,6 +169,11 @@ class Trigger:
         self.table = table
         if table is not None:
             table.putBoolean("pressed", self.get())
+            if getattr(self, "bound", False):
+                # the dashboard can press the button now, so the Scheduler
+                # has to call grab() instead of reading the joystick
+                from ..command import Scheduler
+                Scheduler.getInstance()._regroupButtons()
 
     def getTable(self):
         return getattr(self, "table", None)
@@ -1,12 +1,23 @@
 # novalidate
-import nivision
 import ctypes
+import functools
 import logging
-import socket
 import struct
 import threading
 import time
 
+import hal
+
+try:
+    import nivision
+except ImportError:
+    # Only needed for IMAQ images, the JPEG images from a camera are
+    # served without it (such as the simulated camera)
+    nivision = None
+
+from ._impl.framepool import Frame, FramePool
+from ._impl.mjpegserver import MjpegServer, findJpegStart
+
 __all__ = ["CameraServer"]
 
 logger = logging.getLogger(__name__)
@@ -23,6 +34,7 @@ class CameraServer:
     kSize160x120 = 2
     kHardwareCompression = -1
     kMaxImageSize = 200000
+    kDefaultPoolSize = 3
 
     intStruct = struct.Struct("!i")
 
@@ -30,6 +42,11 @@ class CameraServer:
 
     @staticmethod
     def _reset():
+        if CameraServer.server is not None:
+            CameraServer.server.capturing = False
+            CameraServer.server.mjpegServer.stop()
+            if CameraServer.server.image is not None:
+                CameraServer.server.image.release()
         CameraServer.server = None
 
     @staticmethod
@@ -41,33 +58,68 @@ class CameraServer:
     def __init__(self):
         self.mutex = threading.RLock()
         self.ready = threading.Event()
-        self.dataPool = [(ctypes.c_ubyte * self.kMaxImageSize)(),
-                         (ctypes.c_ubyte * self.kMaxImageSize)(),
-                         (ctypes.c_ubyte * self.kMaxImageSize)()]
-        self.imageData = (None, 0, 0, None)
+        self.framePool = FramePool(self.kDefaultPoolSize, self.kMaxImageSize)
         self.captureThread = None
+        self.capturing = False
+
+        self.captured = 0
+        # the latest image from setImage, kept until it is replaced since
+        # the server doesn't keep a reference to it
+        self.image = None
 
         self.quality = 50
         self.hwClient = True
         self.camera = None
 
-        self.serverThread = threading.Thread(target=self._serve, name="CameraServer")
-        self.serverThread.daemon = True
-        self.serverThread.start()
+        # settings requested by the dashboard, which are applied to the
+        # camera once there is one
+        self.clientSettings = None
 
-    def _freeImageData(self, imageData):
-        if imageData[3] is not None:
-            nivision.imaqDispose(imageData[3])
-        elif imageData[0] is not None:
-            with self.mutex:
-                self.dataPool.append(imageData[0])
+        # in simulation, only accept dashboards on this computer
+        if hal.HALIsSimulation():
+            address = '127.0.0.1'
+        else:
+            address = ''
+
+        self.mjpegServer = MjpegServer(self.kPort, self._configure, address=address)
+        self.mjpegServer.start()
 
-    def _setImageData(self, data, size, start=0, vdata=None):
+    def _putFrame(self, frame):
+        try:
+            self.mjpegServer.putFrame(frame)
+        finally:
+            frame.release()
         with self.mutex:
-            self._freeImageData(self.imageData)
-            self.imageData = (data, size, start, vdata)
+            self.captured += 1
         self.ready.set()
 
+    def setPoolSize(self, count):
+        """Set the number of image buffers used by automatic capture. Each
+        dashboard that is being sent an image holds a buffer until it has
+        been sent, and the latest image is kept in another buffer. If they
+        are all in use the capture waits for one, so with several dashboards
+        connected more buffers may be needed to keep up.
+
+        :param count: Number of buffers, 3 by default
+        """
+        self.framePool.setCount(count)
+
+    def getStats(self):
+        """Get statistics about the images that have been served
+
+        :returns: dictionary of captured (number of images), sent (number of
+                  images sent to dashboards), dropped (number of images that
+                  a dashboard skipped), clients (number of dashboards
+                  connected), stalled (number of dashboards disconnected
+                  because they stopped receiving), and pool (see
+                  :meth:`.FramePool.getStats`)
+        """
+        stats = self.mjpegServer.getStats()
+        with self.mutex:
+            stats['captured'] = self.captured
+        stats['pool'] = self.framePool.getStats()
+        return stats
+
     def setImage(self, image):
         """Manually change the image that is served by the MJPEG stream. This
         can be called to pass custom annotated images to the dashboard. Note
@@ -86,23 +138,41 @@ class CameraServer:
         data = (ctypes.c_ubyte * size).from_address(vdata)
         #print("flatten: %s" % (time.time() - t0))
 
-        # If "HW" client setting, Find the start of the JPEG data
-        #print(size, [x for x in data])
-        start = 0
-        with self.mutex:
-            hwClient = True#self.hwClient
-        if hwClient:
-            while start < size - 1:
-                if data[start] == 0xFF and data[start + 1] == 0xD8:
-                    break
-                start += 1
-            #print(size, start)
-
-        size -= start
-        if size <= 2:
-            raise ValueError("data size of flattened image is less than 2. Try another camera!")
+        # The flattened image is sent as it is, and disposed of once the
+        # dashboards are done with it
+        frame = Frame(data, dispose=functools.partial(nivision.imaqDispose, vdata))
+        frame.addRef()
 
-        self._setImageData(data, size, start, vdata)
+        try:
+            # If "HW" client setting, Find the start of the JPEG data
+            #print(size, [x for x in data])
+            start = 0
+            with self.mutex:
+                hwClient = True#self.hwClient
+            if hwClient:
+                start = findJpegStart(data)
+                if start == -1:
+                    start = size - 1
+                #print(size, start)
+
+            size -= start
+            if size <= 2:
+                raise ValueError("data size of flattened image is less than 2. Try another camera!")
+        except:
+            frame.release()
+            raise
+
+        frame.start = start
+        frame.size = size
+
+        # a second reference, which is kept until the next image
+        frame.addRef()
+        with self.mutex:
+            previous = self.image
+            self.image = frame
+        self._putFrame(frame)
+        if previous is not None:
+            previous.release()
 
     def startAutomaticCapture(self, camera):
         """Start automatically capturing images to send to the dashboard.
@@ -116,33 +186,48 @@ class CameraServer:
         if self.captureThread is not None:
             return
 
-        self.camera = camera
+        with self.mutex:
+            self.camera = camera
+            clientSettings = self.clientSettings
+
         self.camera.startCapture()
+        if clientSettings is not None:
+            self._configureCamera(*clientSettings)
 
+        self.capturing = True
         self.captureThread = threading.Thread(target=self._autoCapture, name="CaptureThread")
         self.captureThread.daemon = True
         self.captureThread.start()
 
     def _autoCapture(self):
-        frame = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_RGB, 0)
+        frame = None
+        if nivision is not None:
+            frame = nivision.imaqCreateImage(nivision.IMAQ_IMAGE_RGB, 0)
 
-        while True:
+        while self.capturing:
             with self.mutex:
                 hwClient = True#self.hwClient
-                if hwClient:
-                    data = self.dataPool[-1]
-                    self.dataPool.pop()
+
+            data = None
             try:
                 if hwClient:
-                    size = self.camera.getImageData(data, self.kMaxImageSize)
-                    self._setImageData(data, size)
+                    # Waits for a dashboard to finish with a buffer if they
+                    # are all in use
+                    data = self.framePool.acquire(1.0)
+                    if data is None:
+                        logger.warning("no image buffer became free, is a dashboard stalled?")
+                        continue
+
+                    data.size = self.camera.getImageData(data.buffer, self.kMaxImageSize)
+                    self._putFrame(data)
+                    data = None
                 else:
                     self.camera.getImage(frame)
                     self.setImage(frame)
             except (ValueError, IndexError):
                 logger.exception("getting image")
-                if hwClient and not self.ready.is_set():
-                    self.dataPool.append(data)
+                if data is not None:
+                    data.release()
                 time.sleep(0.1)
 
     def isAutoCaptureStarted(self):
@@ -182,87 +267,24 @@ class CameraServer:
         with self.mutex:
             return self.quality
 
-    def _serve(self):
-        """Run the M-JPEG server.
-
-        This function listens for a connection from the dashboard in a
-        background thread, then sends back the M-JPEG stream.
-        """
-
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(('', self.kPort))
-        sock.listen(1)
-
-        while True:
-            try:
-                conn, addr = sock.accept()
-
-                s = conn.makefile('rwb')
-
-                fps = self.intStruct.unpack(s.read(4))[0]
-                compression = self.intStruct.unpack(s.read(4))[0]
-                size = self.intStruct.unpack(s.read(4))[0]
-                logger.info("Client connected: %d fps, %d compression, %d size"
-                            % (fps, compression, size))
-
-                with self.mutex:
-                    doWait = self.camera is None
+    def _configure(self, fps, compression, size):
+        # called by the server thread when a dashboard connects
+        if compression == self.kHardwareCompression:
+            hwClient = True
+        else:
+            hwClient = False
+            self.setQuality(100-compression)
 
-                if doWait:
-                    logger.info("camera not ready yet, awaiting first image")
-                    self.ready.wait()
+        with self.mutex:
+            self.hwClient = hwClient
+            self.clientSettings = (fps, size)
+            camera = self.camera
 
-                if compression == self.kHardwareCompression:
-                    hwClient = True
-                else:
-                    hwClient = False
-                    self.setQuality(100-compression)
-
-                with self.mutex:
-                    self.hwClient = hwClient
-                    self.camera.setFPS(fps)
-                self.setSize(size)
-
-                period = 1.0 / fps
-                while True:
-                    t0 = time.time()
-
-                    self.ready.wait()
-                    self.ready.clear()
-
-                    imageData = (None, 0, 0, None)
-                    try:
-                        with self.mutex:
-                            imageData = self.imageData
-                            self.imageData = (None, 0, 0, None)
-
-                        if imageData[0] is None:
-                            continue
-
-                        size = imageData[1]
-                        start = imageData[2]
-                        data = (ctypes.c_ubyte * size).from_address(ctypes.addressof(imageData[0])+start)
-
-                        #print("sending image")
-                        s.write(self.kMagicNumber)
-                        # write size of image
-                        s.write(self.intStruct.pack(size))
-                        s.write(data)
-                    except IOError:
-                        # print error to driverstation
-                        logger.exception("error sending image")
-                        break
-                    finally:
-                        self._freeImageData(imageData)
-
-                    s.flush()
-                    dt = time.time() - t0
-                    #print(dt, period)
-                    if dt < period:
-                        time.sleep(period - dt)
-            except IOError:
-                # print error to driverstation
-                logger.exception("error in conn")
-                continue
+        if camera is None:
+            logger.info("camera not ready yet, settings will be applied when it starts")
+        else:
+            self._configureCamera(fps, size)
 
+    def _configureCamera(self, fps, size):
+        self.camera.setFPS(fps)
+        self.setSize(size)
@@ -254,15 +254,18 @@ class CommandGroup(Command):
 
     def cancelConflicts(self, command):
         toremove = []
+        requirements = command.getRequirements()
+        if not requirements:
+            return
+
         for i, entry in enumerate(self.children):
             child = entry.command
 
-            for requirement in command.getRequirements():
-                if child.doesRequire(requirement):
-                    child._cancel()
-                    child.removed()
-                    toremove.append(i)
-                    break
+            # requirements can't change once a command is in a group
+            if not requirements.isdisjoint(child.requirements):
+                child._cancel()
+                child.removed()
+                toremove.append(i)
 
         for i in reversed(toremove):
             del self.children[i]
@@ -11,6 +11,8 @@ import hal
 from ..sendable import Sendable
 
 import collections
+import itertools
+import operator
 import warnings
 
 __all__ = ["Scheduler"]
@@ -53,8 +55,18 @@ class Scheduler(Sendable):
 
         # Active Commands
         self.commandTable = collections.OrderedDict()
+        # Active Commands, by the id that they are published with
+        self.commandIds = {}
+        # Changes to the active commands that haven't been published yet,
+        # {id: command}. command is None if it was removed.
+        self.tableChanges = collections.OrderedDict()
+        # Position of each id in the published arrays
+        self.tableIndex = {}
         # The set of all Subsystems
         self.subsystems = set()
+        # Subsystems that may need their default command started or the
+        # change of their current command confirmed
+        self.dirtySubsystems = set()
         # Whether or not we are currently adding a command
         self.adding = False
         # Whether or not we are currently disabled
@@ -63,8 +75,27 @@ class Scheduler(Sendable):
         self.additions = []
         # A list of all Buttons. It is created lazily.
         self.buttons = []
+        # The buttons that are called on every run, as (index in buttons,
+        # button, (stick, buttonNumber) or None)
+        self.polledButtons = []
+        # {stick: [(index, button, (stick, buttonNumber))]} for the buttons
+        # that only need to be called when the joystick's buttons change
+        self.stickButtonBindings = {}
+        # True if any button reads a joystick button
+        self.readsJoysticks = False
         self.runningCommandsChanged = False
 
+        # Joystick buttons as of the last driver station packet, used to
+        # only call the button functions that need to be called
+        self.ds = None
+        self.lastPacket = None
+        self.stickButtons = None
+        self.stickButtonCounts = None
+        self.changedSticks = set()
+
+        # Records how long things take, if enabled
+        self.profiler = None
+
     def add(self, command):
         """Adds the command to the Scheduler. This will not add the
         :class:`.Command` immediately, but will instead wait for the proper time in
@@ -83,9 +114,111 @@ class Scheduler(Sendable):
         """Adds a button to the Scheduler. The Scheduler will poll
         the button during its :meth:`run`.
 
-        :param button: the button to add
+        :param button: the button to add. This is a function that is called
+                       with no arguments, unless it was created by a
+                       :class:`.Trigger`.
         """
         self.buttons.append(button)
+        self._groupButton(len(self.buttons) - 1, button)
+
+    def _groupButton(self, index, button):
+        """Files a button under the joystick whose button it reads, if it
+        only needs to be called when that joystick's buttons change.
+        Otherwise it is called on every run.
+        """
+        source = getattr(button, 'joystickButton', None)
+        if source is not None:
+            from ..driverstation import DriverStation
+            if not 0 <= source[0] < DriverStation.kJoystickPorts or \
+               button.trigger.getTable() is not None:
+                # the trigger reports the error, or the dashboard can
+                # press the button
+                source = None
+
+        if source is not None:
+            self.readsJoysticks = True
+
+        if source is not None and button.edgeOnly:
+            self.stickButtonBindings.setdefault(source[0], []).append((index, button, source))
+        else:
+            self.polledButtons.append((index, button, source))
+
+    def _regroupButtons(self):
+        """Files the buttons again, after something changed whether their
+        state is just the state of a joystick button
+        """
+        self.polledButtons = []
+        self.stickButtonBindings = {}
+        self.readsJoysticks = False
+        for index, button in enumerate(self.buttons):
+            self._groupButton(index, button)
+
+    def _updateJoystickButtons(self):
+        """Finds the joysticks whose buttons have changed since the last
+        time this was called, if a new driver station packet has arrived.
+        """
+        ds = self.ds
+        if ds is None:
+            from ..driverstation import DriverStation
+            ds = self.ds = DriverStation.getInstance()
+
+        packet = ds.packetCount
+        if packet == self.lastPacket:
+            self.changedSticks.clear()
+            return
+
+        self.lastPacket = packet
+
+        sticks = range(ds.kJoystickPorts)
+        stickButtons = [ds.getStickButtons(stick).buttons for stick in sticks]
+        stickButtonCounts = [ds.getStickButtonCount(stick) for stick in sticks]
+
+        if self.stickButtons is None:
+            self.changedSticks = set(sticks)
+        else:
+            self.changedSticks = {stick for stick in sticks
+                                  if stickButtons[stick] != self.stickButtons[stick] or
+                                     stickButtonCounts[stick] != self.stickButtonCounts[stick]}
+
+        self.stickButtons = stickButtons
+        self.stickButtonCounts = stickButtonCounts
+
+    def _pollButtons(self, profiler):
+        """Calls the button functions. Functions for joystick buttons are
+        given the state of the button, and the ones that only do something
+        when the button changes are only called when a new driver station
+        packet changed that joystick's buttons.
+        """
+        buttons = self.polledButtons
+        if self.readsJoysticks:
+            self._updateJoystickButtons()
+
+            bindings = self.stickButtonBindings
+            groups = [bindings[stick] for stick in self.changedSticks if stick in bindings]
+            if groups:
+                # keep the order that the buttons were added in (heapq.merge
+                # only takes a key on Python 3.5+)
+                buttons = sorted(itertools.chain(buttons, *groups), key=operator.itemgetter(0))
+
+        stickButtons = self.stickButtons
+        stickButtonCounts = self.stickButtonCounts
+
+        # going backwards preserves button priority
+        for _, button, source in reversed(buttons):
+            if source is None:
+                args = ()
+            else:
+                stick, buttonNumber = source
+                if buttonNumber <= 0 or buttonNumber > stickButtonCounts[stick]:
+                    # let the trigger report the error
+                    args = ()
+                else:
+                    args = (((1 << (buttonNumber - 1)) & stickButtons[stick]) != 0,)
+
+            if profiler is None:
+                button(*args)
+            else:
+                profiler.runButton(button, *args)
 
     def _add(self, command):
         """Adds a command immediately to the Scheduler. This should only be
@@ -105,23 +238,28 @@ class Scheduler(Sendable):
 
         # Only add if not already in
         if command not in self.commandTable:
+            requirements = command.getRequirements()
+
             # Check that the requirements can be had
-            for lock in command.getRequirements():
-                if (lock.getCurrentCommand() is not None and
-                    not lock.getCurrentCommand().isInterruptible()):
+            for lock in requirements:
+                current = lock.getCurrentCommand()
+                if current is not None and not current.isInterruptible():
                     return
 
             # Give it the requirements
             self.adding = True
-            for lock in command.getRequirements():
-                if lock.getCurrentCommand() is not None:
-                    lock.getCurrentCommand().cancel()
-                    self.remove(lock.getCurrentCommand())
+            for lock in requirements:
+                current = lock.getCurrentCommand()
+                if current is not None:
+                    current.cancel()
+                    self.remove(current)
                 lock.setCurrentCommand(command)
+            self.dirtySubsystems.update(requirements)
             self.adding = False
 
             # Add it to the list
             self.commandTable[command] = 1
+            self._commandAdded(command)
 
             self.runningCommandsChanged = True
 
@@ -144,13 +282,20 @@ class Scheduler(Sendable):
         if self.disabled:
             return # Don't run when disabled
 
-        # Get button input (going backwards preserves button priority)
-        for button in reversed(self.buttons):
-            button()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.startLoop()
+
+        # Get button input
+        self._pollButtons(profiler)
 
         # Loop through the commands
         for command in list(self.commandTable):
-            if not command.run():
+            if profiler is None:
+                running = command.run()
+            else:
+                running = profiler.runCommand(command)
+            if not running:
                 self.remove(command)
                 self.runningCommandsChanged = True
 
@@ -159,14 +304,28 @@ class Scheduler(Sendable):
             self._add(command)
         self.additions.clear()
 
-        # Add in the defaults
-        for lock in self.subsystems:
+        # Add in the defaults. Only subsystems whose command has changed
+        # need to be looked at.
+        dirty = self.dirtySubsystems
+        self.dirtySubsystems = set()
+        for lock in dirty:
             if lock.getCurrentCommand() is None:
                 self._add(lock.getDefaultCommand())
+
+        # includes subsystems that were given a default command above
+        dirty |= self.dirtySubsystems
+        self.dirtySubsystems.clear()
+        for lock in dirty:
+            # try again next time if the default command couldn't start
+            if lock.getCurrentCommand() is None and lock.getDefaultCommand() is not None:
+                self.dirtySubsystems.add(lock)
             lock.confirmCommand()
 
         self.updateTable()
 
+        if profiler is not None:
+            profiler.endLoop()
+
     def registerSubsystem(self, system):
         """Registers a :class:`.Subsystem` to this Scheduler, so that the
         Scheduler might know if a default Command needs to be
@@ -176,6 +335,15 @@ class Scheduler(Sendable):
         """
         if system is not None:
             self.subsystems.add(system)
+            self.dirtySubsystems.add(system)
+
+    def _markDirty(self, subsystem):
+        """Makes the next :meth:`run` check whether `subsystem` needs
+        its default command started.
+
+        :param subsystem: the subsystem whose state changed
+        """
+        self.dirtySubsystems.add(subsystem)
 
     def remove(self, command):
         """Removes the :class:`.Command` from the Scheduler.
@@ -185,8 +353,10 @@ class Scheduler(Sendable):
         if command is None or command not in self.commandTable:
             return
         del self.commandTable[command]
+        self._commandRemoved(command)
         for reqt in command.getRequirements():
             reqt.setCurrentCommand(None)
+            self.dirtySubsystems.add(reqt)
         command.removed()
 
     def removeAll(self):
@@ -194,11 +364,55 @@ class Scheduler(Sendable):
         """
         # TODO: Confirm that this works with "uninteruptible" commands
         for command in self.commandTable:
+            self._commandRemoved(command)
             for reqt in command.getRequirements():
                 reqt.setCurrentCommand(None)
+                self.dirtySubsystems.add(reqt)
             command.removed()
         self.commandTable.clear()
 
+    def _commandAdded(self, command):
+        cid = id(command)
+        self.commandIds[cid] = command
+        if self.getTable() is not None:
+            self.tableChanges[cid] = command
+
+    def _commandRemoved(self, command):
+        cid = id(command)
+        self.commandIds.pop(cid, None)
+        if self.getTable() is not None:
+            self.tableChanges[cid] = None
+
+    def enableProfiling(self, period=0.02, window=250):
+        """Starts recording how long each call to :meth:`run` takes, and
+        how long each command and button takes within it. If the Scheduler
+        is on the SmartDashboard, the statistics are also published to
+        its "Profile" subtable.
+
+        :param period: The amount of time (in seconds) that :meth:`run` is
+                       supposed to take. Anything that takes longer is
+                       counted as an overrun.
+        :param window: Number of recent samples that percentiles are
+                       computed from
+        :returns: the profiler, which can be used to retrieve the statistics
+        :rtype: :class:`.SchedulerProfiler`
+        """
+        from .._impl.profiler import SchedulerProfiler
+        self.profiler = SchedulerProfiler(period, window)
+        return self.profiler
+
+    def disableProfiling(self):
+        """Stops recording timing statistics. The profiler returned by
+        :meth:`enableProfiling` keeps the statistics recorded so far.
+        """
+        self.profiler = None
+
+    def getProfiler(self):
+        """:returns: the profiler if profiling is enabled, otherwise None
+        :rtype: :class:`.SchedulerProfiler`
+        """
+        return self.profiler
+
     def disable(self):
         """Disable the command scheduler.
         """
@@ -222,9 +436,15 @@ class Scheduler(Sendable):
         self.ids = NumberArray()
         self.toCancel = NumberArray()
 
+        # Publish the commands that are already running
+        self.tableIndex = {}
+        self.tableChanges = collections.OrderedDict(
+                        (id(command), command) for command in self.commandTable)
+
         self.table.putValue("Names", self.commands)
         self.table.putValue("Ids", self.ids)
         self.table.putValue("Cancel", self.toCancel)
+        self.updateTable()
 
     def updateTable(self):
         table = self.getTable()
@@ -233,21 +453,45 @@ class Scheduler(Sendable):
         # Get the commands to cancel
         self.table.retrieveValue("Cancel", self.toCancel)
         if self.toCancel:
-            for command in self.commandTable:
-                if id(command) in self.toCancel:
+            for cid in self.toCancel:
+                command = self.commandIds.get(int(cid))
+                if command is not None:
                     command.cancel()
             self.toCancel.clear()
             self.table.putValue("Cancel", self.toCancel)
 
-        if self.runningCommandsChanged:
-            self.commands.clear()
-            self.ids.clear()
-            # Set the the running commands
-            for command in self.commandTable:
-                self.commands.add(command.getName())
-                self.ids.add(id(command))
+        if self.tableChanges:
+            # Only the commands that were added or removed since the last
+            # update are changed. Removed commands are replaced by the last
+            # command in the arrays, so their order is not preserved.
+            commands = self.commands
+            ids = self.ids
+            index = self.tableIndex
+            for cid, command in self.tableChanges.items():
+                i = index.get(cid)
+                if command is not None:
+                    if i is None:
+                        index[cid] = len(ids)
+                        commands.append(command.getName())
+                        ids.append(cid)
+                    else:
+                        # a new command can have the id of an old one
+                        commands[i] = command.getName()
+                elif i is not None:
+                    del index[cid]
+                    lastId = ids.pop()
+                    lastName = commands.pop()
+                    if lastId != cid:
+                        index[lastId] = i
+                        ids[i] = lastId
+                        commands[i] = lastName
+            self.tableChanges.clear()
+
             self.table.putValue("Names", self.commands)
             self.table.putValue("Ids", self.ids)
 
+        if self.profiler is not None:
+            self.profiler.updateTable(self.table.getSubTable("Profile"))
+
     def getSmartDashboardType(self):
         return "Scheduler"
@@ -74,6 +74,8 @@ class Subsystem(Sendable):
             if self not in command.getRequirements():
                 raise ValueError("A default command must require the subsystem")
             self.defaultCommand = command
+        # the scheduler needs to check whether to start it
+        Scheduler.getInstance()._markDirty(self)
         table = self.getTable()
         if table is not None:
             if self.defaultCommand is not None:
@@ -11,6 +11,7 @@ import sys
 import traceback
 
 from .motorsafety import MotorSafety
+from .notifier import Notifier
 from .timer import Timer
 
 __all__ = ["DriverStation"]
@@ -20,6 +21,32 @@ logger = logging.getLogger('wpilib.ds')
 
 JOYSTICK_UNPLUGGED_MESSAGE_INTERVAL = 1.0
 
+class _JoystickData:
+    """The joystick state from a single driver station packet. A new one is
+    published for each packet, and is never changed after that, so readers
+    don't need to hold a lock and may keep a reference for as long as they
+    like. A port that didn't change shares its values with the previous
+    packet."""
+
+    __slots__ = ['axes', 'axisCounts', 'povs', 'povCounts',
+                 'buttons', 'buttonCounts', 'changed']
+
+    def __init__(self, axes, povs, buttons, changed):
+        """
+        :param axes: Tuple of axis values for each port
+        :param povs: Tuple of POV values for each port
+        :param buttons: HALJoystickButtons for each port
+        :param changed: True for each port whose data differs from the
+                        previous packet
+        """
+        self.axes = axes
+        self.axisCounts = [len(values) for values in axes]
+        self.povs = povs
+        self.povCounts = [len(values) for values in povs]
+        self.buttons = buttons
+        self.buttonCounts = [b.count for b in buttons]
+        self.changed = changed
+
 class DriverStation:
     """Provide access to the network communication data to / from the Driver
     Station."""
@@ -27,6 +54,10 @@ class DriverStation:
     #: The number of joystick ports
     kJoystickPorts = 6
 
+    #: Ports with nothing plugged in are only checked every this many
+    #: packets. Set to 1 to check them on every packet.
+    kUnpluggedPollInterval = 50
+
     class Alliance:
         """The robot alliance that the robot is a part of"""
         Red = 0
@@ -71,15 +102,32 @@ class DriverStation:
         self.packetDataAvailableSem = hal.initializeMultiWait()
         hal.HALSetNewDataSem(self.packetDataAvailableSem)
 
+        # waitForData waits on this, so that the simulator knows what the
+        # thread is waiting for
+        self.waitForDataMutex = hal.initializeMutexNormal()
+        self.waitForDataSem = hal.initializeMultiWait()
+
+        # Deadlines (FPGA timestamps) of waitForData calls with a timeout.
+        # The notifier gives waitForDataSem when the earliest one passes.
+        self.waitForDataDeadlines = []
+        self.waitForDataNotifier = None
+
         self.nextMessageTime = 0.0
 
-        self.joystickAxes = []
-        self.joystickPOVs = []
-        self.joystickButtons = []
-        for _ in range(self.kJoystickPorts):
-            self.joystickAxes.append([0]*hal.kMaxJoystickAxes)
-            self.joystickPOVs.append([0]*hal.kMaxJoystickPOVs)
-            self.joystickButtons.append(hal.HALJoystickButtons())
+        # The DS thread replaces joystickData with each packet. Readers must
+        # only access self.joystickData once per call.
+        ports = self.kJoystickPorts
+        self.joystickData = _JoystickData(
+                [(0,)*hal.kMaxJoystickAxes]*ports,
+                [(0,)*hal.kMaxJoystickPOVs]*ports,
+                [hal.HALJoystickButtons() for _ in range(ports)],
+                [False]*ports)
+
+        # structures that the HAL fills in, reused for each packet
+        self.halJoystickAxes = [hal.HALJoystickAxes() for _ in range(self.kJoystickPorts)]
+        self.halJoystickPOVs = [hal.HALJoystickPOVs() for _ in range(self.kJoystickPorts)]
+        self.halJoystickButtons = [hal.HALJoystickButtons() for _ in range(self.kJoystickPorts)]
+        self.packetCount = 0
 
         self.userInDisabled = False
         self.userInAutonomous = False
@@ -96,6 +144,8 @@ class DriverStation:
     def __del__(self):
         hal.deleteMultiWait(self.packetDataAvailableSem)
         hal.deleteMutex(self.packetDataAvailableMutex)
+        hal.deleteMultiWait(self.waitForDataSem)
+        hal.deleteMutex(self.waitForDataMutex)
 
     def release(self):
         """Kill the thread"""
@@ -110,6 +160,7 @@ class DriverStation:
             self.getData()
             with self.dataSem:
                 self.dataSem.notify_all()
+            hal.giveMultiWait(self.waitForDataSem)
             safetyCounter += 1
             if safetyCounter >= 4:
                 MotorSafety.checkMotors()
@@ -127,23 +178,102 @@ class DriverStation:
         """Wait for new data or for timeout, which ever comes first.  If
         timeout is None, wait for new data only.
 
-        :param timeout: The maximum time in milliseconds to wait.
+        :param timeout: The maximum time in seconds to wait.
         """
-        with self.dataSem:
-            self.dataSem.wait(timeout)
+        # the semaphore is also given when a call with a timeout times out
+        packetCount = self.packetCount
+        if timeout is None:
+            while self.packetCount == packetCount:
+                hal.takeMultiWait(self.waitForDataSem, self.waitForDataMutex)
+            return
+
+        # The timeout is kept by a HAL notifier rather than by waiting on a
+        # condition, so that a simulated clock can move forward while waiting
+        deadline = Timer.getFPGATimestamp() + timeout
+        with self.mutex:
+            self.waitForDataDeadlines.append(deadline)
+            self._updateWaitForDataAlarm()
+
+        try:
+            while self.packetCount == packetCount and \
+                  Timer.getFPGATimestamp() < deadline:
+                hal.takeMultiWait(self.waitForDataSem, self.waitForDataMutex)
+        finally:
+            with self.mutex:
+                self.waitForDataDeadlines.remove(deadline)
+
+    def _updateWaitForDataAlarm(self):
+        """Sets the notifier for the earliest waitForData deadline that
+        hasn't passed. Must be called with the mutex held."""
+        now = Timer.getFPGATimestamp()
+        pending = [d for d in self.waitForDataDeadlines if d > now]
+        if not pending:
+            return
+        if self.waitForDataNotifier is None:
+            self.waitForDataNotifier = Notifier(self._waitForDataTimeout)
+        self.waitForDataNotifier.startSingle(min(pending) - now)
+
+    def _waitForDataTimeout(self):
+        """Called by the notifier when a waitForData call times out"""
+        with self.mutex:
+            self._updateWaitForDataAlarm()
+        hal.giveMultiWait(self.waitForDataSem)
 
     def getData(self):
         """Copy data from the DS task for the user.
         If no new data exists, it will just be returned, otherwise
         the data will be copied from the DS polling loop.
         """
+        last = self.joystickData
+        axesList = list(last.axes)
+        povsList = list(last.povs)
+        buttonsList = list(last.buttons)
+        changedList = [False]*self.kJoystickPorts
+
+        packetCount = self.packetCount + 1
+        pollUnplugged = packetCount % self.kUnpluggedPollInterval == 0
+
+        # Get the status of all of the joysticks
+        for stick in range(self.kJoystickPorts):
+            lastButtons = last.buttons[stick]
+            if not pollUnplugged and not last.axes[stick] and \
+               not last.povs[stick] and lastButtons.count == 0:
+                # still unplugged
+                continue
+
+            axes = hal.HALGetJoystickAxes(stick, self.halJoystickAxes[stick])
+            povs = hal.HALGetJoystickPOVs(stick, self.halJoystickPOVs[stick])
+            buttons = hal.HALGetJoystickButtons(stick, self.halJoystickButtons[stick])
+
+            # values that didn't change are shared with the last packet
+            changed = False
+            axisValues = tuple(axes.axes[:axes.count])
+            if axisValues != last.axes[stick]:
+                axesList[stick] = axisValues
+                changed = True
+
+            povValues = tuple(povs.povs[:povs.count])
+            if povValues != last.povs[stick]:
+                povsList[stick] = povValues
+                changed = True
+
+            buttonCount = buttons.count
+            buttonValues = buttons.buttons if buttonCount else 0
+            if buttonValues != lastButtons.buttons or buttonCount != lastButtons.count:
+                buttonsList[stick] = hal.HALJoystickButtons(buttonValues, buttonCount)
+                changed = True
+
+            changedList[stick] = changed
+
+        data = _JoystickData(axesList, povsList, buttonsList, changedList)
+
+        # publish the new data
         with self.mutex:
-            # Get the status of all of the joysticks
-            for stick in range(self.kJoystickPorts):
-                self.joystickAxes[stick] = hal.HALGetJoystickAxes(stick)
-                self.joystickPOVs[stick] = hal.HALGetJoystickPOVs(stick)
-                self.joystickButtons[stick] = hal.HALGetJoystickButtons(stick)
+            self.joystickData = data
             self.newControlData = True
+            # waitForData returns once this changes, so the data must
+            # already be published
+            self.packetCount = packetCount
 
     def getBatteryVoltage(self):
         """Read the battery voltage.
@@ -175,13 +305,12 @@ class DriverStation:
         if axis < 0 or axis >= hal.kMaxJoystickAxes:
             raise IndexError("Joystick axis is out of range")
 
-        with self.mutex:
-            joystickAxes = self.joystickAxes[stick]
+        data = self.joystickData
 
-            if axis >= len(joystickAxes):
-                self._reportJoystickUnpluggedError("WARNING: Joystick axis %d on port %d not available, check if controller is plugged in\n" % (axis, stick))
-                return 0.0
-            value = joystickAxes[axis]
+        if axis >= data.axisCounts[stick]:
+            self._reportJoystickUnpluggedError("WARNING: Joystick axis %d on port %d not available, check if controller is plugged in\n" % (axis, stick))
+            return 0.0
+        value = data.axes[stick][axis]
         if value < 0:
             return value / 128.0
         else:
@@ -197,8 +326,7 @@ class DriverStation:
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
 
-        with self.mutex:
-            return len(self.joystickAxes[stick])
+        return self.joystickData.axisCounts[stick]
 
     def getStickPOV(self, stick, pov):
         """Get the state of a POV on the joystick.
@@ -214,13 +342,12 @@ class DriverStation:
         if pov < 0 or pov >= hal.kMaxJoystickPOVs:
             raise IndexError("Joystick POV is out of range")
 
-        with self.mutex:
-            joystickPOVs = self.joystickPOVs[stick]
+        data = self.joystickData
 
-            if pov >= len(joystickPOVs):
-                self._reportJoystickUnpluggedError("WARNING: Joystick POV %d on port %d not available, check if controller is plugged in\n" % (pov, stick))
-                return -1
-            return joystickPOVs[pov]
+        if pov >= data.povCounts[stick]:
+            self._reportJoystickUnpluggedError("WARNING: Joystick POV %d on port %d not available, check if controller is plugged in\n" % (pov, stick))
+            return -1
+        return data.povs[stick][pov]
 
     def getStickPOVCount(self, stick):
         """Returns the number of POVs on a given joystick port
@@ -232,20 +359,32 @@ class DriverStation:
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
 
-        with self.mutex:
-            return len(self.joystickPOVs[stick])
+        return self.joystickData.povCounts[stick]
+
+    def isStickChanged(self, stick):
+        """Whether the data for a joystick changed in the last packet
+        received from the driver station
+
+        :param stick: The joystick port number
+        :returns: True if any axis, POV or button changed
+        """
+        if stick < 0 or stick >= self.kJoystickPorts:
+            raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
+
+        return self.joystickData.changed[stick]
 
     def getStickButtons(self, stick):
         """The state of all the buttons on the joystick.
 
         :param stick: The joystick port number
-        :returns: The state of all buttons, as a bit array.
+        :returns: The state of all buttons, as a bit array in the buttons
+                  attribute. Don't modify it.
+        :rtype: :class:`hal.HALJoystickButtons`
         """
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
 
-        with self.mutex:
-            return self.joystickButtons[stick]
+        return self.joystickData.buttons[stick]
 
     def getStickButton(self, stick, button):
         """The state of a button on the joystick.
@@ -257,15 +396,15 @@ class DriverStation:
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
 
-        with self.mutex:
-            buttons = self.joystickButtons[stick]
-            if button > buttons.count:
-                self._reportJoystickUnpluggedError("WARNING: Joystick Button %d on port %d not available, check if controller is plugged in\n" % (button, stick))
-                return False
-            if button <= 0:
-                self._reportJoystickUnpluggedError("ERROR: Button indexes begin at 1 for WPILib\n")
-                return False
-            return ((0x1 << (button - 1)) & buttons.buttons) != 0
+        data = self.joystickData
+
+        if button > data.buttonCounts[stick]:
+            self._reportJoystickUnpluggedError("WARNING: Joystick Button %d on port %d not available, check if controller is plugged in\n" % (button, stick))
+            return False
+        if button <= 0:
+            self._reportJoystickUnpluggedError("ERROR: Button indexes begin at 1 for WPILib\n")
+            return False
+        return ((0x1 << (button - 1)) & data.buttons[stick].buttons) != 0
 
     def getStickButtonCount(self, stick):
         """Gets the number of buttons on a joystick
@@ -277,8 +416,7 @@ class DriverStation:
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
 
-        with self.mutex:
-            return self.joystickButtons[stick].count
+        return self.joystickData.buttonCounts[stick]
 
     def getJoystickIsXbox(self, stick):
         """
@@ -291,12 +429,13 @@ class DriverStation:
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
         
-        with self.mutex:
-            # TODO: Remove this when calling for descriptor on empty stick no longer crashes.
-            if 1 > self.joystickButtons[stick].count and 1 > len(self.joystickAxes[stick]):
-                self._reportJoystickUnpluggedError("WARNING: Joystick on port {} not avaliable, check if controller is "
-                                                   "plugged in.\n".format(stick))
-                return False
+        data = self.joystickData
+
+        # TODO: Remove this when calling for descriptor on empty stick no longer crashes.
+        if 1 > data.buttonCounts[stick] and 1 > data.axisCounts[stick]:
+            self._reportJoystickUnpluggedError("WARNING: Joystick on port {} not avaliable, check if controller is "
+                                               "plugged in.\n".format(stick))
+            return False
     
         return hal.HALGetJoystickIsXbox(stick) == 1
 
@@ -311,12 +450,13 @@ class DriverStation:
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
         
-        with self.mutex:
-            # TODO: Remove this when calling for descriptor on empty stick no longer crashes.
-            if 1 > self.joystickButtons[stick].count and 1 > len(self.joystickAxes[stick]):
-                self._reportJoystickUnpluggedError("WARNING: Joystick on port {} not avaliable, check if controller is "
-                                                   "plugged in.\n".format(stick))
-                return False
+        data = self.joystickData
+
+        # TODO: Remove this when calling for descriptor on empty stick no longer crashes.
+        if 1 > data.buttonCounts[stick] and 1 > data.axisCounts[stick]:
+            self._reportJoystickUnpluggedError("WARNING: Joystick on port {} not avaliable, check if controller is "
+                                               "plugged in.\n".format(stick))
+            return False
     
         return hal.HALGetJoystickType(stick)
 
@@ -331,12 +471,13 @@ class DriverStation:
         if stick < 0 or stick >= self.kJoystickPorts:
             raise IndexError("Joystick index is out of range, should be 0-%s" % self.kJoystickPorts)
 
-        with self.mutex:
-            # TODO: Remove this when calling for descriptor on empty stick no longer crashes.
-            if 1 > self.joystickButtons[stick].count and 1 > len(self.joystickAxes[stick]):
-                self._reportJoystickUnpluggedError("WARNING: Joystick on port {} not avaliable, check if controller is "
-                                                   "plugged in.\n".format(stick))
-                return False
+        data = self.joystickData
+
+        # TODO: Remove this when calling for descriptor on empty stick no longer crashes.
+        if 1 > data.buttonCounts[stick] and 1 > data.axisCounts[stick]:
+            self._reportJoystickUnpluggedError("WARNING: Joystick on port {} not avaliable, check if controller is "
+                                               "plugged in.\n".format(stick))
+            return False
 
         return hal.HALGetJoystickName(stick)
 
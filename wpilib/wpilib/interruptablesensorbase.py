@@ -62,13 +62,13 @@ class InterruptableSensorBase(SensorBase):
         if self.interrupt is not None:
             raise ValueError("The interrupt has already been allocated")
 
-        self.allocateInterrupts(handler is not None)
+        self.allocateInterrupts(handler is None)
 
         assert self.interrupt is not None
 
         hal.requestInterrupts(self.interrupt, self.getModuleForRouting(),
                               self.getChannelForRouting(),
-                              1 if self.getAnalogTriggerForRouting() else 0)
+                              bool(self.getAnalogTriggerForRouting()))
         self.setUpSourceEdge(True, False)
         if handler is not None:
             hal.attachInterruptHandler(self.interrupt, handler)
@@ -91,7 +91,7 @@ class InterruptableSensorBase(SensorBase):
 
         self.isSynchronousInterrupt = watcher
         self._interrupt = hal.initializeInterrupts(self.interruptIndex,
-                                                   1 if watcher else 0)
+                                                   bool(watcher))
         self._interrupt_finalizer = weakref.finalize(self, hal.cleanInterrupts,
                                                      self._interrupt)
 
@@ -168,7 +168,7 @@ class InterruptableSensorBase(SensorBase):
         """
         if self.interrupt is not None:
             hal.setInterruptUpSourceEdge(self.interrupt,
-                                         1 if risingEdge else 0,
-                                         1 if fallingEdge else 0)
+                                         bool(risingEdge),
+                                         bool(fallingEdge))
         else:
             raise ValueError("You must call RequestInterrupts before setUpSourceEdge")
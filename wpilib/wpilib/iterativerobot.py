@@ -83,65 +83,72 @@ class IterativeRobot(RobotBase):
         # loop forever, calling the appropriate mode-dependent function
         LiveWindow.setEnabled(False)
         while True:
-            # Call the appropriate function depending upon the current robot mode
-            if self.isDisabled():
-                # call DisabledInit() if we are now just entering disabled mode from
-                # either a different mode or from power-on
-                if not self.disabledInitialized:
-                    LiveWindow.setEnabled(False)
-                    self.disabledInit()
-                    self.disabledInitialized = True
-                    # reset the initialization flags for the other modes
-                    self.autonomousInitialized = False
-                    self.teleopInitialized = False
-                    self.testInitialized = False
-                if self.nextPeriodReady():
-                    hal.HALNetworkCommunicationObserveUserProgramDisabled()
-                    self.disabledPeriodic()
-            elif self.isTest():
-                # call TestInit() if we are now just entering test mode from either
-                # a different mode or from power-on
-                if not self.testInitialized:
-                    LiveWindow.setEnabled(True)
-                    self.testInit()
-                    self.testInitialized = True
-                    self.autonomousInitialized = False
-                    self.teleopInitialized = False
-                    self.disabledInitialized = False
-                if self.nextPeriodReady():
-                    hal.HALNetworkCommunicationObserveUserProgramTest()
-                    self.testPeriodic()
-            elif self.isAutonomous():
-                # call Autonomous_Init() if this is the first time
-                # we've entered autonomous_mode
-                if not self.autonomousInitialized:
-                    LiveWindow.setEnabled(False)
-                    # KBS NOTE: old code reset all PWMs and relays to "safe values"
-                    # whenever entering autonomous mode, before calling
-                    # "Autonomous_Init()"
-                    self.autonomousInit()
-                    self.autonomousInitialized = True
-                    self.testInitialized = False
-                    self.teleopInitialized = False
-                    self.disabledInitialized = False
-                if self.nextPeriodReady():
-                    hal.HALNetworkCommunicationObserveUserProgramAutonomous()
-                    self.autonomousPeriodic()
-            else:
-                # call Teleop_Init() if this is the first time
-                # we've entered teleop_mode
-                if not self.teleopInitialized:
-                    LiveWindow.setEnabled(False)
-                    self.teleopInit()
-                    self.teleopInitialized = True
-                    self.testInitialized = False
-                    self.autonomousInitialized = False
-                    self.disabledInitialized = False
-                if self.nextPeriodReady():
-                    hal.HALNetworkCommunicationObserveUserProgramTeleop()
-                    self.teleopPeriodic()
+            self._loopFunc()
             self.ds.waitForData()
 
+    def _loopFunc(self):
+        """Calls the init function for the current robot mode if the mode
+        has just been entered, and the periodic function for the current
+        mode if :meth:`nextPeriodReady` says that it should be called.
+        """
+        # Call the appropriate function depending upon the current robot mode
+        if self.isDisabled():
+            # call DisabledInit() if we are now just entering disabled mode from
+            # either a different mode or from power-on
+            if not self.disabledInitialized:
+                LiveWindow.setEnabled(False)
+                self.disabledInit()
+                self.disabledInitialized = True
+                # reset the initialization flags for the other modes
+                self.autonomousInitialized = False
+                self.teleopInitialized = False
+                self.testInitialized = False
+            if self.nextPeriodReady():
+                hal.HALNetworkCommunicationObserveUserProgramDisabled()
+                self.disabledPeriodic()
+        elif self.isTest():
+            # call TestInit() if we are now just entering test mode from either
+            # a different mode or from power-on
+            if not self.testInitialized:
+                LiveWindow.setEnabled(True)
+                self.testInit()
+                self.testInitialized = True
+                self.autonomousInitialized = False
+                self.teleopInitialized = False
+                self.disabledInitialized = False
+            if self.nextPeriodReady():
+                hal.HALNetworkCommunicationObserveUserProgramTest()
+                self.testPeriodic()
+        elif self.isAutonomous():
+            # call Autonomous_Init() if this is the first time
+            # we've entered autonomous_mode
+            if not self.autonomousInitialized:
+                LiveWindow.setEnabled(False)
+                # KBS NOTE: old code reset all PWMs and relays to "safe values"
+                # whenever entering autonomous mode, before calling
+                # "Autonomous_Init()"
+                self.autonomousInit()
+                self.autonomousInitialized = True
+                self.testInitialized = False
+                self.teleopInitialized = False
+                self.disabledInitialized = False
+            if self.nextPeriodReady():
+                hal.HALNetworkCommunicationObserveUserProgramAutonomous()
+                self.autonomousPeriodic()
+        else:
+            # call Teleop_Init() if this is the first time
+            # we've entered teleop_mode
+            if not self.teleopInitialized:
+                LiveWindow.setEnabled(False)
+                self.teleopInit()
+                self.teleopInitialized = True
+                self.testInitialized = False
+                self.autonomousInitialized = False
+                self.disabledInitialized = False
+            if self.nextPeriodReady():
+                hal.HALNetworkCommunicationObserveUserProgramTeleop()
+                self.teleopPeriodic()
+
     def nextPeriodReady(self):
         """Determine if the appropriate next periodic function should be
         called.  Call the periodic functions whenever a packet is received
@@ -0,0 +1,150 @@
+# novalidate
+#----------------------------------------------------------------------------
+# Copyright (c) FIRST 2008-2016. All Rights Reserved.
+# Open Source Software - may be modified and shared by FRC teams. The code
+# must be accompanied by the FIRST BSD license file in the root directory of
+# the project.
+#----------------------------------------------------------------------------
+
+import hal
+import threading
+import weakref
+
+from .resource import Resource
+from .timer import Timer
+
+__all__ = ["Notifier"]
+
+class Notifier:
+    """Calls a function at a specified time, either once or periodically.
+    All notifiers are run from a single thread owned by the HAL, so the
+    handler should not take very long.
+    """
+
+    def __init__(self, run):
+        """Create a Notifier for timer event notification.
+
+        :param run: The handler that is called at the notification time which
+            is set using :meth:`startSingle` or :meth:`startPeriodic`.
+        """
+        # The lock for the process information.
+        self.processLock = threading.RLock()
+        # Lock on the handler so that the handler is not called before it
+        # has been set.
+        self.handlerLock = threading.RLock()
+        # The handler passed in by the user which should be called at the
+        # appropriate interval.
+        self.handler = run
+        # The time, in seconds, at which the corresponding handler should be
+        # called. Has the same zero as Timer.getFPGATimestamp().
+        self.expirationTime = 0
+        # Whether we are calling the handler just once or periodically.
+        self.periodic = False
+        # If periodic, the period of the calling; if just once, stores how
+        # long it is until we call the handler.
+        self.period = 0
+        # Whether the alarm is set. The HAL may call _process after the
+        # alarm has been stopped, and the handler shouldn't be called then.
+        self.alarmSet = False
+
+        # Don't let the HAL callback keep this object alive
+        self_ref = weakref.ref(self)
+
+        def _process(currentTime):
+            notifier = self_ref()
+            if notifier is not None:
+                notifier._process(currentTime)
+
+        self._notifier = hal.initializeNotifier(_process)
+        self._notifier_finalizer = weakref.finalize(self, hal.cleanNotifier,
+                                                    self._notifier)
+
+        # Need this to free on unit test wpilib reset
+        Resource._add_global_resource(self)
+
+    @property
+    def notifier(self):
+        if not self._notifier_finalizer.alive:
+            return None
+        return self._notifier
+
+    def free(self):
+        """Stops the notifier and releases it. The handler will not be
+        called after this returns."""
+        self._notifier_finalizer()
+        # wait for a currently executing handler to complete
+        with self.handlerLock:
+            pass
+
+    def _process(self, currentTime):
+        """Called by the HAL when the alarm expires. Updates the alarm time
+        if periodic, then calls the handler."""
+        with self.processLock:
+            if not self.alarmSet:
+                return
+            handler = self.handler
+            if self.periodic:
+                self.expirationTime += self.period
+                self._updateAlarm()
+            else:
+                self.alarmSet = False
+            self.handlerLock.acquire()
+
+        try:
+            if handler is not None:
+                handler()
+        finally:
+            self.handlerLock.release()
+
+    def _updateAlarm(self):
+        """Update the alarm hardware to reflect the next alarm."""
+        notifier = self.notifier
+        if notifier is None:
+            return
+        hal.updateNotifierAlarm(notifier, int(round(self.expirationTime * 1e6)))
+
+    def startSingle(self, delay):
+        """Register for single event notification. A timer event is queued
+        for a single event after the specified delay.
+
+        :param delay: Seconds to wait before the handler is called.
+        """
+        with self.processLock:
+            self.periodic = False
+            self.period = delay
+            self.expirationTime = Timer.getFPGATimestamp() + delay
+            self.alarmSet = True
+            self._updateAlarm()
+
+    def startPeriodic(self, period):
+        """Register for periodic event notification. A timer event is queued
+        for periodic event notification. Each time the interrupt occurs, the
+        event will be immediately requeued for the same time interval.
+
+        :param period: Period in seconds to call the handler starting one
+            period after the call to this method.
+        """
+        with self.processLock:
+            self.periodic = True
+            self.period = period
+            self.expirationTime = Timer.getFPGATimestamp() + period
+            self.alarmSet = True
+            self._updateAlarm()
+
+    def stop(self):
+        """Stop timer events from occuring. Stop any repeating timer events
+        from occuring. This will also remove any single notification events
+        from the queue. If a timer-based call to the registered handler is in
+        progress, this function will block until the handler call is
+        complete.
+        """
+        with self.processLock:
+            self.periodic = False
+            self.alarmSet = False
+            notifier = self.notifier
+            if notifier is not None:
+                hal.stopNotifierAlarm(notifier)
+
+        # Wait for a currently executing handler to complete before returning
+        with self.handlerLock:
+            pass
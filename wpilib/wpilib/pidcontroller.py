@@ -16,7 +16,7 @@ from .interfaces import PIDSource
 from .livewindowsendable import LiveWindowSendable
 from .resource import Resource
 from .timer import Timer
-from ._impl.timertask import TimerTask
+from ._impl.timertask import TimerTaskRunner
 from ._impl.utils import match_arglist, HasAttribute
 
 __all__ = ["PIDController"]
@@ -24,9 +24,10 @@ __all__ = ["PIDController"]
 class PIDController(LiveWindowSendable):
     """Can be used to control devices via a PID Control Loop.
 
-    Creates a separate thread which reads the given :class:`.PIDSource` and takes
-    care of the integral calculations, as well as writing the given
-    :class:`.PIDOutput`.
+    Registers a periodic task which reads the given :class:`.PIDSource` and
+    takes care of the integral calculations, as well as writing the given
+    :class:`.PIDOutput`. All PIDControllers share a single thread to run
+    these tasks.
     """
     kDefaultPeriod = .05
     instances = 0
@@ -119,8 +120,8 @@ class PIDController(LiveWindowSendable):
 
         self.mutex = threading.RLock()
 
-        self.pid_task = TimerTask('PIDTask%d' % PIDController.instances, self.period, self._calculate)
-        self.pid_task.start()
+        self.pid_task = TimerTaskRunner.getInstance().schedule('PIDTask%d' % PIDController.instances,
+                                                               self.period, self._calculate)
         
         self.setpointTimer = Timer()
         self.setpointTimer.start()
@@ -135,8 +136,10 @@ class PIDController(LiveWindowSendable):
     def free(self):
         """Free the PID object"""
         # TODO: is this useful in Python?  Should make TableListener weakref.
+        
+        # don't hold the mutex here, the task may be waiting on it
+        self.pid_task.cancel()
         with self.mutex:
-            self.pid_task.cancel()
             self.pidInput = None
             self.pidOutput = None
 
@@ -211,6 +214,15 @@ class PIDController(LiveWindowSendable):
 
             pidOutput(result)
             
+    def getLoopStats(self):
+        """Returns timing statistics for the control loop, which are useful
+        for determining whether the loop is running at the expected rate.
+        See :meth:`.PeriodicTask.getStats` for a description of the values.
+        
+        :returns: dictionary of timing statistics
+        """
+        return self.pid_task.getStats()
+            
     def calculateFeedForward(self):
         """Calculate the feed forward term
         
@@ -0,0 +1,165 @@
+# novalidate
+
+import hal
+
+from .iterativerobot import IterativeRobot
+from .livewindow import LiveWindow
+from .timer import Timer
+from ._impl.profiler import TimingStats
+
+__all__ = ["TimedRobot"]
+
+class _PeriodicLoop:
+    '''
+        Keeps track of when a periodic function is next supposed to be
+        called. Deadlines are always a whole number of periods after the
+        loop was started, so that they don't drift. Times are kept in
+        integer microseconds of FPGA time so that they compare exactly.
+    '''
+
+    def __init__(self, name, period, fn, start):
+        self.name = name
+        self.period = period
+        self.periodUs = int(round(period * 1e6))
+        self.fn = fn
+        self.start = start
+        self.deadline = start
+        self.stats = TimingStats(name, 250, period)
+
+    def run(self, now):
+        '''Calls the function and schedules the next call
+
+        :returns: The number of periods that were skipped because the
+                  function took too long
+        '''
+        self.fn()
+        end = hal.getFPGATime()
+        self.stats.add((end - now) / 1000000.0)
+
+        # If the next deadline has already passed, skip ahead to the
+        # first one that hasn't
+        deadline = self.deadline + self.periodUs
+        missed = 0
+        if deadline <= end:
+            missed = (end - deadline) // self.periodUs + 1
+            deadline += missed * self.periodUs
+
+        self.deadline = deadline
+        return missed
+
+
+class TimedRobot(IterativeRobot):
+    """TimedRobot implements the same framework as :class:`.IterativeRobot`,
+    except that the periodic functions are called at a fixed rate instead of
+    whenever a packet arrives from the driver station. This keeps the loop
+    running at the same rate even if packets are delayed or lost.
+
+    Optionally, :meth:`fastPeriodic` can be called at a faster rate (such as
+    200Hz) for control code. It is called from the same thread as the rest
+    of the robot code, so no locking is needed.
+
+    If a loop takes longer than its period, the loops that were missed are
+    skipped and a warning is logged. The timing of each loop is recorded,
+    and can be retrieved using :meth:`getLoopStats`.
+    """
+
+    #: Default period of the periodic functions, in seconds
+    kDefaultPeriod = 0.02
+
+    #: Minimum time between overrun warnings, in seconds
+    kOverrunWarningPeriod = 1.0
+
+    def __init__(self, period=None, fastPeriod=None):
+        """Constructor for TimedRobot.
+
+        :param period: Period (in seconds) that the periodic functions are
+                       called at. Defaults to :attr:`kDefaultPeriod`.
+        :param fastPeriod: If specified, :meth:`fastPeriodic` is called at
+                           this period (in seconds)
+        """
+        super().__init__()
+        self.period = self.kDefaultPeriod if period is None else period
+        self.fastPeriod = fastPeriod
+
+        # created when the robot starts
+        self.periodicLoop = None
+        self.fastLoop = None
+        self.lastOverrunWarning = None
+
+    def startCompetition(self):
+        """Provide an alternate "main loop" via startCompetition()."""
+        # The usage reporting in this version of the HAL doesn't have an ID
+        # for a timed framework, and TimedRobot has the same interface as
+        # IterativeRobot, so it is reported as the iterative framework
+        hal.HALReport(hal.HALUsageReporting.kResourceType_Framework,
+                      hal.HALUsageReporting.kFramework_Iterative)
+
+        self.robotInit()
+
+        # Tell the DS that the robot is ready to be enabled
+        hal.HALNetworkCommunicationObserveUserProgramStarting()
+
+        LiveWindow.setEnabled(False)
+
+        start = hal.getFPGATime()
+        self.periodicLoop = _PeriodicLoop('periodic', self.period, self._loopFunc, start)
+        loops = [self.periodicLoop]
+        if self.fastPeriod is not None:
+            # when both are due, the fast loop goes first
+            self.fastLoop = _PeriodicLoop('fastPeriodic', self.fastPeriod, self.fastPeriodic, start)
+            loops.insert(0, self.fastLoop)
+
+        # loop forever, calling each function when it is due
+        while True:
+            for loop in loops:
+                now = hal.getFPGATime()
+                if now >= loop.deadline:
+                    missed = loop.run(now)
+                    if missed:
+                        self._reportOverrun(loop, missed)
+
+            delay = min(loop.deadline for loop in loops) - hal.getFPGATime()
+            if delay > 0:
+                Timer.delay(delay / 1000000.0)
+
+    def _reportOverrun(self, loop, missed):
+        now = Timer.getFPGATimestamp()
+        if self.lastOverrunWarning is None or \
+           now - self.lastOverrunWarning >= self.kOverrunWarningPeriod:
+            self.lastOverrunWarning = now
+            self.logger.warning("Loop overrun: %s took %.1fms (period is %.1fms), skipped %d loop(s)",
+                                loop.name, loop.stats.last*1000, loop.period*1000, missed)
+
+    def nextPeriodReady(self):
+        """The periodic functions are called every period, regardless of
+        whether there is new data from the driver station.
+
+        :rtype: bool
+        """
+        return True
+
+    def getLoopStats(self):
+        """
+            :returns: Timing statistics for the periodic functions (in seconds),
+                      or None if the robot hasn't started yet. Overruns are
+                      loops that took longer than the period. See
+                      :meth:`.TimingStats.getStats` for the contents.
+        """
+        if self.periodicLoop is not None:
+            return self.periodicLoop.stats.getStats()
+
+    def getFastLoopStats(self):
+        """
+            :returns: Timing statistics for :meth:`fastPeriodic` (in seconds),
+                      or None if it isn't being called
+        """
+        if self.fastLoop is not None:
+            return self.fastLoop.stats.getStats()
+
+    def fastPeriodic(self):
+        """Periodic code that needs to run faster than the other periodic
+        functions should go here. This is only called if a fastPeriod was
+        passed to the constructor, and is called regardless of the current
+        robot mode.
+        """
+        pass
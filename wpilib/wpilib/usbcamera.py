@@ -10,6 +10,9 @@ __all__ = ["USBCamera"]
 
 logger = logging.getLogger(__name__)
 
+# a marker that isn't escaped or RST, searched for without copying the image
+reMarker = re.compile(b"\\xff[^\\x00\\xd0-\\xd7]")
+
 def getJpegSize(data):
     if data[0] != 0xff or data[1] != 0xd8:
         raise ValueError("invalid image")
@@ -28,8 +31,10 @@ def getJpegSize(data):
             len = ((data[pos+2] & 0xff) << 8) | (data[pos+3] & 0xff)
             pos += len + 2
             # Find next marker.  Skip over escaped and RST markers.
-            while data[pos] != 0xff or data[pos+1] == 0x00 or (data[pos+1] >= 0xd0 and data[pos+1] <= 0xd7):
-                pos += 1
+            m = reMarker.search(data, pos)
+            if m is None:
+                raise ValueError("invalid image")
+            pos = m.start()
         else: # various
             len = ((data[pos+2] & 0xff) << 8) | (data[pos+3] & 0xff)
             pos += len + 2